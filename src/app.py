@@ -1,17 +1,11 @@
+import os
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.config import config
 from src.utils.logger import app_logger
-from src.database import create_tables, get_db_connection
-
-# --- Service Imports ---
-from src.services.embedding_service import EmbeddingService
-from src.services.ons_data_service import ONSDataService
-from src.services.persona_service import PersonaService
-from src.services.audience_service import AudienceService
-from src.services.client_data_service import ClientDataService
-from src.utils.history_manager import HistoryManager
-from src.services.content_test_service import ContentTestService
+from src.database import create_tables
+from src.services.container import ServiceContainer
+from src.services.usage_service import usage_ledger
 
 # --- Blueprint Imports ---
 from src.routes.analyze import create_analyze_blueprint
@@ -22,81 +16,138 @@ from src.routes.focus_group import create_focus_group_blueprint
 from src.routes.audience import create_audience_blueprint
 from src.routes.test_content import create_test_content_blueprint
 from src.routes.client_data import create_client_data_blueprint
+from src.routes.metrics import create_metrics_blueprint
+from src.routes.tracing import create_tracing_blueprint
+from src.routes.usage import create_usage_blueprint
 # TODO: Add imports for new route blueprints (audience, polling, etc.)
 
-# --- App Initialization ---
-app_logger.info("Application startup sequence initiated.")
-
-# 1. Initialize Database
-create_tables()
-
-# 2. Initialize Services (in dependency order)
-app_logger.info("Initializing services...")
-db_connection = get_db_connection() # For services that need it
-
-embedding_service = EmbeddingService()
-ons_data_service = ONSDataService()
-persona_service = PersonaService(db_connection, embedding_service, ons_data_service)
-audience_service = AudienceService(db_connection, persona_service)
-client_data_service = ClientDataService(db_connection, audience_service)
-content_test_service = ContentTestService(audience_service, persona_service)
-history_manager = HistoryManager() # Now uses get_db_connection internally
-app_logger.info("All services initialized.")
-
-
-# 3. Initialize Flask App
-app = Flask(__name__, static_folder=config['default'].FRONTEND_DIR)
-CORS(app, resources={r"/api/*": {"origins": config['default'].CORS_ORIGINS}})
-app_logger.info("Flask app configured with CORS.")
-
-# 4. Register Blueprints (passing services as dependencies)
-app_logger.info("Registering blueprints...")
-app.register_blueprint(create_analyze_blueprint(history_manager))
-app.register_blueprint(create_history_blueprint(history_manager))
-app.register_blueprint(create_presets_blueprint())
-app.register_blueprint(create_summary_blueprint())
-app.register_blueprint(create_focus_group_blueprint(audience_service))
-app.register_blueprint(create_audience_blueprint(audience_service))
-app.register_blueprint(create_test_content_blueprint(content_test_service))
-app.register_blueprint(create_client_data_blueprint(client_data_service))
-# TODO: Register new blueprints for audience, polling, etc.
-app_logger.info("All blueprints registered.")
-
-# --- Frontend Serving Routes ---
-@app.route('/')
-def serve_frontend_main():
-    return send_from_directory(app.static_folder, 'index.html')
-
-@app.route('/<path:path>')
-def serve_frontend_other(path):
-    if '.' not in path:
-        path = f'{path}.html'
-    
-    # Security: Ensure path is within the static folder
-    from werkzeug.security import safe_join
-    import os
+WARMUP_MODES = ('none', 'background', 'eager')
+
+def create_app(app_config=None, warmup: str = None) -> Flask:
+    """
+    Builds the Flask application.
+
+    Services are not constructed here: blueprints receive lazy stand-ins and
+    each service is built, with the libraries it needs, on first use. Use
+    warmup to build them ahead of traffic. Interrupted ingestion jobs are
+    resumed in every warmup mode.
+
+    Args:
+        app_config (optional): Config class, or its key in src.config.config, for
+            the app and the services it builds. Defaults to config['default'];
+            process-wide settings such as the LLM client's still come from there.
+        warmup (str, optional): 'none', 'background' (build services on a
+            daemon thread after startup) or 'eager' (build before returning).
+            Defaults to SERVICE_WARMUP.
+
+    Returns:
+        Flask: The configured application; its services are in app.extensions['services'].
+    """
+    if app_config is None or isinstance(app_config, str):
+        app_config = config[app_config or 'default']
+    warmup = warmup or getattr(app_config, 'SERVICE_WARMUP', 'background')
+    if warmup not in WARMUP_MODES:
+        raise ValueError(f"warmup must be one of {WARMUP_MODES}, got {warmup!r}")
+    app_logger.info("Application startup sequence initiated.")
+
+    # 1. Initialize Database (cheap, and several caches expect the tables to exist)
+    create_tables()
+
+    # 2. Services are built on first use
+    services = ServiceContainer(app_config)
+
+    # 3. Initialize Flask App
+    app = Flask(__name__, static_folder=app_config.FRONTEND_DIR)
+    app.extensions['services'] = services
+    CORS(app, resources={r"/api/*": {"origins": app_config.CORS_ORIGINS}})
+    app_logger.info("Flask app configured with CORS.")
+
+    # 4. Register Blueprints (passing lazy services as dependencies)
+    app_logger.info("Registering blueprints...")
+    app.register_blueprint(create_analyze_blueprint(services.lazy('history_manager')))
+    app.register_blueprint(create_history_blueprint(services.lazy('history_manager')))
+    app.register_blueprint(create_presets_blueprint())
+    app.register_blueprint(create_summary_blueprint(services.lazy('summary_session_service')))
+    focus_group_bp = create_focus_group_blueprint(services.lazy('audience_service'))
+    app.register_blueprint(focus_group_bp)
+    app.register_blueprint(create_audience_blueprint(services.lazy('audience_service')))
+    app.register_blueprint(create_test_content_blueprint(services.lazy('content_test_service')))
+    app.register_blueprint(create_client_data_blueprint(services.lazy('client_data_service'), services.lazy('ingestion_job_service')))
+    app.register_blueprint(create_metrics_blueprint())
+    app.register_blueprint(create_tracing_blueprint())
+    app.register_blueprint(create_usage_blueprint(usage_ledger, estimators=focus_group_bp.request_estimators))
+    # TODO: Register new blueprints for audience, polling, etc.
+    app_logger.info("All blueprints registered.")
+
+    _register_frontend_routes(app)
+
+    if warmup == 'eager':
+        services.warm()
+    elif warmup == 'background':
+        # Also resumes interrupted ingestion jobs without holding up startup
+        services.warm_in_background()
+    else:
+        _resume_ingestion_jobs(services)
+    return app
+
+def _resume_ingestion_jobs(services: ServiceContainer):
+    """Builds the ingestion job service, which resumes incomplete jobs, in the background; only if there are any."""
+    from src.services.ingestion_job_service import incomplete_job_ids
     try:
-        safe_path = safe_join(app.static_folder, path)
-        if os.path.isfile(safe_path):
-            return send_from_directory(app.static_folder, path)
-        else:
+        if not incomplete_job_ids(getattr(services.config, 'INGESTION_JOB_STALE_SECONDS', 120)):
+            return
+    except Exception as e:
+        app_logger.error(f"Failed to check for incomplete ingestion jobs: {e}", exc_info=True)
+        return
+    services.warm_in_background(['ingestion_job_service'])
+
+def _register_frontend_routes(app: Flask):
+    # --- Frontend Serving Routes ---
+    @app.route('/')
+    def serve_frontend_main():
+        return send_from_directory(app.static_folder, 'index.html')
+
+    @app.route('/<path:path>')
+    def serve_frontend_other(path):
+        if '.' not in path:
+            path = f'{path}.html'
+
+        # Security: Ensure path is within the static folder
+        from werkzeug.security import safe_join
+        try:
+            safe_path = safe_join(app.static_folder, path)
+            if os.path.isfile(safe_path):
+                return send_from_directory(app.static_folder, path)
+            else:
+                return send_from_directory(app.static_folder, 'index.html'), 404
+        except:
             return send_from_directory(app.static_folder, 'index.html'), 404
-    except:
-        return send_from_directory(app.static_folder, 'index.html'), 404
 
-@app.route('/focus-group-advanced')
-def serve_focus_group():
-    return send_from_directory(app.static_folder, 'focus_group_advanced.html')
+    @app.route('/focus-group-advanced')
+    def serve_focus_group():
+        return send_from_directory(app.static_folder, 'focus_group_advanced.html')
+
+    @app.route('/data.html')
+    def serve_data():
+        return send_from_directory(app.static_folder, 'data.html')
+
+_app = None
 
-@app.route('/data.html')
-def serve_data():
-    return send_from_directory(app.static_folder, 'data.html')
+def __getattr__(name):
+    # Keeps `gunicorn src.app:app` working without building an app on import
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- Main Execution ---
 if __name__ == '__main__':
+    app = create_app(warmup='eager')
     app_logger.info(f"Starting Flask app on {config['default'].HOST}:{config['default'].PORT}")
     app.run(
         debug=config['default'].DEBUG,
         host=config['default'].HOST,
         port=int(config['default'].PORT)
-    ) 
\ No newline at end of file
+    )
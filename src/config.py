@@ -16,6 +16,8 @@ else:
 class Config:
     # OpenAI Configuration
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    LLM_MAX_IN_FLIGHT = 256  # Concurrent LLM calls on the shared event loop, across all requests
+    LLM_EXECUTOR_WORKERS = 4  # Threads for blocking and CPU-bound work reached from the event loop
     
     # Application Configuration
     DEBUG = True
@@ -30,9 +32,111 @@ class Config:
     
     # Model Configuration
     DEFAULT_TEXT_MODEL = "gpt-4o"
-    DEFAULT_VISION_MODEL = "gpt-4-vision-preview"
+    DEFAULT_VISION_MODEL = "gpt-4o"
+    JSON_MODE_UNSUPPORTED_MODELS = ['gpt-4-vision-preview', 'gpt-4', 'gpt-4-0613', 'gpt-4-32k']  # response_format is dropped for these
     DEFAULT_TEMPERATURE = 0.7
     PERSONA_NAME_ENFORCEMENT_PROMPT = "Your name is {name}. Always refer to yourself as {name} in your responses and in the first person."
+
+    # Model Routing (see src/services/model_router.py); keys are LLM call sites
+    DEFAULT_LLM_TIMEOUT = 90  # Seconds per call, retries included, for call sites without a route
+    LLM_CLIENT_MAX_RETRIES = 2  # Retries of rate limits, 5xx and connection errors, within the call's timeout
+    # Persona turns are cascades: gpt-4o-mini drafts, and gpt-4o answers when the
+    # draft is truncated, empty, flagged or less confident than min_confidence
+    # (the mean token probability). Remove draft_model to always use the model.
+    MODEL_ROUTES = {
+        'focus_group.initial_reaction': {'model': 'gpt-4o', 'draft_model': 'gpt-4o-mini', 'min_confidence': 0.5, 'timeout': 30, 'fallback_model': 'gpt-4o-mini'},
+        'focus_group.discussion': {'model': 'gpt-4o', 'draft_model': 'gpt-4o-mini', 'min_confidence': 0.5, 'timeout': 45, 'fallback_model': 'gpt-4o-mini'},
+        'focus_group.moderator_response': {'model': 'gpt-4o', 'draft_model': 'gpt-4o-mini', 'min_confidence': 0.5, 'timeout': 45, 'fallback_model': 'gpt-4o-mini'},
+        'focus_group.themes': {'model': 'gpt-4o-mini', 'timeout': 20, 'fallback_model': 'gpt-3.5-turbo'},
+        'summary': {'model': 'gpt-4o', 'timeout': 120, 'fallback_model': 'gpt-4o-mini'},
+    }
+
+    # Hedged Requests (async LLM calls only)
+    LLM_HEDGE_PERCENT = 5  # Most calls that may send a duplicate request, as a percentage of traffic; 0 disables hedging
+    LLM_HEDGE_PERCENTILE = 95  # A call still running past this live latency percentile for its model and call site is hedged
+    LLM_HEDGE_MIN_SAMPLES = 20  # Recent calls needed before a model and call site are hedged
+    LLM_HEDGE_MIN_DELAY = 0.5  # Seconds; calls that return faster than this are never hedged
+    LLM_HEDGE_BURST = 10  # Unused hedge allowance that can build up during quiet spells
+    LLM_HEDGE_DELAY_REFRESH = 5.0  # Seconds a computed hedge delay is reused before the percentile is read again
+
+    # Startup
+    SERVICE_WARMUP = os.getenv('SERVICE_WARMUP', 'background')  # 'none', 'background' or 'eager'
+
+    # Tracing and Profiling
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')  # Sent as X-Admin-Token; admin endpoints and profiling are off when unset
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))  # Share of requests traced; X-Trace: 1 forces one
+    TRACE_BUFFER_SIZE = 200  # Finished traces kept in memory for export
+    PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between profiler stack samples
+
+    # Logging
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # 'text' or 'json' (one object per line)
+    LOG_MAX_BYTES = 10 * 1024 * 1024  # logs/app.log is rotated at this size
+    LOG_BACKUP_COUNT = 5  # Rotated log files kept
+    LOG_QUEUE_SIZE = 10000  # Records waiting for the writer thread; records beyond this are dropped
+    LOG_SAMPLED_PER_SECOND = 5  # Per-turn records let through per call site each second (0 = all)
+
+    # Usage and Admission Control
+    OWNER_DAILY_TOKEN_BUDGET = int(os.getenv('OWNER_DAILY_TOKEN_BUDGET', '0'))  # Tokens per owner per UTC day; 0 = unlimited
+    OWNER_TOKEN_BUDGETS = {}  # Per-owner overrides of OWNER_DAILY_TOKEN_BUDGET, e.g. {'acme': 5_000_000}
+    ADMISSION_MAX_TOKENS_IN_FLIGHT = 2_000_000  # Estimated tokens of requests running at once; 0 = unlimited
+    ADMISSION_QUEUE_TIMEOUT = 30  # Seconds a request waits for capacity before a 503
+    USAGE_FLUSH_INTERVAL = 2.0  # Seconds between batched writes of the usage ledger
+
+    # Simulation Estimates
+    MODEL_PRICES_PER_MILLION = {  # USD per million (prompt, completion) tokens
+        'gpt-4o': (2.50, 10.00),
+        'gpt-4o-mini': (0.15, 0.60),
+        'gpt-3.5-turbo': (0.50, 1.50),
+    }
+    ESTIMATE_DEFAULT_LATENCY_SECONDS = (3.0, 8.0)  # (p50, p95) of a call before any have been observed
+    ESTIMATE_FAST_MODELS = ['gpt-4o-mini']  # Cheaper models suggested by the estimator
+
+    # Vector Store
+    VECTOR_STORE_BACKEND = os.getenv('VECTOR_STORE_BACKEND', 'numpy')  # 'numpy', 'chroma' or 'memory'
+    VECTOR_STORE_PATH = os.getenv('VECTOR_STORE_PATH', os.path.join(project_root, 'data', 'vector_store'))
+
+    # Embeddings
+    EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'hashing')  # 'hashing' (offline) or 'openai'
+    EMBEDDING_DIM = 512  # Dimension of the offline hashing embeddings
+    OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+    EMBEDDING_BATCH_SIZE = 256  # Texts per provider call
+    EMBEDDING_CACHE_ENABLED = True
+    EMBEDDING_CACHE_MAX_ROWS = 100000  # Newest cached embeddings kept; older rows are pruned as new ones arrive
+
+    # Panel Selection
+    PANEL_DIVERSITY_STRATEGY = 'mmr'  # 'mmr' or 'k_center'
+    PANEL_OVERSAMPLE_FACTOR = 3  # Candidates generated per panel slot
+    PANEL_MMR_DIVERSITY = 0.7  # 0 = most typical personas, 1 = most varied
+
+    # Image Preprocessing
+    IMAGE_MAX_INPUT_BYTES = 20 * 1024 * 1024  # Larger uploads are rejected
+    IMAGE_MAX_DIMENSION = 2048  # Longest side sent to vision models
+    IMAGE_TARGET_SHORT_SIDE = 768  # High-detail tiling never looks at more than this
+    IMAGE_LOW_DETAIL_MAX_SIDE = 512  # Images this small are sent with detail='low'
+    IMAGE_JPEG_QUALITY = 85
+    IMAGE_CACHE_MAX_ENTRIES = 64  # Prepared images kept in memory
+    IMAGE_DESCRIPTION_CACHE_MAX_ENTRIES = 256  # Image descriptions kept in memory (all are also in the database)
+    IMAGE_DESCRIPTION_FAILURE_TTL = 60  # Seconds a failed description is remembered before the image is tried again
+
+    # Summaries
+    SUMMARY_CHUNK_TOKEN_BUDGET = 6000  # Response tokens per summarisation call
+    SUMMARY_REDUCE_FAN_IN = 8  # Partial summaries merged per reduce call
+    SUMMARY_MAX_WORKERS = 8  # Concurrent summarisation calls per summary
+
+    # Panel Prompting
+    PANEL_BATCH_SIZE = 8  # Personas packed into one request in panel batch mode
+
+    # Content Testing
+    CONTENT_TEST_MAX_WORKERS = 16  # Concurrent persona evaluations per content test
+    CONTENT_TEST_BATCH_SIZE = 5  # Personas evaluated per round in adaptive mode
+    CONTENT_TEST_MIN_PERSONAS = 8  # Adaptive tests never stop before this many responses
+    CONTENT_TEST_CLARITY_PRECISION = 0.75  # Target 95% CI half-width for mean clarity (points)
+    CONTENT_TEST_SENTIMENT_PRECISION = 0.15  # Target 95% CI half-width for positive sentiment share
+
+    # Client Data Ingestion
+    CLIENT_DATA_CHUNK_SIZE = 10000  # Rows read and committed per batch
+    INGESTION_MAX_WORKERS = 2
+    INGESTION_JOB_STALE_SECONDS = 120  # A running job with no checkpoint for this long is treated as interrupted
     
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -1,14 +1,88 @@
+import re
 import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+from functools import lru_cache
 from src.utils.logger import app_logger
+from src.utils.metrics import DB_QUERY_SECONDS
+from src.utils.tracing import span
 
 DATABASE_PATH = "audience_engine.db"
 
+# Statements that get a tracing span; reads are only timed in metrics
+_TRACED_OPERATIONS = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'COMMIT'}
+
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?|ON)\s+"?(\w+)', re.IGNORECASE)
+
+@lru_cache(maxsize=512)
+def _statement_labels(sql: str) -> tuple:
+    """(operation, table) metric labels for a statement, e.g. ('SELECT', 'personas')."""
+    words = sql.split(None, 1)
+    operation = words[0].upper() if words else 'OTHER'
+    match = _TABLE_PATTERN.search(sql)
+    return operation, match.group(1).lower() if match else ''
+
+def _timed(method, sql, *args):
+    operation, table = _statement_labels(sql)
+    return _timed_call(operation, table, method, sql, *args)
+
+def _timed_call(operation: str, table: str, method, *args):
+    with span('db.write', operation=operation, table=table) if operation in _TRACED_OPERATIONS else nullcontext():
+        start_time = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start_time, operation=operation, table=table)
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records statement timings in DB_QUERY_SECONDS."""
+    def execute(self, sql, *args):
+        return _timed(super().execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return _timed(super().executemany, sql, *args)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements and commits are timed in DB_QUERY_SECONDS; writes also get tracing spans."""
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return _timed(super().execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return _timed(super().executemany, sql, *args)
+
+    def commit(self):
+        return _timed_call('COMMIT', '', super().commit)
+
 def get_db_connection():
     """Creates and returns a new database connection."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(DATABASE_PATH, factory=TimedConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
+class ThreadLocalConnection:
+    """
+    Stands in for a connection that services share across threads (requests,
+    warmup, ingestion workers, the LLM executor). Each thread gets its own
+    connection on first use, so one thread's commit or rollback never covers
+    another thread's statements.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection(self):
+        """The calling thread's connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = get_db_connection()
+        return conn
+
+    def __getattr__(self, attr):
+        return getattr(self.connection(), attr)
+
 def create_tables():
     """Creates all necessary database tables if they don't exist."""
     conn = get_db_connection()
@@ -61,3 +135,176 @@ def create_tables():
         app_logger.error(f"Error creating database tables: {e}", exc_info=True)
     finally:
         conn.close()
+
+    run_migrations()
+
+# --- Schema Migrations ---
+# Ordered list of (version, description, statements). Append new migrations to
+# the end with the next version number; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "Index personas by audience", [
+        "CREATE INDEX IF NOT EXISTS idx_personas_audience_id ON personas (audience_id)",
+    ]),
+    (2, "Index audiences by owner", [
+        "CREATE INDEX IF NOT EXISTS idx_audiences_owner_id ON audiences (owner_id)",
+    ]),
+    (3, "Index history by timestamp", [
+        "CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp)",
+    ]),
+    (4, "Store client column mappings", [
+        """
+        CREATE TABLE IF NOT EXISTS client_column_mappings (
+            data_id TEXT PRIMARY KEY,
+            mapping TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (5, "Track client data ingestion jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS ingestion_jobs (
+            id TEXT PRIMARY KEY,
+            owner_id TEXT,
+            file_path TEXT NOT NULL,
+            audience_id INTEGER,
+            column_mapping TEXT,
+            status TEXT NOT NULL,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            total_rows_estimate INTEGER,
+            rows_per_second REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            FOREIGN KEY (audience_id) REFERENCES audiences (id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs (status)",
+    ]),
+    (6, "Cache embeddings by content hash", [
+        """
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            content_hash TEXT PRIMARY KEY,
+            provider TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (7, "Cache structured image descriptions by content hash", [
+        """
+        CREATE TABLE IF NOT EXISTS image_descriptions (
+            content_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            description TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (content_hash, model)
+        )
+        """,
+    ]),
+    (8, "Keep summary sessions for incremental summaries", [
+        """
+        CREATE TABLE IF NOT EXISTS summary_sessions (
+            id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            response_hashes TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_summary_sessions_fingerprint ON summary_sessions (fingerprint)",
+    ]),
+    (9, "Record LLM token usage with daily rollups", [
+        """
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            day TEXT NOT NULL,
+            owner_id TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            call_site TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_tokens INTEGER NOT NULL,
+            completion_tokens INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_llm_usage_owner_day ON llm_usage (owner_id, day)",
+        """
+        CREATE TABLE IF NOT EXISTS llm_usage_daily (
+            day TEXT NOT NULL,
+            owner_id TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            model TEXT NOT NULL,
+            calls INTEGER NOT NULL,
+            prompt_tokens INTEGER NOT NULL,
+            completion_tokens INTEGER NOT NULL,
+            PRIMARY KEY (day, owner_id, endpoint, model)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_llm_usage_daily_owner ON llm_usage_daily (owner_id, day)",
+    ]),
+]
+
+def get_schema_version(conn) -> int:
+    """Returns the highest migration version applied to the database (0 if none)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+def run_migrations(conn=None):
+    """
+    Applies any pending migrations in version order.
+
+    Each migration runs in its own transaction together with the row that
+    records its version, so a failed migration leaves the schema at the last
+    good version and is retried on the next startup.
+
+    Args:
+        conn: Optional database connection. A new one is opened (and closed) if omitted.
+
+    Returns:
+        int: The schema version after migrating.
+    """
+    owns_connection = conn is None
+    if owns_connection:
+        conn = get_db_connection()
+
+    try:
+        current_version = get_schema_version(conn)
+        conn.commit()
+        pending = [m for m in MIGRATIONS if m[0] > current_version]
+        if not pending:
+            app_logger.info(f"Database schema is up to date (version {current_version}).")
+            return current_version
+
+        for version, description, statements in sorted(pending, key=lambda m: m[0]):
+            app_logger.info(f"Applying migration {version}: {description}")
+            try:
+                conn.execute("BEGIN")
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                    (version, description)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                app_logger.error(f"Migration {version} failed; schema left at version {current_version}.", exc_info=True)
+                raise
+            current_version = version
+
+        app_logger.info(f"Database schema migrated to version {current_version}.")
+        return current_version
+    finally:
+        if owns_connection:
+            conn.close()
@@ -1,10 +1,25 @@
 # src/routes/analyze.py
+import asyncio
 from flask import Blueprint, request, jsonify
-from src.services.persona import generate_persona_response
-from src.services.vision import analyze_image, analyze_combined
+from src.services.llm_client import run_async
+from src.services.panel_prompting import agenerate_panel_responses, persona_reaction
 from src.utils.history_manager import HistoryManager
 from src.utils.logger import app_logger
 
+async def analyze_personas(personas_details: list, message: str = None, image_data: str = None,
+                           panel_batch: bool = False, full_vision: bool = False) -> list:
+    """Every persona's reaction, with all LLM calls in flight together on the shared event loop."""
+    if panel_batch:
+        # Several personas per request; the stimulus and image are sent once per batch
+        responses = await agenerate_panel_responses(
+            personas_details, message=message, image_data=image_data, full_vision=full_vision
+        )
+    else:
+        responses = await asyncio.gather(*(
+            persona_reaction(persona_detail, message, image_data, full_vision) for persona_detail in personas_details
+        ))
+    return [{'persona': p, 'response': r} for p, r in zip(personas_details, responses)]
+
 def create_analyze_blueprint(history_manager_instance: HistoryManager):
     analyze_bp = Blueprint('analyze', __name__, url_prefix='/api')
 
@@ -19,6 +34,9 @@ def create_analyze_blueprint(history_manager_instance: HistoryManager):
             message = data.get('message')
             personas_details = data.get('personas', [])
             image_data = data.get('image')
+            panel_batch = bool(data.get('panel_batch', False))
+            # Full per-persona vision for high-fidelity runs; otherwise the image is described once
+            full_vision = bool(data.get('full_vision', False))
 
             if not personas_details:
                 app_logger.warning("Personas are required in /analyze request")
@@ -27,17 +45,7 @@ def create_analyze_blueprint(history_manager_instance: HistoryManager):
                 app_logger.warning("Either message or image is required in /analyze request")
                 return jsonify({'error': 'Either message or image is required', 'status': 'error'}), 400
 
-            results = []
-            for persona_detail in personas_details:
-                response_content = None
-                if image_data and message:
-                    response_content = analyze_combined(image_data, message, persona_detail)
-                elif image_data:
-                    response_content = analyze_image(image_data, persona_detail)
-                else:
-                    response_content = generate_persona_response(message, persona_detail)
-
-                results.append({'persona': persona_detail, 'response': response_content})
+            results = run_async(analyze_personas(personas_details, message, image_data, panel_batch, full_vision))
 
             history_manager_instance.add_entry(message, image_data, personas_details, results)
             app_logger.info(f"Analysis successful for {len(personas_details)} personas.")
@@ -26,7 +26,8 @@ def create_audience_blueprint(audience_service):
     def sample_personas(audience_id):
         data = request.get_json() or {}
         count = int(data.get('count', 8))
-        personas = audience_service.sample_personas_from_audience(audience_id, count=count)
+        diverse = bool(data.get('diverse', False))
+        personas = audience_service.sample_personas_from_audience(audience_id, count=count, diverse=diverse)
         return jsonify({'personas': personas})
 
     return bp 
\ No newline at end of file
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 
-def create_client_data_blueprint(client_data_service):
+def create_client_data_blueprint(client_data_service, ingestion_job_service):
     bp = Blueprint('client_data', __name__, url_prefix='/api/client_data')
 
     @bp.route('/upload', methods=['POST'])
@@ -9,9 +9,37 @@ def create_client_data_blueprint(client_data_service):
         file_path = data.get('file_path')
         owner_id = data.get('owner_id')
         audience_name = data.get('audience_name', 'Client Audience')
-        result = client_data_service.process_uploaded_file(file_path, owner_id, audience_name)
+        column_mapping = data.get('column_mapping')
+        data_id = data.get('data_id')
+        result = ingestion_job_service.submit_job(file_path, owner_id, audience_name, column_mapping, data_id)
+        if result.get('status') == 'error':
+            return jsonify(result), 400
+        return jsonify(result), 202
+
+    @bp.route('/profile', methods=['POST'])
+    def profile():
+        data = request.get_json()
+        file_path = data.get('file_path')
+        sample_rows = int(data.get('sample_rows', 50000))
+        result = client_data_service.profile_file(file_path, sample_rows)
+        if result.get('status') == 'error':
+            return jsonify(result), 400
         return jsonify(result)
 
+    @bp.route('/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        result = ingestion_job_service.get_job_status(job_id)
+        if result is None:
+            return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+        return jsonify(result)
+
+    @bp.route('/jobs/<job_id>/resume', methods=['POST'])
+    def resume_job(job_id):
+        result = ingestion_job_service.resume_job(job_id)
+        if result.get('status') == 'error':
+            return jsonify(result), 409
+        return jsonify(result), 202
+
     @bp.route('/map_columns', methods=['POST'])
     def map_columns():
         data = request.get_json()
@@ -20,4 +48,4 @@ def create_client_data_blueprint(client_data_service):
         result = client_data_service.map_columns(data_id, column_mapping)
         return jsonify(result)
 
-    return bp 
\ No newline at end of file
+    return bp
@@ -1,18 +1,24 @@
 # src/routes/focus_group.py
 from flask import Blueprint, request, jsonify
 from src.services.focus_group_service import FocusGroupSimulator, PersonaStyle
+from src.services.simulation_estimator import (
+    estimate_analytics, estimate_focus_group, estimate_injected_question, live_simulation_request, suggest_configurations
+)
 from src.utils.logger import app_logger
+from src.utils.metrics import ACTIVE_SIMULATIONS
 import uuid
-from src.services.audience_service import AudienceService
+from typing import TYPE_CHECKING
 
-# Forward declaration for type hinting
-# AudienceService = Type('AudienceService')
+# Imported for type hinting only; the real service is built lazily by the app
+if TYPE_CHECKING:
+    from src.services.audience_service import AudienceService
 
-def create_focus_group_blueprint(audience_service: AudienceService):
+def create_focus_group_blueprint(audience_service: 'AudienceService'):
     focus_group_bp = Blueprint('focus_group', __name__, url_prefix='/api/focus_group')
 
     # Store active simulations (in production, use Redis or database)
     active_simulations = {}
+    ACTIVE_SIMULATIONS.set_function(lambda: len(active_simulations))
 
     @focus_group_bp.route('/simulate', methods=['POST'])
     def simulate_focus_group_route():
@@ -34,7 +40,8 @@ def create_focus_group_blueprint(audience_service: AudienceService):
             if audience_id:
                 app_logger.info(f"Simulating focus group for audience_id: {audience_id}")
                 sample_count = int(group_size) if group_size else 8
-                personas_details = audience_service.sample_personas_from_audience(audience_id, count=sample_count)
+                diverse_panel = bool(data.get('diverse_panel', False))
+                personas_details = audience_service.sample_personas_from_audience(audience_id, count=sample_count, diverse=diverse_panel)
 
             stimulus_message = data.get('message')
             stimulus_image_data = data.get('image_data') 
@@ -52,7 +59,10 @@ def create_focus_group_blueprint(audience_service: AudienceService):
                 stimulus_image_data=stimulus_image_data,
                 questions=questions,
                 group_size=group_size,
-                open_discussion=open_discussion
+                open_discussion=open_discussion,
+                full_vision=bool(data.get('full_vision', False)),
+                model=data.get('model'),
+                snapshot_rounds=bool(data.get('snapshot_rounds', False))
             )
             
             # Set persona styles
@@ -90,6 +100,27 @@ def create_focus_group_blueprint(audience_service: AudienceService):
             app_logger.error(f"Error in /api/focus_group/simulate: {str(e)}", exc_info=True)
             return jsonify({'error': 'Internal server error during focus group simulation.', 'status': 'error'}), 500
             
+    @focus_group_bp.route('/estimate', methods=['POST'])
+    def estimate_focus_group_route():
+        """Estimates the calls, tokens, cost and time of a /simulate body, with cheaper configurations that meet target_seconds."""
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'No data provided', 'status': 'error'}), 400
+        target_seconds = data.get('target_seconds')
+        try:
+            target_seconds = float(target_seconds) if target_seconds is not None else None
+            estimate = estimate_focus_group(data)
+            suggestions = suggest_configurations(data, target_seconds)
+        except (TypeError, ValueError, AttributeError) as e:
+            return jsonify({'error': f'Invalid simulation config: {e}', 'status': 'error'}), 400
+        return jsonify({
+            'status': 'success',
+            'estimate': estimate,
+            'target_seconds': target_seconds,
+            'meets_target': target_seconds is None or estimate['expected_seconds'] <= target_seconds,
+            'suggestions': suggestions
+        })
+
     @focus_group_bp.route('/start_live', methods=['POST'])
     def start_live_simulation():
         """Start a live simulation that can be controlled in real-time."""
@@ -111,7 +142,8 @@ def create_focus_group_blueprint(audience_service: AudienceService):
             simulator = FocusGroupSimulator(
                 personas_details=personas,
                 stimulus_message=message,
-                stimulus_image_data=image_data
+                stimulus_image_data=image_data,
+                full_vision=bool(data.get('full_vision', False))
             )
             
             # Set persona styles
@@ -294,4 +326,33 @@ def create_focus_group_blueprint(audience_service: AudienceService):
             app_logger.error(f"Error completing simulation: {str(e)}", exc_info=True)
             return jsonify({'status': 'error', 'error': str(e)}), 500
 
+    # --- Admission estimates for the live routes, which depend on the simulation's state ---
+    # None (not LLM-bound) for unknown simulations: the route answers 404 without a call
+
+    def estimate_continue_round(data: dict, simulation_id: str):
+        simulator = active_simulations.get(simulation_id)
+        if simulator is None:
+            return None
+        return estimate_focus_group(live_simulation_request(simulator, 1))['total_tokens']
+
+    def estimate_inject_question(data: dict, simulation_id: str):
+        simulator = active_simulations.get(simulation_id)
+        if simulator is None or not data.get('question'):
+            return None
+        return estimate_injected_question(simulator, data['question'])['total_tokens']
+
+    def estimate_simulation_analytics(data: dict, simulation_id: str):
+        simulator = active_simulations.get(simulation_id)
+        if simulator is None:
+            return None
+        return estimate_analytics(simulator)['total_tokens'] or None
+
+    # Passed to create_usage_blueprint by the app
+    focus_group_bp.request_estimators = {
+        '/api/focus_group/<simulation_id>/continue_round': estimate_continue_round,
+        '/api/focus_group/<simulation_id>/inject_question': estimate_inject_question,
+        '/api/focus_group/<simulation_id>/analytics': estimate_simulation_analytics,
+        '/api/focus_group/<simulation_id>/complete': estimate_simulation_analytics,
+    }
+
     return focus_group_bp 
\ No newline at end of file
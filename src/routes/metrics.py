@@ -0,0 +1,34 @@
+# src/routes/metrics.py
+import time
+from flask import Blueprint, Response, g, request
+from src.utils.metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, registry
+
+def create_metrics_blueprint():
+    """
+    Serves /metrics in the Prometheus text format and times every request
+    handled by the app, labelled by route pattern rather than raw path so
+    the number of series stays bounded.
+    """
+    metrics_bp = Blueprint('metrics', __name__)
+
+    @metrics_bp.before_app_request
+    def start_request_timer():
+        g.request_start_time = time.perf_counter()
+
+    @metrics_bp.after_app_request
+    def record_request_duration(response):
+        start_time = g.pop('request_start_time', None)
+        if start_time is not None:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start_time,
+                route=request.url_rule.rule if request.url_rule else 'unmatched',
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+    @metrics_bp.route('/metrics', methods=['GET'])
+    def metrics_route():
+        return Response(registry.render(), mimetype=CONTENT_TYPE)
+
+    return metrics_bp
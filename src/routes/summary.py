@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify
-from src.services.summary import generate_summary_from_responses 
+from src.services.summary import SummarySessionService
 from src.utils.logger import app_logger
 
-def create_summary_blueprint():
+def create_summary_blueprint(summary_session_service: SummarySessionService):
     summary_bp = Blueprint('summary_route', __name__, url_prefix='/api')
 
     @summary_bp.route('/summary', methods=['POST'])
@@ -13,17 +13,22 @@ def create_summary_blueprint():
                 app_logger.warning("No responses provided for summary generation.")
                 return jsonify({'error': 'No responses provided', 'status': 'error'}), 400
 
-            # Use the function from services.summary
-            summary_text = generate_summary_from_responses(data['responses'])
-            
-            # Check if the service returned an error string
-            if summary_text.startswith("Error generating summary:"):
-                app_logger.error(f"Summary service returned an error: {summary_text}")
-                # You might want to return a more generic error to the client
+            # Pass the session_id from a previous call to only summarise responses added since
+            try:
+                result = summary_session_service.summarize(data['responses'], session_id=data.get('session_id'))
+            except Exception as e:
+                app_logger.error(f"Summary service failed: {str(e)}", exc_info=True)
                 return jsonify({'error': 'Failed to generate summary.', 'status': 'error'}), 500
 
-            app_logger.info("Summary generated successfully by route.")
-            return jsonify({'summary': summary_text, 'status': 'success'})
+            app_logger.info(f"Summary generated successfully by route ({result['mode']}).")
+            return jsonify({
+                'summary': result['summary'],
+                'session_id': result['session_id'],
+                'mode': result['mode'],
+                'responses_covered': result['responses_covered'],
+                'new_responses': result['new_responses'],
+                'status': 'success'
+            })
         except Exception as e:
             app_logger.error(f"Error in /api/summary route: {str(e)}", exc_info=True)
             return jsonify({'error': 'An internal error occurred.', 'status': 'error'}), 500
@@ -5,11 +5,47 @@ def create_test_content_blueprint(content_test_service):
 
     @bp.route('/run', methods=['POST'])
     def run_content_test():
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data:
+            return jsonify({"status": "error", "message": "No data provided"}), 400
         audience_id = data.get('audience_id')
         content = data.get('content')
-        sample_size = int(data.get('sample_size', 15))
-        result = content_test_service.test_content(audience_id, content, sample_size)
+        if not content:
+            return jsonify({"status": "error", "message": "content is required"}), 400
+        diverse = bool(data.get('diverse', False))
+        adaptive = bool(data.get('adaptive', False))
+        metric = data.get('metric', 'clarity')
+        precision = data.get('precision')
+        panel_batch = bool(data.get('panel_batch', False))
+        try:
+            sample_size = int(data.get('sample_size', 15))
+            result = content_test_service.test_content(
+                audience_id, content, sample_size, diverse=diverse, adaptive=adaptive, metric=metric,
+                precision=float(precision) if precision is not None else None, panel_batch=panel_batch
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        return jsonify(result)
+
+    @bp.route('/variants', methods=['POST'])
+    def run_variant_test():
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data:
+            return jsonify({"status": "error", "message": "No data provided"}), 400
+        audience_id = data.get('audience_id')
+        variants = data.get('variants')
+        if not variants or not isinstance(variants, list):
+            return jsonify({"status": "error", "message": "variants must be a non-empty list"}), 400
+        diverse = bool(data.get('diverse', False))
+        single_prompt = bool(data.get('single_prompt', True))
+        try:
+            sample_size = int(data.get('sample_size', 15))
+            baseline = int(data.get('baseline', 0))
+            result = content_test_service.test_variants(
+                audience_id, variants, sample_size, diverse=diverse, single_prompt=single_prompt, baseline=baseline
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
         return jsonify(result)
 
     return bp 
\ No newline at end of file
@@ -0,0 +1,111 @@
+# src/routes/tracing.py
+import hmac
+import json
+import random
+from flask import Blueprint, Response, g, jsonify, request
+from src.config import config
+from src.utils.logger import app_logger
+from src.utils.profiler import SamplingProfiler
+from src.utils.tracing import TraceBuffer, end_trace, start_trace
+
+# Blueprints whose requests are never traced, so reading traces does not evict them
+UNTRACED_BLUEPRINTS = ('tracing', 'metrics')
+
+def is_admin_request() -> bool:
+    """True when the request carries the configured ADMIN_TOKEN in X-Admin-Token."""
+    admin_token = getattr(config['default'], 'ADMIN_TOKEN', None)
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(admin_token) and hmac.compare_digest(supplied.encode('utf-8'), admin_token.encode('utf-8'))
+
+def create_tracing_blueprint(trace_buffer: TraceBuffer = None):
+    """
+    Traces API requests and serves the recorded traces to admins.
+
+    A sampled request (TRACE_SAMPLE_RATE, or any request sent with
+    X-Trace: 1) records spans for its phases, LLM calls and DB writes and
+    answers with an X-Trace-Id header. An admin request sent with
+    X-Profile: 1 is also run under the sampling profiler; its response
+    carries X-Profile-Url, which serves folded stacks for flamegraph.pl or
+    speedscope.
+    """
+    tracing_bp = Blueprint('tracing', __name__, url_prefix='/api/traces')
+    trace_buffer = trace_buffer or TraceBuffer(getattr(config['default'], 'TRACE_BUFFER_SIZE', 200))
+
+    @tracing_bp.before_app_request
+    def begin_request_trace():
+        if request.blueprint is None or request.blueprint in UNTRACED_BLUEPRINTS:
+            return
+        profile = request.headers.get('X-Profile') == '1' and is_admin_request()
+        sampled = random.random() < getattr(config['default'], 'TRACE_SAMPLE_RATE', 1.0)
+        if not (profile or sampled or request.headers.get('X-Trace') == '1'):
+            return
+        route = request.url_rule.rule if request.url_rule else request.path
+        g.trace, g.trace_token = start_trace(f"{request.method} {route}", method=request.method, route=route)
+        if profile:
+            g.profiler = SamplingProfiler(getattr(config['default'], 'PROFILE_SAMPLE_INTERVAL', 0.005)).start()
+
+    @tracing_bp.after_app_request
+    def finish_request_trace(response):
+        trace = g.pop('trace', None)
+        if trace is None:
+            return response
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            trace.profile = profiler.stop().folded()
+            trace.attributes['profile_samples'] = profiler.sample_count
+            response.headers['X-Profile-Url'] = f"{tracing_bp.url_prefix}/{trace.trace_id}/profile"
+        end_trace(g.pop('trace_token'), status=response.status_code)
+        trace_buffer.add(trace)
+        response.headers['X-Trace-Id'] = trace.trace_id
+        return response
+
+    @tracing_bp.teardown_app_request
+    def discard_unfinished_trace(exc):
+        # Only reached with a token left when the response was never finalised
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+        token = g.pop('trace_token', None)
+        if token is not None:
+            end_trace(token, error=type(exc).__name__ if exc else 'unfinished')
+
+    @tracing_bp.before_request
+    def require_admin():
+        if not is_admin_request():
+            app_logger.warning(f"Rejected non-admin request to {request.path}")
+            return jsonify({'status': 'error', 'message': 'Admin token required.'}), 403
+
+    @tracing_bp.route('', methods=['GET'])
+    def list_traces_route():
+        limit = request.args.get('limit', 50, type=int)
+        traces = [{
+            'trace_id': t.trace_id,
+            'name': t.name,
+            'start_time': t.start_wall,
+            'duration_ms': round(t.duration * 1000, 3) if t.duration is not None else None,
+            'status': t.attributes.get('status'),
+            'spans': len(t.spans),
+            'has_profile': t.profile is not None
+        } for t in trace_buffer.recent(limit)]
+        return jsonify({'status': 'success', 'traces': traces})
+
+    @tracing_bp.route('/<trace_id>', methods=['GET'])
+    def get_trace_route(trace_id):
+        trace = trace_buffer.get(trace_id)
+        if trace is None:
+            return jsonify({'status': 'error', 'message': 'Trace not found.'}), 404
+        if request.args.get('format') == 'chrome':
+            return Response(
+                json.dumps(trace.to_chrome_trace()), mimetype='application/json',
+                headers={'Content-Disposition': f'attachment; filename=trace-{trace_id}.json'}
+            )
+        return jsonify({'status': 'success', 'trace': trace.to_dict()})
+
+    @tracing_bp.route('/<trace_id>/profile', methods=['GET'])
+    def get_profile_route(trace_id):
+        trace = trace_buffer.get(trace_id)
+        if trace is None or trace.profile is None:
+            return jsonify({'status': 'error', 'message': 'Profile not found.'}), 404
+        return Response(trace.profile, mimetype='text/plain')
+
+    return tracing_bp
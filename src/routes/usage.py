@@ -0,0 +1,79 @@
+# src/routes/usage.py
+from flask import Blueprint, g, jsonify, request
+from src.routes.tracing import is_admin_request
+from src.services.usage_service import (
+    AdmissionController, AdmissionRejected, UsageLedger, estimate_request_tokens, reset_usage_context, set_usage_context
+)
+from src.utils.logger import app_logger
+from src.utils.metrics import ADMISSION_DECISIONS
+
+# Blueprints whose requests are neither attributed nor admission-checked
+UNMETERED_BLUEPRINTS = ('tracing', 'metrics', 'usage')
+
+def create_usage_blueprint(usage_ledger: UsageLedger, admission_controller: AdmissionController = None, estimators: dict = None):
+    """
+    Attributes LLM usage to the requesting owner and gates LLM-bound routes.
+
+    The owner is read from the X-Owner-Id header, or the request body's
+    owner_id, and is 'anonymous' otherwise. Before an LLM-bound route runs
+    its tokens are estimated and the admission controller either admits it,
+    holds it until capacity frees up, or answers 429 (owner budget) or 503
+    (no capacity) with a Retry-After header. estimators adds estimators
+    for routes whose cost depends on state another blueprint holds, such
+    as live focus group simulations. Admins can read the daily usage
+    rollups from /api/usage.
+    """
+    usage_bp = Blueprint('usage', __name__, url_prefix='/api/usage')
+    admission_controller = admission_controller or AdmissionController(usage_ledger)
+
+    @usage_bp.before_app_request
+    def admit_request():
+        if request.blueprint is None or request.blueprint in UNMETERED_BLUEPRINTS:
+            return
+        data = request.get_json(silent=True) if request.is_json else None
+        owner_id = request.headers.get('X-Owner-Id') or (data.get('owner_id') if isinstance(data, dict) else None)
+        route = request.url_rule.rule if request.url_rule else request.path
+        g.usage_token = set_usage_context(owner_id, route)
+
+        # Any method: GET /api/focus_group/<id>/analytics makes an LLM call too
+        estimated_tokens = estimate_request_tokens(route, data, request.view_args, estimators)
+        if estimated_tokens is None:
+            return
+        try:
+            g.admission = admission_controller.admit(owner_id or 'anonymous', estimated_tokens)
+        except AdmissionRejected as e:
+            outcome = 'rejected_budget' if e.status_code == 429 else 'rejected_capacity'
+            ADMISSION_DECISIONS.inc(route=route, outcome=outcome)
+            app_logger.warning("Rejected %s for owner '%s' (%s, ~%d tokens).", route, owner_id or 'anonymous', outcome, estimated_tokens)
+            response = jsonify(dict(e.details, status='error', message=str(e), estimated_tokens=e.estimated_tokens))
+            if e.retry_after:
+                response.headers['Retry-After'] = str(e.retry_after)
+            return response, e.status_code
+        ADMISSION_DECISIONS.inc(route=route, outcome='queued' if g.admission[2] else 'admitted')
+
+    @usage_bp.teardown_app_request
+    def release_request(exc):
+        admission = g.pop('admission', None)
+        if admission is not None:
+            admission_controller.release(admission)
+        token = g.pop('usage_token', None)
+        if token is not None:
+            reset_usage_context(token)
+
+    @usage_bp.before_request
+    def require_admin():
+        if not is_admin_request():
+            app_logger.warning(f"Rejected non-admin request to {request.path}")
+            return jsonify({'status': 'error', 'message': 'Admin token required.'}), 403
+
+    @usage_bp.route('', methods=['GET'])
+    def get_usage_route():
+        owner_id = request.args.get('owner_id')
+        days = request.args.get('days', 7, type=int)
+        return jsonify({
+            'status': 'success',
+            'usage': usage_ledger.rollups(owner_id, days),
+            'tokens_in_flight': admission_controller.tokens_in_flight
+        })
+
+    return usage_bp
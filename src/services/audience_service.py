@@ -1,5 +1,6 @@
 # src/services/audience_service.py
 import json
+from src.services.panel_selector import PanelSelector
 from src.utils.logger import app_logger
 
 class AudienceService:
@@ -16,6 +17,7 @@ class AudienceService:
         """
         self.db = db_connection
         self.persona_service = persona_service
+        self.panel_selector = None
         app_logger.info("AudienceService initialized.")
 
     def create_audience_from_filters(self, name: str, audience_type: str, criteria: dict, owner_id: str = None):
@@ -41,6 +43,24 @@ class AudienceService:
         audience_id = cursor.lastrowid
         return {"id": audience_id, "name": name, "type": audience_type, "criteria": criteria}
 
+    def update_audience_criteria(self, audience_id: int, criteria: dict, db=None):
+        """
+        Replaces the stored criteria of an existing audience.
+
+        Args:
+            audience_id (int): The ID of the audience to update.
+            criteria (dict): The new criteria dictionary.
+            db: Optional connection to write with (defaults to the service connection).
+        """
+        app_logger.info(f"Updating criteria for audience {audience_id}.")
+        conn = db or self.db
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE audiences SET criteria = ? WHERE id = ?",
+            (json.dumps(criteria), audience_id)
+        )
+        conn.commit()
+
     def get_audience_by_id(self, audience_id: str):
         """
         Retrieves a specific audience by its ID.
@@ -78,12 +98,26 @@ class AudienceService:
             for row in rows
         ]
 
-    def sample_personas_from_audience(self, audience_id: str, count: int = 8):
+    def sample_personas_from_audience(self, audience_id: str, count: int = 8, diverse: bool = False):
         """
         Samples a number of unique personas using the ephemeral generator.
+
+        With diverse=True, PANEL_OVERSAMPLE_FACTOR times as many candidates are
+        generated and the PanelSelector keeps the most mutually different ones,
+        so near-identical profiles do not take up several panel slots.
         """
-        app_logger.info(f"Sampling {count} unique personas for audience {audience_id}.")
-        
+        app_logger.info(f"Sampling {count} unique personas for audience {audience_id} (diverse={diverse}).")
+
+        if diverse:
+            if self.panel_selector is None:
+                self.panel_selector = PanelSelector(self.persona_service.embedding_service)
+            candidates = self._generate_personas(audience_id, count * self.panel_selector.oversample_factor)
+            selected, _ = self.panel_selector.select(candidates, count)
+            return [candidates[i] for i in selected]
+
+        return self._generate_personas(audience_id, count)
+
+    def _generate_personas(self, audience_id: str, count: int) -> list:
         # In a real scenario, you'd use the audience_id to get criteria like region.
         # For now, we'll just use a default region.
         region = "United Kingdom" # Placeholder region
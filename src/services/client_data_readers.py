@@ -0,0 +1,182 @@
+# src/services/client_data_readers.py
+"""
+Format-detecting readers for client data files.
+
+Every reader yields pandas DataFrame chunks that contain only the requested
+columns, read as text, so the ingestion pipeline is the same whatever the
+client sent. Parquet and Excel support need the optional pyarrow and openpyxl
+packages and are imported only when such a file is read.
+"""
+import os
+from itertools import islice
+import pandas as pd
+
+# Leading bytes of the container formats we accept
+MAGIC_NUMBERS = [
+    (b'PAR1', {'format': 'parquet', 'compression': None}),
+    (b'\x1f\x8b', {'format': 'csv', 'compression': 'gzip'}),
+    (b'BZh', {'format': 'csv', 'compression': 'bz2'}),
+    (b'\x28\xb5\x2f\xfd', {'format': 'csv', 'compression': 'zstd'}),
+    (b'\xfd7zXZ\x00', {'format': 'csv', 'compression': 'xz'}),
+]
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+TEXT_EXTENSIONS = ('.csv', '.txt', '.tsv')
+
+def detect_format(file_path: str) -> dict:
+    """
+    Works out how to read a file from its leading bytes, falling back to the extension.
+
+    Returns:
+        dict: {'format': 'csv' | 'parquet' | 'excel', 'compression': str or None}
+
+    Raises:
+        ValueError: If the file does not exist or is not a supported format.
+    """
+    if not file_path or not os.path.isfile(file_path):
+        raise ValueError(f"File not found: {file_path}")
+
+    with open(file_path, 'rb') as f:
+        head = f.read(8)
+    lower_path = file_path.lower()
+
+    for magic, detected in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return dict(detected)
+    if head.startswith(b'PK\x03\x04'):
+        # Zip container: either an Excel workbook or a zipped CSV
+        if lower_path.endswith(EXCEL_EXTENSIONS):
+            return {'format': 'excel', 'compression': None}
+        return {'format': 'csv', 'compression': 'zip'}
+    if lower_path.endswith(TEXT_EXTENSIONS):
+        return {'format': 'csv', 'compression': None}
+    raise ValueError("Unsupported file format. Please use CSV (optionally gzip/bz2/zip/xz/zstd compressed), Parquet or Excel (.xlsx).")
+
+def read_header(file_path: str, file_format: dict = None) -> list:
+    """Returns the column names of a file without reading its rows."""
+    file_format = file_format or detect_format(file_path)
+    kind = file_format['format']
+    if kind == 'parquet':
+        return list(_parquet_file(file_path).schema_arrow.names)
+    if kind == 'excel':
+        workbook = _open_workbook(file_path)
+        try:
+            first_row = next(workbook.active.iter_rows(values_only=True), ())
+            return [str(value) for value in first_row if value is not None]
+        finally:
+            workbook.close()
+    return list(pd.read_csv(file_path, nrows=0, compression=file_format['compression'], sep=_separator(file_path)).columns)
+
+def count_rows(file_path: str, file_format: dict = None):
+    """
+    Returns the exact row count when it is cheap to get (Parquet metadata),
+    otherwise None.
+    """
+    file_format = file_format or detect_format(file_path)
+    if file_format['format'] == 'parquet':
+        return _parquet_file(file_path).metadata.num_rows
+    return None
+
+def iter_chunks(file_path: str, columns: list = None, chunk_size: int = 10000, skip_rows: int = 0, file_format: dict = None):
+    """
+    Yields DataFrame chunks of a client file with every column read as text.
+
+    Args:
+        file_path (str): The path to the client data file.
+        columns (list, optional): Columns to read. Parquet only reads these from disk.
+        chunk_size (int): Maximum rows per chunk.
+        skip_rows (int): Number of data rows to skip before the first chunk.
+        file_format (dict, optional): Result of detect_format, if already known.
+    """
+    file_format = file_format or detect_format(file_path)
+    kind = file_format['format']
+    if kind == 'parquet':
+        yield from _iter_parquet(file_path, columns, chunk_size, skip_rows)
+    elif kind == 'excel':
+        yield from _iter_excel(file_path, columns, chunk_size, skip_rows)
+    else:
+        yield from _iter_csv(file_path, columns, chunk_size, skip_rows, file_format['compression'])
+
+def _separator(file_path: str) -> str:
+    return '\t' if '.tsv' in file_path.lower() else ','
+
+def _iter_csv(file_path, columns, chunk_size, skip_rows, compression):
+    # pandas decompresses gzip/bz2/zip/xz/zstd streams as it reads. A resumed
+    # read skips the header line plus skip_rows by count and names the columns
+    # itself: a range of row numbers would be held in memory as a set.
+    header = None
+    if skip_rows:
+        header = read_header(file_path, {'format': 'csv', 'compression': compression})
+    reader = pd.read_csv(
+        file_path,
+        sep=_separator(file_path),
+        compression=compression,
+        usecols=columns,
+        dtype='string',
+        header=None if header else 'infer',
+        names=header,
+        skiprows=skip_rows + 1 if header else None,
+        chunksize=chunk_size
+    )
+    yield from reader
+
+def _parquet_file(file_path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Reading Parquet files requires the 'pyarrow' package.")
+    return pq.ParquetFile(file_path)
+
+def _iter_parquet(file_path, columns, chunk_size, skip_rows):
+    parquet_file = _parquet_file(file_path)
+
+    # Skip whole row groups using the footer metadata, then trim the first batch
+    row_groups = []
+    for index in range(parquet_file.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(index).num_rows
+        if skip_rows >= group_rows and not row_groups:
+            skip_rows -= group_rows
+            continue
+        row_groups.append(index)
+    if not row_groups:
+        return
+
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, row_groups=row_groups, columns=columns):
+        if skip_rows:
+            if skip_rows >= batch.num_rows:
+                skip_rows -= batch.num_rows
+                continue
+            batch = batch.slice(skip_rows)
+            skip_rows = 0
+        yield batch.to_pandas().astype('string')
+
+def _open_workbook(file_path):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("Reading Excel files requires the 'openpyxl' package.")
+    # read_only streams rows from the sheet XML instead of loading the workbook
+    return openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+
+def _iter_excel(file_path, columns, chunk_size, skip_rows):
+    workbook = _open_workbook(file_path)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(value) if value is not None else '' for value in next(rows, ())]
+        wanted = columns or [name for name in header if name]
+        missing = [name for name in wanted if name not in header]
+        if missing:
+            raise ValueError(f"Columns not found in workbook: {', '.join(missing)}")
+        positions = [header.index(name) for name in wanted]
+
+        rows = islice(rows, skip_rows, None)
+        while True:
+            batch = list(islice(rows, chunk_size))
+            if not batch:
+                break
+            data = [
+                [row[pos] if pos < len(row) else None for pos in positions]
+                for row in batch
+            ]
+            yield pd.DataFrame(data, columns=wanted, dtype=object).astype('string')
+    finally:
+        workbook.close()
@@ -1,74 +1,376 @@
 # src/services/client_data_service.py
+import json
+import os
+import time
+import numpy as np
 import pandas as pd
+from src.config import config
+from src.services import client_data_readers
 from src.utils.logger import app_logger
 
+# Standard persona schema that client columns are mapped onto.
+# Everything is read as text (no per-chunk type inference) and numeric
+# fields are coerced afterwards so a stray value never aborts a chunk.
+PERSONA_SCHEMA_FIELDS = {
+    'name': 'string',
+    'age': 'numeric',
+    'gender': 'string',
+    'region': 'string',
+    'income': 'numeric',
+    'occupation': 'string',
+}
+
+# Normalised client column names that map straight onto a persona field
+FIELD_SYNONYMS = {
+    'name': ['name', 'full name', 'first name', 'customer name', 'contact name', 'fullname'],
+    'age': ['age', 'years', 'age years', 'customer age'],
+    'gender': ['gender', 'sex'],
+    'region': ['region', 'town', 'city', 'location', 'county', 'area', 'locality'],
+    'income': ['income', 'salary', 'annual income', 'household income', 'earnings'],
+    'occupation': ['occupation', 'job', 'job title', 'profession', 'role'],
+}
+GENDER_VALUES = {'male', 'female', 'm', 'f', 'man', 'woman', 'non-binary', 'nonbinary', 'other'}
+
 class ClientDataService:
     """
     Handles the ingestion, processing, and management of client-provided data.
     """
-    def __init__(self, db_connection, audience_service):
+    def __init__(self, db_connection, audience_service, app_config=None):
         """
         Initializes the ClientDataService.
 
         Args:
             db_connection: An active database connection/session.
             audience_service: Service for managing audiences.
+            app_config (optional): Config class to read settings from; defaults to config['default'].
         """
         self.db = db_connection
         self.audience_service = audience_service
+        self.chunk_size = getattr(app_config or config['default'], 'CLIENT_DATA_CHUNK_SIZE', 10000)
         app_logger.info("ClientDataService initialized.")
 
-    def process_uploaded_file(self, file_path: str, owner_id: str, client_audience_name: str):
+    def process_uploaded_file(self, file_path: str, owner_id: str, client_audience_name: str, column_mapping: dict = None, data_id: str = None):
         """
-        Processes an uploaded CSV or Excel file to create a custom audience.
+        Processes an uploaded client data file to create a custom audience.
+
+        CSV (plain or compressed), Parquet and Excel files are supported. The
+        file is streamed in chunks of CLIENT_DATA_CHUNK_SIZE rows, so memory use
+        is bounded by the chunk size rather than the file size. Each chunk
+        becomes a batch of personas committed in one transaction.
 
         Args:
             file_path (str): The path to the uploaded data file.
             owner_id (str): The ID of the client/user who owns this data.
             client_audience_name (str): The name for the new audience to be created.
+            column_mapping (dict, optional): Client column -> persona field mapping.
+                Falls back to a mapping saved via map_columns, then to columns
+                whose names already match the persona schema.
+            data_id (str, optional): Key of a saved mapping (defaults to file_path).
 
         Returns:
             dict: A summary of the processing results.
         """
         app_logger.info(f"Processing uploaded file '{file_path}' for owner '{owner_id}'.")
         try:
-            # Simple logic for reading a CSV. Add logic for other formats if needed.
-            if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path)
-            else:
-                raise ValueError("Unsupported file format. Please use CSV.")
+            client_data_readers.detect_format(file_path)
+
+            mapping = self.resolve_column_mapping(file_path, column_mapping, data_id)
 
             # Create a new audience for this client data
-            criteria = {"source_file": file_path, "record_count": len(df)}
+            criteria = {"source_file": file_path, "column_mapping": mapping}
             audience = self.audience_service.create_audience_from_filters(
                 name=client_audience_name,
                 audience_type='client',
                 criteria=criteria,
                 owner_id=owner_id
             )
-            
-            # TODO: For each row, create a persona linked to this audience
+
+            stats = self.ingest_file(file_path, audience.get("id"), mapping)
+
+            criteria["record_count"] = stats["rows_processed"]
+            self.audience_service.update_audience_criteria(audience.get("id"), criteria)
 
             return {
                 "status": "success",
-                "message": f"Successfully processed {len(df)} records.",
+                "message": f"Successfully processed {stats['rows_processed']} records.",
                 "audience_id": audience.get("id"),
-                "audience_name": client_audience_name
+                "audience_name": client_audience_name,
+                "records_processed": stats["rows_processed"],
+                "personas_created": stats["personas_created"],
+                "elapsed_seconds": stats["elapsed_seconds"],
+                "rows_per_second": stats["rows_per_second"]
             }
 
         except Exception as e:
             app_logger.error(f"Failed to process uploaded file {file_path}: {e}", exc_info=True)
             return {"status": "error", "message": str(e)}
 
+    def ingest_file(self, file_path: str, audience_id: int, mapping: dict, start_row: int = 0, db=None, on_chunk=None) -> dict:
+        """
+        Streams a client file into personas for the given audience.
+
+        Args:
+            file_path (str): The path to the client data file.
+            audience_id (int): The audience the personas are linked to.
+            mapping (dict): Client column -> persona field mapping.
+            start_row (int): Number of data rows to skip (a resume checkpoint).
+            db: Optional connection to write with (defaults to the service connection).
+            on_chunk (callable, optional): Called as on_chunk(conn, rows_done, rows_per_second)
+                after each chunk is written but before it is committed, so a
+                checkpoint written there lands in the same transaction.
+
+        Returns:
+            dict: Row counts and throughput for the ingestion.
+        """
+        persona_service = self.audience_service.persona_service
+        conn = db or self.db
+        rows_processed = 0
+        personas_created = 0
+        start_time = time.perf_counter()
+
+        for chunk in self._iter_mapped_chunks(file_path, mapping, skip_rows=start_row):
+            records = self._chunk_to_records(chunk)
+
+            def checkpoint(chunk_conn):
+                if on_chunk:
+                    rows_done = rows_processed + len(chunk)
+                    on_chunk(chunk_conn, start_row + rows_done, rows_done / max(time.perf_counter() - start_time, 1e-9))
+
+            persona_ids = persona_service.create_personas_from_records(audience_id, records, source='client', db=conn, before_commit=checkpoint)
+            rows_processed += len(chunk)
+            personas_created += len(persona_ids)
+            rows_per_second = rows_processed / max(time.perf_counter() - start_time, 1e-9)
+
+            app_logger.info(f"Ingested {start_row + rows_processed} rows from '{file_path}' ({rows_per_second:.0f} rows/s).")
+
+        elapsed = time.perf_counter() - start_time
+        return {
+            "rows_processed": start_row + rows_processed,
+            "personas_created": personas_created,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows_processed / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+    def estimate_row_count(self, file_path: str, sample_bytes: int = 1 << 20) -> int:
+        """
+        Estimates the number of data rows without reading the whole file.
+
+        Parquet row counts come from the footer. For plain CSV the file size is
+        divided by the average line length of the first sample_bytes. Compressed
+        CSV and Excel files return None, because their size says little about
+        their row count.
+        """
+        file_format = client_data_readers.detect_format(file_path)
+        if file_format['format'] == 'parquet':
+            return client_data_readers.count_rows(file_path, file_format)
+        if file_format['format'] != 'csv' or file_format['compression']:
+            return None
+
+        file_size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            sample = f.read(sample_bytes)
+        lines = sample.count(b'\n')
+        if len(sample) >= file_size:
+            # Whole file sampled: exact count minus the header row
+            if sample and not sample.endswith(b'\n'):
+                lines += 1
+            return max(lines - 1, 0)
+        if lines == 0:
+            return 0
+        return max(int(file_size / (len(sample) / lines)) - 1, 0)
+
+    def resolve_column_mapping(self, file_path: str, column_mapping: dict = None, data_id: str = None) -> dict:
+        """
+        Works out which client columns to read and which persona fields they feed.
+
+        Returns:
+            dict: A validated client column -> persona field mapping.
+        """
+        mapping = column_mapping or self.get_column_mapping(data_id or file_path)
+        if not mapping:
+            header = client_data_readers.read_header(file_path)
+            mapping = {col: col.strip().lower() for col in header if col.strip().lower() in PERSONA_SCHEMA_FIELDS}
+        if not mapping:
+            raise ValueError("No columns could be mapped to the persona schema. Please supply a column mapping.")
+        self._validate_mapping(mapping)
+        return mapping
+
+    def _iter_mapped_chunks(self, file_path: str, mapping: dict, skip_rows: int = 0):
+        """Yields chunks of the file containing only mapped columns, renamed to persona fields."""
+        reader = client_data_readers.iter_chunks(
+            file_path,
+            columns=list(mapping.keys()),
+            chunk_size=self.chunk_size,
+            skip_rows=skip_rows
+        )
+        for chunk in reader:
+            chunk = chunk.rename(columns=mapping)
+            for field, kind in PERSONA_SCHEMA_FIELDS.items():
+                if kind == 'numeric' and field in chunk.columns:
+                    chunk[field] = pd.to_numeric(chunk[field], errors='coerce')
+            yield chunk
+
+    def profile_file(self, file_path: str, sample_rows: int = 50000) -> dict:
+        """
+        Profiles a client file in a single pass and proposes a column mapping.
+
+        Args:
+            file_path (str): The path to the client data file.
+            sample_rows (int): Maximum number of rows to profile.
+
+        Returns:
+            dict: Per-column statistics and a proposed map_columns mapping.
+        """
+        app_logger.info(f"Profiling client file '{file_path}'.")
+        try:
+            file_format = client_data_readers.detect_format(file_path)
+            header = client_data_readers.read_header(file_path, file_format)
+            stats = {col: {'non_null': 0, 'numeric': 0, 'gender_like': 0, 'distinct': set(), 'samples': [], 'numbers': []} for col in header}
+            rows_profiled = 0
+
+            for chunk in client_data_readers.iter_chunks(file_path, chunk_size=min(self.chunk_size, sample_rows), file_format=file_format):
+                chunk = chunk.head(sample_rows - rows_profiled)
+                rows_profiled += len(chunk)
+                for col in header:
+                    values = chunk[col].dropna().str.strip()
+                    values = values[values != '']
+                    col_stats = stats[col]
+                    col_stats['non_null'] += len(values)
+                    numbers = pd.to_numeric(values, errors='coerce').dropna()
+                    col_stats['numeric'] += len(numbers)
+                    col_stats['numbers'].append(numbers.to_numpy())
+                    col_stats['gender_like'] += int(values.str.lower().isin(GENDER_VALUES).sum())
+                    if len(col_stats['distinct']) < 1000:
+                        col_stats['distinct'].update(values.unique()[:1000])
+                    if len(col_stats['samples']) < 5:
+                        col_stats['samples'].extend(values.head(5 - len(col_stats['samples'])).tolist())
+                if rows_profiled >= sample_rows:
+                    break
+
+            columns = [self._summarise_column(col, stats[col], rows_profiled) for col in header]
+            return {
+                "status": "success",
+                "format": file_format,
+                "rows_profiled": rows_profiled,
+                "columns": columns,
+                "proposed_mapping": self._propose_mapping(columns)
+            }
+        except Exception as e:
+            app_logger.error(f"Failed to profile file {file_path}: {e}", exc_info=True)
+            return {"status": "error", "message": str(e)}
+
+    @staticmethod
+    def _summarise_column(name: str, col_stats: dict, rows_profiled: int) -> dict:
+        non_null = col_stats['non_null']
+        is_numeric = non_null > 0 and col_stats['numeric'] / non_null >= 0.9
+        summary = {
+            "name": name,
+            "inferred_type": "numeric" if is_numeric else "text",
+            "null_ratio": round(1 - non_null / rows_profiled, 3) if rows_profiled else 1.0,
+            "distinct_count": len(col_stats['distinct']),
+            "distinct_count_capped": len(col_stats['distinct']) >= 1000,
+            "sample_values": col_stats['samples'],
+            "gender_like_ratio": round(col_stats['gender_like'] / non_null, 3) if non_null else 0.0
+        }
+        if is_numeric:
+            numbers = np.concatenate(col_stats['numbers'])
+            summary.update({
+                "min": float(numbers.min()),
+                "max": float(numbers.max()),
+                "median": float(np.median(numbers))
+            })
+        return summary
+
+    @staticmethod
+    def _propose_mapping(columns: list) -> dict:
+        """Matches columns to persona fields by name first, then by their values."""
+        proposed = {}
+        taken = set()
+
+        def normalise(name):
+            return ' '.join(name.lower().replace('_', ' ').replace('-', ' ').split())
+
+        for column in columns:
+            normalised = normalise(column['name'])
+            for field, synonyms in FIELD_SYNONYMS.items():
+                if field not in taken and normalised in synonyms:
+                    proposed[column['name']] = field
+                    taken.add(field)
+                    break
+
+        for column in columns:
+            if column['name'] in proposed:
+                continue
+            field = None
+            if column['inferred_type'] == 'numeric':
+                if 'age' not in taken and 16 <= column['median'] <= 100 and column['max'] <= 120:
+                    field = 'age'
+                elif 'income' not in taken and column['median'] >= 5000:
+                    field = 'income'
+            elif 'gender' not in taken and column['gender_like_ratio'] >= 0.8:
+                field = 'gender'
+            if field:
+                proposed[column['name']] = field
+                taken.add(field)
+        return proposed
+
+    @staticmethod
+    def _chunk_to_records(chunk) -> list:
+        """Converts a chunk to demographic dicts, dropping missing values."""
+        columns = list(chunk.columns)
+        records = []
+        for row in chunk.itertuples(index=False, name=None):
+            record = {}
+            for field, value in zip(columns, row):
+                if pd.isna(value):
+                    continue
+                if PERSONA_SCHEMA_FIELDS.get(field) == 'numeric':
+                    value = int(value) if float(value).is_integer() else float(value)
+                else:
+                    value = str(value).strip()
+                record[field] = value
+            records.append(record)
+        return records
+
+    @staticmethod
+    def _validate_mapping(column_mapping: dict):
+        unknown = sorted(set(column_mapping.values()) - set(PERSONA_SCHEMA_FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown persona fields in column mapping: {', '.join(unknown)}")
+
+    def get_column_mapping(self, data_id: str) -> dict:
+        """
+        Returns the saved column mapping for a data batch, or None if there is none.
+        """
+        if not data_id:
+            return None
+        cursor = self.db.cursor()
+        cursor.execute("SELECT mapping FROM client_column_mappings WHERE data_id = ?", (data_id,))
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
     def map_columns(self, data_id: str, column_mapping: dict):
         """
         Maps columns from a client's uploaded file to the standard persona schema.
-        This would be used in a more advanced UI flow.
+        The mapping is saved and applied when the file with this data_id is ingested.
 
         Args:
-            data_id (str): The ID of the uploaded data batch.
+            data_id (str): The ID of the uploaded data batch (the file path by default).
             column_mapping (dict): A mapping like {'client_age_col': 'age', 'client_loc_col': 'region'}.
         """
         app_logger.info(f"Applying column mapping for data_id {data_id}: {column_mapping}")
-        # TODO: Implement logic to update stored data with the correct schema.
-        return {"status": "success", "message": "Column mapping applied."} 
\ No newline at end of file
+        try:
+            if not data_id or not column_mapping:
+                raise ValueError("Both data_id and column_mapping are required.")
+            self._validate_mapping(column_mapping)
+            cursor = self.db.cursor()
+            cursor.execute(
+                "INSERT INTO client_column_mappings (data_id, mapping, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP) "
+                "ON CONFLICT(data_id) DO UPDATE SET mapping = excluded.mapping, updated_at = excluded.updated_at",
+                (data_id, json.dumps(column_mapping))
+            )
+            self.db.commit()
+        except Exception as e:
+            app_logger.error(f"Failed to save column mapping for {data_id}: {e}", exc_info=True)
+            return {"status": "error", "message": str(e)}
+        return {"status": "success", "message": "Column mapping applied."}
@@ -0,0 +1,131 @@
+# src/services/container.py
+import threading
+import time
+from src.config import config
+from src.utils.logger import app_logger
+
+class LazyService:
+    """
+    Stands in for a service until it is first used, then forwards every
+    attribute access to the real instance held by the container.
+    """
+    def __init__(self, container, name: str):
+        self._container = container
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._container.get(self._name), attr)
+
+    def __repr__(self):
+        return f"<LazyService {self._name} built={self._container.is_built(self._name)}>"
+
+class ServiceContainer:
+    """
+    Builds the application's services on first use, in dependency order.
+
+    Each service module (and the heavy libraries behind it: pandas, sklearn,
+    openai, chromadb) is imported inside its builder, so creating the app
+    costs almost nothing and a worker only pays for the services it uses.
+    Services that take settings are built with the container's config.
+    """
+    SERVICES = (
+        'db_connection',
+        'embedding_service',
+        'ons_data_service',
+        'persona_service',
+        'audience_service',
+        'client_data_service',
+        'ingestion_job_service',
+        'content_test_service',
+        'history_manager',
+        'summary_session_service',
+    )
+
+    def __init__(self, app_config=None):
+        """
+        Args:
+            app_config (optional): Config class the services read; defaults to config['default'].
+        """
+        self.config = app_config or config['default']
+        self._instances = {}
+        self._lock = threading.RLock()
+
+    def get(self, name: str):
+        """Returns the named service, building it (and its dependencies) on first call."""
+        if name in self._instances:
+            return self._instances[name]
+        if name not in self.SERVICES:
+            raise KeyError(f"Unknown service: {name}")
+        with self._lock:
+            if name not in self._instances:
+                start_time = time.perf_counter()
+                self._instances[name] = getattr(self, f"_build_{name}")()
+                app_logger.info(f"Service '{name}' initialized in {time.perf_counter() - start_time:.3f}s.")
+        return self._instances[name]
+
+    def lazy(self, name: str) -> LazyService:
+        if name not in self.SERVICES:
+            raise KeyError(f"Unknown service: {name}")
+        return LazyService(self, name)
+
+    def is_built(self, name: str) -> bool:
+        return name in self._instances
+
+    def warm(self, names: list = None):
+        """Builds services ahead of the first request; all of them by default."""
+        start_time = time.perf_counter()
+        for name in names or self.SERVICES:
+            try:
+                self.get(name)
+            except Exception as e:
+                app_logger.error(f"Failed to warm service '{name}': {e}", exc_info=True)
+        app_logger.info(f"Services warmed in {time.perf_counter() - start_time:.2f}s.")
+
+    def warm_in_background(self, names: list = None) -> threading.Thread:
+        thread = threading.Thread(target=self.warm, args=(names,), name='service-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    # --- Builders ---
+
+    def _build_db_connection(self):
+        from src.database import ThreadLocalConnection
+        return ThreadLocalConnection()
+
+    def _build_embedding_service(self):
+        from src.services.embedding_service import EmbeddingService
+        return EmbeddingService(app_config=self.config)
+
+    def _build_ons_data_service(self):
+        from src.services.ons_data_service import ONSDataService
+        return ONSDataService()
+
+    def _build_persona_service(self):
+        from src.services.persona_service import PersonaService
+        return PersonaService(self.get('db_connection'), self.get('embedding_service'), self.get('ons_data_service'))
+
+    def _build_audience_service(self):
+        from src.services.audience_service import AudienceService
+        return AudienceService(self.get('db_connection'), self.get('persona_service'))
+
+    def _build_client_data_service(self):
+        from src.services.client_data_service import ClientDataService
+        return ClientDataService(self.get('db_connection'), self.get('audience_service'), app_config=self.config)
+
+    def _build_ingestion_job_service(self):
+        from src.services.ingestion_job_service import IngestionJobService
+        service = IngestionJobService(self.get('client_data_service'), app_config=self.config)
+        service.resume_incomplete_jobs()
+        return service
+
+    def _build_content_test_service(self):
+        from src.services.content_test_service import ContentTestService
+        return ContentTestService(self.get('audience_service'), self.get('persona_service'), app_config=self.config)
+
+    def _build_history_manager(self):
+        from src.utils.history_manager import HistoryManager
+        return HistoryManager()
+
+    def _build_summary_session_service(self):
+        from src.services.summary import SummarySessionService
+        return SummarySessionService()
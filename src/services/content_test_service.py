@@ -1,89 +1,569 @@
 # src/services/content_test_service.py
+import json
+import re
+import time
+from collections import Counter
+import numpy as np
+from src.config import config
+from src.services.image_preprocessing import aimage_content_part
+from src.services.llm_client import achat_completion, gather_limited, run_async
+from src.services.panel_prompting import build_panel_messages, chunk_panel, parse_panel_reply
 from src.utils.logger import setup_logger
+from src.utils.stats import mean_confidence_interval, proportion_confidence_interval
+from src.utils.tracing import span
+
+SENTIMENTS = ('positive', 'neutral', 'negative')
+SENTIMENT_SCORES = {'positive': 1.0, 'neutral': 0.0, 'negative': -1.0}
+ADAPTIVE_METRICS = ('clarity', 'sentiment')
+THEME_STOPWORDS = {
+    'about', 'also', 'because', 'been', 'could', 'from', 'have', 'into', 'just', 'like', 'make',
+    'more', 'much', 'really', 'should', 'some', 'than', 'that', 'their', 'them', 'then', 'there',
+    'they', 'this', 'very', 'what', 'when', 'which', 'while', 'with', 'would', 'your', 'persona',
+    'content', 'found', 'feel', 'think', 'bit',
+}
+
+FEEDBACK_PROMPT = (
+    "Persona Profile: {persona}\n"
+    "You are a real person with this background reviewing a piece of {content_type} content.\n"
+    "{content_text}"
+    "React honestly as this persona. Respond with a JSON object with exactly these keys:\n"
+    '  "sentiment": one of "positive", "neutral", "negative"\n'
+    '  "clarity_score": integer from 1 (confusing) to 10 (perfectly clear)\n'
+    '  "recommendations": one or two concrete suggestions to improve the content\n'
+    '  "summary": one or two sentences explaining your reaction\n'
+    "Return only the JSON object."
+)
+
+PANEL_FEEDBACK_PROMPT = (
+    "Each numbered profile above is a different real person reviewing a piece of {content_type} content.\n"
+    "{content_text}"
+    "React honestly and separately as each person; keep their views independent. Respond with a JSON object "
+    '{{"responses": [...]}} holding exactly one entry for each of the {count} personas, each with these keys:\n'
+    '  "persona": the persona number\n'
+    '  "sentiment": one of "positive", "neutral", "negative"\n'
+    '  "clarity_score": integer from 1 (confusing) to 10 (perfectly clear)\n'
+    '  "recommendations": one or two concrete suggestions to improve the content\n'
+    '  "summary": one or two sentences explaining their reaction\n'
+    "Return only the JSON object."
+)
+
+VARIANT_PROMPT = (
+    "Persona Profile: {persona}\n"
+    "You are a real person with this background comparing {count} versions of a piece of {content_type} content.\n"
+    "{variants_text}"
+    "Judge each version on its own merits as this persona. Respond with a JSON object with a single key "
+    '"variants": a list with one object per version, in the order given, each with exactly these keys:\n'
+    '  "label": the version label\n'
+    '  "sentiment": one of "positive", "neutral", "negative"\n'
+    '  "clarity_score": integer from 1 (confusing) to 10 (perfectly clear)\n'
+    '  "recommendations": one or two concrete suggestions to improve that version\n'
+    '  "summary": one or two sentences explaining your reaction\n'
+    "Return only the JSON object."
+)
+
+def _label_key(label) -> str:
+    """Normalises a variant label as written back by the model ('B', 'b', 'Version B')."""
+    key = str(label if label is not None else '').strip().lower()
+    return key[len('version '):].strip() if key.startswith('version ') else key
 
 class ContentTestService:
     """
     Handles testing of creative content (ads, emails, etc.) against simulated audiences.
     """
-    def __init__(self, audience_service, persona_service):
+    def __init__(self, audience_service, persona_service, app_config=None):
         """
         Initializes the ContentTestService.
 
         Args:
             audience_service: Service for sampling audiences.
             persona_service: Service for getting persona responses.
+            app_config (optional): Config class to read settings from; defaults to config['default'].
         """
         self.audience_service = audience_service
         self.persona_service = persona_service
+        self.config = app_config or config['default']
+        self.max_workers = getattr(self.config, 'CONTENT_TEST_MAX_WORKERS', 16)
         # Default application logger instance
         self.app_logger = setup_logger()
         self.app_logger.info("ContentTestService initialized.")
 
-    def test_content(self, audience_id: str, content: dict, sample_size: int = 15):
+    def test_content(self, audience_id: str, content: dict, sample_size: int = 15, diverse: bool = False,
+                     adaptive: bool = False, metric: str = 'clarity', precision: float = None, panel_batch: bool = False):
         """
         Tests a piece of content against a specified audience.
 
+        Persona evaluations run concurrently on the shared LLM event loop,
+        CONTENT_TEST_MAX_WORKERS at a time, so a test takes roughly one LLM
+        round trip rather than sample_size of them.
+
+        In adaptive mode sample_size is a budget: personas are evaluated in
+        rounds of CONTENT_TEST_BATCH_SIZE and the test stops as soon as the 95%
+        confidence interval of the chosen metric is narrower than precision.
+
         Args:
             audience_id (str): The ID of the audience to test against.
             content (dict): The content to be tested, e.g., {'type': 'ad', 'text': '...', 'image_data': '...'}.
             sample_size (int): The number of personas to sample for the test.
+            diverse (bool): Select a maximally diverse panel instead of independent draws.
+            adaptive (bool): Stop early once the estimate is precise enough.
+            metric (str): 'clarity' (mean clarity score) or 'sentiment' (positive share).
+            precision (float, optional): Target CI half-width; defaults per metric from config.
+            panel_batch (bool): Pack PANEL_BATCH_SIZE personas into each LLM call.
 
         Returns:
             dict: A dictionary containing analytics and feedback from the test.
         """
+        if adaptive and metric not in ADAPTIVE_METRICS:
+            raise ValueError(f"metric must be one of {ADAPTIVE_METRICS}, got {metric!r}")
         self.app_logger.info(f"Testing content of type '{content.get('type')}' against audience {audience_id}.")
+        start_time = time.perf_counter()
 
         # 1. Get a sample of personas from the audience
-        personas = self.audience_service.sample_personas_from_audience(audience_id, count=sample_size)
-        
-        all_feedback = []
-        # 2. For each persona, get their detailed feedback on the content
-        for persona in personas:
-            # persona_id = persona.get('id')
-            # stimulus = {"type": "content_test", **content}
-            # feedback = self.persona_service.get_persona_response_to_stimulus(persona_id, stimulus)
-            
-            # Placeholder logic
-            feedback = {
-                "sentiment": "positive",
-                "clarity_score": 8,
-                "recommendations": "Make the call-to-action more prominent.",
-                "summary": "The persona found the ad visually appealing but the text was a bit long."
-            }
-            all_feedback.append(feedback)
+        personas = self.audience_service.sample_personas_from_audience(audience_id, count=sample_size, diverse=diverse)
+
+        # 2. For each persona, get their structured feedback on the content
+        if adaptive:
+            all_feedback, stopping = self.evaluate_personas_adaptive(personas, content, metric, precision, panel_batch)
+        else:
+            all_feedback, stopping = self.evaluate_personas(personas, content, panel_batch), None
 
         # 3. Aggregate the feedback into a comprehensive analysis
-        analysis = self._analyze_feedback(all_feedback)
-        
+        with span('content_test.analytics', responses=len(all_feedback)):
+            analysis = self._analyze_feedback(all_feedback)
+        if stopping is not None:
+            analysis["adaptive"] = stopping
+        analysis["elapsed_seconds"] = round(time.perf_counter() - start_time, 2)
+
+        return analysis
+
+    def test_variants(self, audience_id: str, variants: list, sample_size: int = 15, diverse: bool = False,
+                      single_prompt: bool = True, baseline: int = 0):
+        """
+        Tests several variants of a piece of content against one shared panel.
+
+        Every persona rates every variant, so differences between variants are
+        measured within persona and persona-to-persona noise cancels out.
+
+        Args:
+            audience_id (str): The ID of the audience to test against.
+            variants (list): Content dicts as for test_content, optionally with a 'label'.
+            sample_size (int): The number of personas on the panel.
+            diverse (bool): Select a maximally diverse panel instead of independent draws.
+            single_prompt (bool): Rate all variants in one call per persona rather than one call per variant.
+            baseline (int): Index of the variant the others are compared against.
+
+        Returns:
+            dict: Per-variant analysis, paired comparisons against the baseline and a ranking.
+        """
+        if len(variants) < 2:
+            raise ValueError("At least two variants are required.")
+        if not 0 <= baseline < len(variants):
+            raise ValueError(f"baseline must be an index into variants, got {baseline}.")
+        labels = [v.get('label') or chr(ord('A') + i) for i, v in enumerate(variants)]
+        self.app_logger.info(f"Testing {len(variants)} variants against audience {audience_id} on a shared panel.")
+        start_time = time.perf_counter()
+
+        personas = self.audience_service.sample_personas_from_audience(audience_id, count=sample_size, diverse=diverse)
+        per_persona = self.evaluate_persona_variants(personas, variants, labels, single_prompt)
+
+        with span('content_test.analytics', responses=len(per_persona), variants=len(labels)):
+            analysis = self._analyze_variants(labels, per_persona, baseline)
+        analysis["panel_size"] = len(personas)
+        analysis["single_prompt"] = single_prompt
+        analysis["elapsed_seconds"] = round(time.perf_counter() - start_time, 2)
         return analysis
 
+    def evaluate_personas(self, personas: list, content: dict, panel_batch: bool = False) -> list:
+        """
+        Collects structured feedback from every persona concurrently.
+
+        With panel_batch, personas are packed PANEL_BATCH_SIZE to a call so the
+        content (and any image) is sent once per batch; entries missing from or
+        malformed in a panel reply are retried as single-persona calls.
+
+        Returns:
+            list: One feedback dict per persona, in persona order. Failed
+                evaluations carry an 'error' key instead of scores.
+        """
+        if not personas:
+            return []
+        content = run_async(self._prepare_images([content]))[0]
+        if panel_batch:
+            batches = chunk_panel(personas, getattr(self.config, 'PANEL_BATCH_SIZE', 8))
+            results = run_async(gather_limited([self._evaluate_panel(batch, content) for batch in batches], self.max_workers))
+            return [feedback for batch in results for feedback in batch]
+        return run_async(gather_limited([self._evaluate_persona(persona, content) for persona in personas], self.max_workers))
+
+    async def _evaluate_panel(self, personas: list, content: dict) -> list:
+        """Asks a batch of personas for feedback in one call, falling back to single calls for bad entries."""
+        content_text = f"Content: \"{content['text']}\"\n" if content.get('text') else "The content is the attached image.\n"
+        prompt = PANEL_FEEDBACK_PROMPT.format(
+            content_type=content.get('type', 'marketing'), content_text=content_text, count=len(personas)
+        )
+        messages = build_panel_messages(personas, prompt, content.get('image_part'))
+        max_tokens = getattr(self.config, 'DEFAULT_MAX_TOKENS_TEXT', 300) * len(personas)
+        try:
+            results = parse_panel_reply(
+                await self._complete(messages, self._model_for([content]), max_tokens=max_tokens), len(personas), self._validate_feedback
+            )
+        except Exception as e:
+            self.app_logger.error(f"Panel evaluation of {len(personas)} personas failed: {e}", exc_info=True)
+            results = [None] * len(personas)
+
+        missing = [i for i, feedback in enumerate(results) if feedback is None]
+        if missing:
+            self.app_logger.warning(f"Panel reply missing {len(missing)}/{len(personas)} personas; falling back to single calls.")
+        fallbacks = await gather_limited([self._evaluate_persona(personas[i], content) for i in missing])
+        for i, feedback in zip(missing, fallbacks):
+            results[i] = feedback
+        for i, persona in enumerate(personas):
+            results[i]["persona"] = persona
+        return results
+
+    def evaluate_personas_adaptive(self, personas: list, content: dict, metric: str = 'clarity', precision: float = None,
+                                   panel_batch: bool = False) -> tuple:
+        """
+        Evaluates personas in rounds until the metric's 95% CI half-width drops
+        to precision or the panel is exhausted.
+
+        Returns:
+            tuple: (feedback for the personas evaluated, stopping details).
+        """
+        batch_size = max(1, getattr(self.config, 'CONTENT_TEST_BATCH_SIZE', 5))
+        min_personas = getattr(self.config, 'CONTENT_TEST_MIN_PERSONAS', 8)
+        if precision is None:
+            key = 'CONTENT_TEST_CLARITY_PRECISION' if metric == 'clarity' else 'CONTENT_TEST_SENTIMENT_PRECISION'
+            precision = getattr(self.config, key, 0.75 if metric == 'clarity' else 0.15)
+
+        all_feedback = []
+        history = []
+        interval = None
+        evaluated = 0
+        while evaluated < len(personas):
+            # The first round goes straight to the minimum so the interval is meaningful
+            round_size = max(batch_size, min_personas - evaluated) if evaluated < min_personas else batch_size
+            batch = personas[evaluated:evaluated + round_size]
+            all_feedback.extend(self.evaluate_personas(batch, content, panel_batch))
+            evaluated += len(batch)
+
+            interval = self._metric_interval([f for f in all_feedback if 'error' not in f], metric)
+            history.append({"evaluated": evaluated, "estimate": interval['estimate'], "half_width": interval['half_width']})
+            if interval['n'] >= min_personas and interval['half_width'] is not None and interval['half_width'] <= precision:
+                break
+
+        stopping = {
+            "metric": metric,
+            "precision": precision,
+            "budget": len(personas),
+            "evaluated": evaluated,
+            "stopped_early": evaluated < len(personas),
+            "estimate": interval['estimate'] if interval else None,
+            "ci95_low": interval['ci_low'] if interval else None,
+            "ci95_high": interval['ci_high'] if interval else None,
+            "history": history
+        }
+        self.app_logger.info(f"Adaptive content test stopped after {evaluated}/{len(personas)} personas on {metric}.")
+        return all_feedback, stopping
+
+    @staticmethod
+    def _metric_interval(feedback: list, metric: str) -> dict:
+        """95% CI for mean clarity or for the share of positive reactions."""
+        if metric == 'sentiment':
+            ci = proportion_confidence_interval(sum(f['sentiment'] == 'positive' for f in feedback), len(feedback))
+            estimate = ci['proportion']
+        else:
+            ci = mean_confidence_interval([f['clarity_score'] for f in feedback])
+            estimate = ci['mean']
+        rounded = lambda value: round(value, 3) if value is not None else None
+        return {
+            "n": ci['n'],
+            "estimate": rounded(estimate),
+            "half_width": rounded(ci['half_width']),
+            "ci_low": rounded(ci['ci_low']),
+            "ci_high": rounded(ci['ci_high'])
+        }
+
+    def evaluate_persona_variants(self, personas: list, variants: list, labels: list, single_prompt: bool = True) -> list:
+        """
+        Collects every persona's feedback on every variant concurrently.
+
+        Returns:
+            list: Per persona, a list with one feedback dict per variant.
+        """
+        if not personas:
+            return []
+        variants = run_async(self._prepare_images(variants))
+        if single_prompt:
+            tasks = [self._evaluate_persona_on_variants(p, variants, labels) for p in personas]
+        else:
+            tasks = [self._evaluate_persona(p, v) for p in personas for v in variants]
+        results = run_async(gather_limited(tasks, self.max_workers))
+        if single_prompt:
+            return results
+        k = len(variants)
+        return [results[i:i + k] for i in range(0, len(results), k)]
+
+    async def _evaluate_persona_on_variants(self, persona: str, variants: list, labels: list) -> list:
+        """Asks one persona to rate all variants in a single call."""
+        messages = self._build_variant_messages(persona, variants, labels)
+
+        def validate(data):
+            items = data.get('variants') if isinstance(data, dict) else None
+            if not isinstance(items, list) or len(items) != len(variants):
+                raise ValueError(f"expected a 'variants' list with {len(variants)} entries")
+            # Match entries to variants by label, so a reordered reply is not misattributed
+            by_label = {}
+            for item in items:
+                label = _label_key(item.get('label') if isinstance(item, dict) else None)
+                if label in by_label:
+                    raise ValueError(f"duplicate entry for version '{item.get('label')}'")
+                by_label[label] = item
+            missing = [label for label in labels if _label_key(label) not in by_label]
+            if missing:
+                raise ValueError(f"no entry labelled {', '.join(missing)}")
+            return [self._validate_feedback(by_label[_label_key(label)]) for label in labels]
+
+        feedback, error = await self._complete_validated(messages, self._model_for(variants), validate, persona)
+        if error:
+            return [{"persona": persona, "error": error} for _ in variants]
+        for item in feedback:
+            item["persona"] = persona
+        return feedback
+
+    async def _evaluate_persona(self, persona: str, content: dict) -> dict:
+        """Asks one persona for JSON feedback on a single piece of content."""
+        messages = self._build_feedback_messages(persona, content)
+        feedback, error = await self._complete_validated(messages, self._model_for([content]), self._validate_feedback, persona)
+        if error:
+            return {"persona": persona, "error": error}
+        feedback["persona"] = persona
+        return feedback
+
+    async def _complete_validated(self, messages: list, model: str, validate, persona: str, attempts: int = 2) -> tuple:
+        """
+        Calls the model and validates its JSON reply, retrying once if it does not validate.
+
+        Returns:
+            tuple: (validated result, None) or (None, error message).
+        """
+        last_error = None
+        for attempt in range(attempts):
+            try:
+                return validate(json.loads(await self._complete(messages, model))), None
+            except (ValueError, TypeError) as e:
+                last_error = f"Invalid feedback: {e}"
+                self.app_logger.warning(f"Invalid feedback from persona {persona[:30]}... (attempt {attempt + 1}): {e}")
+            except Exception as e:
+                last_error = str(e)
+                self.app_logger.error(f"Error evaluating content for persona {persona[:30]}...: {e}", exc_info=True)
+                break
+        return None, last_error
+
+    @staticmethod
+    async def _prepare_images(contents: list) -> list:
+        """Copies of contents with each image prepared once, off the event loop, as 'image_part' for the message builders."""
+        return [dict(c, image_part=await aimage_content_part(c['image_data'])) if c.get('image_data') else c for c in contents]
+
+    def _model_for(self, contents: list) -> str:
+        if any(c.get('image_data') for c in contents):
+            return self.config.DEFAULT_VISION_MODEL
+        return self.config.DEFAULT_TEXT_MODEL
+
+    def _build_feedback_messages(self, persona: str, content: dict) -> list:
+        content_text = f"Content: \"{content['text']}\"\n" if content.get('text') else "The content is the attached image.\n"
+        prompt = FEEDBACK_PROMPT.format(persona=persona, content_type=content.get('type', 'marketing'), content_text=content_text)
+        if content.get('image_data'):
+            user_content = [
+                {"type": "text", "text": prompt},
+                content['image_part']
+            ]
+        else:
+            user_content = prompt
+        return [
+            {"role": "system", "content": "You are a consumer simulator that replies in JSON."},
+            {"role": "user", "content": user_content}
+        ]
+
+    def _build_variant_messages(self, persona: str, variants: list, labels: list) -> list:
+        variants_text = ''
+        images = []
+        for label, variant in zip(labels, variants):
+            if variant.get('text'):
+                variants_text += f"Version {label}: \"{variant['text']}\"\n"
+            if variant.get('image_data'):
+                variants_text += f"Version {label} includes image {len(images) + 1} of the attached images.\n"
+                images.append(variant['image_part'])
+        prompt = VARIANT_PROMPT.format(
+            persona=persona, count=len(variants), content_type=variants[0].get('type', 'marketing'), variants_text=variants_text
+        )
+        if images:
+            user_content = [{"type": "text", "text": prompt}] + images
+        else:
+            user_content = prompt
+        return [
+            {"role": "system", "content": "You are a consumer simulator that replies in JSON."},
+            {"role": "user", "content": user_content}
+        ]
+
+    async def _complete(self, messages: list, model: str, max_tokens: int = None) -> str:
+        response = await achat_completion(
+            call_site='content_test',
+            model=model,
+            messages=messages,
+            temperature=self.config.DEFAULT_TEMPERATURE,
+            max_tokens=max_tokens or getattr(self.config, 'DEFAULT_MAX_TOKENS_TEXT', 300),
+            response_format={"type": "json_object"}
+        )
+        return response.choices[0].message.content
+
+    @staticmethod
+    def _validate_feedback(data: dict) -> dict:
+        """
+        Checks and normalises a feedback object.
+
+        Raises:
+            ValueError: If a required field is missing or out of range.
+        """
+        if not isinstance(data, dict):
+            raise ValueError("feedback is not a JSON object")
+        sentiment = str(data.get('sentiment', '')).strip().lower()
+        if sentiment not in SENTIMENTS:
+            raise ValueError(f"sentiment must be one of {SENTIMENTS}, got {data.get('sentiment')!r}")
+        clarity = float(data.get('clarity_score'))
+        if not 1 <= clarity <= 10:
+            raise ValueError(f"clarity_score must be between 1 and 10, got {clarity}")
+        recommendations = data.get('recommendations') or ''
+        if isinstance(recommendations, list):
+            recommendations = ' '.join(str(r) for r in recommendations)
+        return {
+            "sentiment": sentiment,
+            "clarity_score": round(clarity, 1),
+            "recommendations": str(recommendations).strip(),
+            "summary": str(data.get('summary') or '').strip()
+        }
+
     def _analyze_feedback(self, all_feedback: list) -> dict:
         """
         Aggregates individual persona feedback into a final report.
         """
-        if not all_feedback:
-            return {"error": "No feedback to analyze."}
-
-        # Placeholder analysis logic
-        import numpy as np
-        from collections import Counter
+        valid = [f for f in all_feedback if 'error' not in f]
+        if not valid:
+            return {"error": "No feedback to analyze.", "failed_evaluations": len(all_feedback)}
 
-        sentiments = [f['sentiment'] for f in all_feedback]
-        clarity_scores = [f['clarity_score'] for f in all_feedback]
+        sentiments = [f['sentiment'] for f in valid]
+        clarity_scores = np.array([f['clarity_score'] for f in valid], dtype=float)
+        sentiment_values = np.array([SENTIMENT_SCORES[s] for s in sentiments])
 
         sentiment_counts = Counter(sentiments)
-        
+        clarity_ci = mean_confidence_interval(clarity_scores)
+        histogram, _ = np.histogram(clarity_scores, bins=np.arange(0.5, 11.5, 1.0))
+
         analysis_summary = {
-            "total_responses": len(all_feedback),
+            "total_responses": len(valid),
+            "failed_evaluations": len(all_feedback) - len(valid),
             "overall_sentiment": sentiment_counts.most_common(1)[0][0] if sentiment_counts else "N/A",
             "sentiment_breakdown": dict(sentiment_counts),
-            "average_clarity_score": np.mean(clarity_scores),
-            "key_recommendations": [f['recommendations'] for f in all_feedback if f['recommendations']][:3],
-            "common_themes": [
-                "Visuals are strong",
-                "Text could be more concise",
-                "Call-to-action needs emphasis"
-            ] # This would be derived from NLP in a real implementation
+            "sentiment_share": {s: round(sentiment_counts.get(s, 0) / len(valid), 3) for s in SENTIMENTS},
+            "net_sentiment_score": round(float(sentiment_values.mean()), 3),
+            "average_clarity_score": round(float(clarity_scores.mean()), 2),
+            "clarity_score_stats": {
+                "median": float(np.median(clarity_scores)),
+                "std": round(clarity_ci['std'], 2),
+                "min": float(clarity_scores.min()),
+                "max": float(clarity_scores.max()),
+                "ci95_low": round(clarity_ci['ci_low'], 2) if clarity_ci['ci_low'] is not None else None,
+                "ci95_high": round(clarity_ci['ci_high'], 2) if clarity_ci['ci_high'] is not None else None
+            },
+            "clarity_score_distribution": {str(score): int(count) for score, count in zip(range(1, 11), histogram)},
+            "key_recommendations": self._top_recommendations(valid),
+            "common_themes": self._common_themes(valid),
+            "per_persona_feedback": all_feedback
         }
-        
-        return analysis_summary 
\ No newline at end of file
+
+        return analysis_summary
+
+    def _analyze_variants(self, labels: list, per_persona: list, baseline: int) -> dict:
+        """
+        Summarises each variant and compares every variant with the baseline on
+        paired per-persona differences, using only personas who rated both.
+        """
+        variant_reports = {}
+        for i, label in enumerate(labels):
+            report = self._analyze_feedback([row[i] for row in per_persona])
+            report.pop("per_persona_feedback", None)
+            variant_reports[label] = report
+
+        comparisons = {}
+        for i, label in enumerate(labels):
+            if i == baseline:
+                continue
+            pairs = [(row[i], row[baseline]) for row in per_persona if 'error' not in row[i] and 'error' not in row[baseline]]
+            clarity_diff = np.array([a['clarity_score'] - b['clarity_score'] for a, b in pairs], dtype=float)
+            sentiment_diff = np.array([SENTIMENT_SCORES[a['sentiment']] - SENTIMENT_SCORES[b['sentiment']] for a, b in pairs])
+            comparisons[label] = {
+                "paired_personas": len(pairs),
+                "clarity_difference": self._paired_summary(clarity_diff),
+                "sentiment_difference": self._paired_summary(sentiment_diff),
+                "preferred_by": int(((sentiment_diff > 0) | ((sentiment_diff == 0) & (clarity_diff > 0))).sum()),
+                "baseline_preferred_by": int(((sentiment_diff < 0) | ((sentiment_diff == 0) & (clarity_diff < 0))).sum())
+            }
+
+        def rank_key(label):
+            report = variant_reports[label]
+            return (report.get("net_sentiment_score", -np.inf), report.get("average_clarity_score", -np.inf))
+
+        return {
+            "baseline": labels[baseline],
+            "variants": variant_reports,
+            "comparisons": comparisons,
+            "ranking": sorted(labels, key=rank_key, reverse=True),
+            "per_persona_feedback": [
+                {"persona": row[0]["persona"], "feedback": dict(zip(labels, row))} for row in per_persona
+            ]
+        }
+
+    @staticmethod
+    def _paired_summary(differences: np.ndarray) -> dict:
+        """
+        Mean paired difference with a 95% t-interval; significant when the
+        interval excludes zero. Fewer than two pairs, or differences that are
+        all identical, give no usable interval and are reported as degenerate.
+        """
+        ci = mean_confidence_interval(differences)
+        if ci['mean'] is None:
+            return {"mean": None, "ci95_low": None, "ci95_high": None, "significant": False, "degenerate": True}
+        if ci['n'] < 2 or not ci['std']:
+            return {"mean": round(ci['mean'], 3), "ci95_low": None, "ci95_high": None, "significant": False, "degenerate": True}
+        low, high = ci['ci_low'], ci['ci_high']
+        return {
+            "mean": round(ci['mean'], 3),
+            "ci95_low": round(low, 3),
+            "ci95_high": round(high, 3),
+            "significant": bool(low > 0 or high < 0),
+            "degenerate": False
+        }
+
+    @staticmethod
+    def _top_recommendations(feedback: list, limit: int = 3) -> list:
+        """Distinct recommendations, those from the least satisfied personas first."""
+        ordered = sorted(feedback, key=lambda f: (SENTIMENT_SCORES[f['sentiment']], f['clarity_score']))
+        seen = set()
+        recommendations = []
+        for f in ordered:
+            text = f['recommendations']
+            if text and text.lower() not in seen:
+                seen.add(text.lower())
+                recommendations.append(text)
+            if len(recommendations) == limit:
+                break
+        return recommendations
+
+    @staticmethod
+    def _common_themes(feedback: list, limit: int = 5) -> list:
+        """Most frequent content words across summaries and recommendations."""
+        words = Counter()
+        for f in feedback:
+            text = f"{f['summary']} {f['recommendations']}".lower()
+            # Count each word once per persona so one verbose reply cannot dominate
+            words.update(set(w for w in re.findall(r"[a-z][a-z\-]{3,}", text) if w not in THEME_STOPWORDS))
+        return [word for word, count in words.most_common(limit) if count > 1]
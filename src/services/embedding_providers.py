@@ -0,0 +1,63 @@
+# src/services/embedding_providers.py
+import numpy as np
+from src.config import config
+from src.utils.logger import app_logger
+
+class HashingEmbeddingProvider:
+    """
+    Offline CPU embeddings from hashed word and character n-grams.
+
+    There is no model to download and nothing to fit, so vectors are stable
+    across processes and restarts. Similar wording gives similar vectors,
+    which is enough for de-duplicating and clustering persona descriptions.
+    """
+    def __init__(self, dim: int = 512):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        self.dim = dim
+        self.provider_id = f"hashing-{dim}-v1"
+        self._word_vectorizer = HashingVectorizer(n_features=dim, ngram_range=(1, 2), alternate_sign=True, norm=None, lowercase=True)
+        self._char_vectorizer = HashingVectorizer(n_features=dim, analyzer='char_wb', ngram_range=(3, 5), alternate_sign=True, norm=None, lowercase=True)
+
+    def embed(self, texts: list) -> np.ndarray:
+        """Embeds a batch of texts into an (n, dim) float32 matrix of unit vectors."""
+        matrix = (self._word_vectorizer.transform(texts) + 0.5 * self._char_vectorizer.transform(texts)).toarray().astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+class OpenAIEmbeddingProvider:
+    """
+    Remote embeddings from the OpenAI embeddings endpoint, one request per batch.
+    """
+    def __init__(self, model: str = 'text-embedding-3-small', dim: int = None):
+        self.model = model
+        self.dim = dim
+        self.provider_id = f"openai-{model}-{dim or 'native'}"
+
+    def embed(self, texts: list) -> np.ndarray:
+        from src.services.llm_client import get_openai
+        kwargs = {'model': self.model, 'input': texts}
+        if self.dim:
+            kwargs['dimensions'] = self.dim
+        response = get_openai().embeddings.create(**kwargs)
+        # The API may return items out of order; 'index' ties them back to the input
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return np.asarray([item.embedding for item in ordered], dtype=np.float32)
+
+def get_embedding_provider(name: str = None, app_config=None):
+    """
+    Builds the embedding provider named in EMBEDDING_PROVIDER ('hashing' or 'openai'),
+    reading app_config (config['default'] when omitted).
+    """
+    app_config = app_config or config['default']
+    name = name or getattr(app_config, 'EMBEDDING_PROVIDER', 'hashing')
+    if name == 'hashing':
+        provider = HashingEmbeddingProvider(dim=getattr(app_config, 'EMBEDDING_DIM', 512))
+    elif name == 'openai':
+        provider = OpenAIEmbeddingProvider(
+            model=getattr(app_config, 'OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small'),
+            dim=getattr(app_config, 'OPENAI_EMBEDDING_DIM', None)
+        )
+    else:
+        raise ValueError(f"Unknown embedding provider: {name}")
+    app_logger.info(f"Using embedding provider '{provider.provider_id}'.")
+    return provider
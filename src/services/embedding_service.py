@@ -1,31 +1,154 @@
 # src/services/embedding_service.py
-import chromadb
+import hashlib
+import os
+import numpy as np
+from src.config import config
+from src.database import get_db_connection
+from src.services.embedding_providers import get_embedding_provider
+from src.services.vector_store import NumpyVectorStore
 from src.utils.logger import app_logger
+from src.utils.metrics import CACHE_LOOKUPS
+
+# SQLite limits the number of bound parameters per statement
+CACHE_LOOKUP_BATCH = 500
 
 class EmbeddingService:
     """
-    Handles all communication with the vector database (ChromaDB).
+    Handles embedding persona text and all communication with the persona vector store.
+
+    Backends (VECTOR_STORE_BACKEND):
+        'numpy'  - persistent memory-mapped float32 snapshot (default)
+        'chroma' - ChromaDB PersistentClient
+        'memory' - in-memory ChromaDB client, lost on restart
     """
-    def __init__(self, persistent_path: str = "chroma_db"):
+    def __init__(self, persistent_path: str = None, backend: str = None, provider=None, app_config=None):
         """
-        Initializes the ChromaDB client.
-        In a production environment, you might use a persistent client.
-        For local dev, an in-memory instance is fine.
+        Initializes the vector store. Persistent backends load their snapshot
+        lazily on first use, so startup does not pay for it.
+
+        Args:
+            persistent_path (str, optional): Where persistent backends keep their data.
+            backend (str, optional): One of 'numpy', 'chroma' or 'memory'.
+            provider (optional): Embedding provider; defaults to EMBEDDING_PROVIDER.
+            app_config (optional): Config class to read settings from; defaults to config['default'].
         """
+        app_config = app_config or config['default']
+        self.backend = backend or getattr(app_config, 'VECTOR_STORE_BACKEND', 'numpy')
+        self.provider = provider or get_embedding_provider(app_config=app_config)
+        self.batch_size = getattr(app_config, 'EMBEDDING_BATCH_SIZE', 256)
+        self.cache_enabled = getattr(app_config, 'EMBEDDING_CACHE_ENABLED', True)
+        self.cache_max_rows = getattr(app_config, 'EMBEDDING_CACHE_MAX_ROWS', 100000)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Vectors from different providers are not comparable, so each gets its own store
+        base_path = persistent_path or getattr(app_config, 'VECTOR_STORE_PATH', 'chroma_db')
+        self.persistent_path = os.path.join(base_path, self.provider.provider_id)
+        self.store = None
+        self.collection = None
         try:
-            # For persistent storage, use:
-            # self.client = chromadb.PersistentClient(path=persistent_path)
-            # For now, using in-memory for simplicity
-            self.client = chromadb.Client()
-            self.collection = self.client.get_or_create_collection("persona_embeddings")
-            app_logger.info("EmbeddingService initialized with ChromaDB collection 'persona_embeddings'.")
+            if self.backend == 'numpy':
+                self.store = NumpyVectorStore(self.persistent_path)
+            elif self.backend in ('chroma', 'memory'):
+                import chromadb
+                if self.backend == 'chroma':
+                    self.client = chromadb.PersistentClient(path=self.persistent_path)
+                else:
+                    self.client = chromadb.Client()
+                self.collection = self.client.get_or_create_collection("persona_embeddings")
+            else:
+                raise ValueError(f"Unknown vector store backend: {self.backend}")
+            app_logger.info(f"EmbeddingService initialized with '{self.backend}' backend at '{self.persistent_path}'.")
         except Exception as e:
-            app_logger.error(f"Failed to initialize ChromaDB client: {e}", exc_info=True)
+            app_logger.error(f"Failed to initialize vector store: {e}", exc_info=True)
             raise
 
+    def embed_texts(self, texts: list, cache: bool = True) -> np.ndarray:
+        """
+        Embeds texts, serving repeats from the content-hash cache.
+
+        Duplicate texts are embedded once and cache misses are sent to the
+        provider in batches of EMBEDDING_BATCH_SIZE, one call per batch.
+
+        Args:
+            texts (list): The texts to embed.
+            cache (bool): Use the embedding cache; False for throwaway texts
+                (such as oversampled panel candidates) that would only crowd it.
+
+        Returns:
+            np.ndarray: A float32 matrix with one row per input text.
+        """
+        if not texts:
+            return np.zeros((0, self.provider.dim or 0), dtype=np.float32)
+
+        hashes = [self._content_hash(text) for text in texts]
+        unique = dict(zip(hashes, texts))
+        use_cache = self.cache_enabled and cache
+        vectors = self._cache_lookup(list(unique)) if use_cache else {}
+        missing = [h for h in unique if h not in vectors]
+        self.cache_hits += len(unique) - len(missing)
+        self.cache_misses += len(missing)
+        CACHE_LOOKUPS.inc(len(unique) - len(missing), cache='embedding', result='hit')
+        CACHE_LOOKUPS.inc(len(missing), cache='embedding', result='miss')
+
+        for start in range(0, len(missing), self.batch_size):
+            batch_hashes = missing[start:start + self.batch_size]
+            batch_vectors = self.provider.embed([unique[h] for h in batch_hashes])
+            computed = dict(zip(batch_hashes, batch_vectors))
+            vectors.update(computed)
+            if use_cache:
+                self._cache_store(computed)
+
+        if missing:
+            app_logger.info(f"Embedded {len(missing)} new texts ({len(unique) - len(missing)} served from cache).")
+        return np.vstack([vectors[h] for h in hashes]).astype(np.float32)
+
+    def _content_hash(self, text: str) -> str:
+        return hashlib.sha256(f"{self.provider.provider_id}\0{text}".encode('utf-8')).hexdigest()
+
+    def _cache_lookup(self, hashes: list) -> dict:
+        found = {}
+        conn = get_db_connection()
+        try:
+            for start in range(0, len(hashes), CACHE_LOOKUP_BATCH):
+                batch = hashes[start:start + CACHE_LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f"SELECT content_hash, vector FROM embedding_cache WHERE content_hash IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for content_hash, blob in rows:
+                    found[content_hash] = np.frombuffer(blob, dtype=np.float32)
+        except Exception as e:
+            app_logger.warning(f"Embedding cache lookup failed; embedding without cache: {e}")
+        finally:
+            conn.close()
+        return found
+
+    def _cache_store(self, vectors: dict):
+        conn = get_db_connection()
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO embedding_cache (content_hash, provider, dim, vector) VALUES (?, ?, ?, ?)",
+                [
+                    (content_hash, self.provider.provider_id, len(vector), np.asarray(vector, dtype=np.float32).tobytes())
+                    for content_hash, vector in vectors.items()
+                ]
+            )
+            if self.cache_max_rows:
+                # Rowids grow with each insert, so this keeps the newest cache_max_rows entries
+                conn.execute(
+                    "DELETE FROM embedding_cache WHERE rowid <= (SELECT MAX(rowid) FROM embedding_cache) - ?",
+                    (self.cache_max_rows,)
+                )
+            conn.commit()
+        except Exception as e:
+            app_logger.warning(f"Failed to write {len(vectors)} embeddings to cache: {e}")
+        finally:
+            conn.close()
+
     def add_persona_embedding(self, persona_id: str, embedding_vector: list, metadata: dict = None):
         """
-        Adds or updates a persona's embedding in ChromaDB.
+        Adds or updates a persona's embedding in the vector store.
 
         Args:
             persona_id (str): The unique ID of the persona.
@@ -33,15 +156,47 @@ class EmbeddingService:
             metadata (dict, optional): Additional metadata to store with the vector.
         """
         try:
-            self.collection.add(
-                embeddings=[embedding_vector],
-                metadatas=[metadata or {}],
-                ids=[persona_id]
-            )
+            if self.store is not None:
+                self.store.upsert([persona_id], [embedding_vector], [metadata or {}])
+            else:
+                self.collection.add(
+                    embeddings=[np.asarray(embedding_vector, dtype=np.float32).tolist()],
+                    metadatas=[metadata or {}],
+                    ids=[persona_id]
+                )
             app_logger.info(f"Added embedding for persona_id: {persona_id}")
         except Exception as e:
             app_logger.error(f"Failed to add embedding for persona_id {persona_id}: {e}", exc_info=True)
 
+    def add_persona_embeddings(self, persona_ids: list, embedding_vectors: list, metadatas: list = None):
+        """
+        Adds or updates many persona embeddings in a single call.
+
+        Args:
+            persona_ids (list): The unique IDs of the personas.
+            embedding_vectors (list): One embedding vector per persona.
+            metadatas (list, optional): One metadata dict per persona.
+        """
+        if not persona_ids:
+            return
+        # Chroma only accepts scalar, non-null metadata values
+        clean_metadatas = [
+            {k: v for k, v in (metadata or {}).items() if isinstance(v, (str, int, float, bool))}
+            for metadata in (metadatas or [{}] * len(persona_ids))
+        ]
+        try:
+            if self.store is not None:
+                self.store.upsert(persona_ids, embedding_vectors, clean_metadatas)
+            else:
+                self.collection.upsert(
+                    embeddings=np.asarray(embedding_vectors, dtype=np.float32).tolist(),
+                    metadatas=clean_metadatas,
+                    ids=persona_ids
+                )
+            app_logger.info(f"Added {len(persona_ids)} persona embeddings.")
+        except Exception as e:
+            app_logger.error(f"Failed to add batch of {len(persona_ids)} embeddings: {e}", exc_info=True)
+
     def find_similar_personas(self, query_vector: list, n_results: int = 5, where_filter: dict = None):
         """
         Finds similar personas based on a query vector.
@@ -55,13 +210,53 @@ class EmbeddingService:
             list: A list of similar persona IDs and their distances.
         """
         try:
-            results = self.collection.query(
-                query_embeddings=[query_vector],
-                n_results=n_results,
-                where=where_filter
-            )
+            if self.store is not None:
+                results = self.store.query(query_vector, n_results=n_results, where_filter=where_filter)
+            else:
+                results = self.collection.query(
+                    query_embeddings=[query_vector],
+                    n_results=n_results,
+                    where=where_filter
+                )
             app_logger.info(f"Found {len(results.get('ids', [[]])[0])} similar personas.")
             return results
         except Exception as e:
-            app_logger.error(f"Failed to query ChromaDB for similar personas: {e}", exc_info=True)
-            return None 
\ No newline at end of file
+            app_logger.error(f"Failed to query vector store for similar personas: {e}", exc_info=True)
+            return None
+
+    def find_similar_personas_batch(self, query_vectors, n_results: int = 5, where_filter: dict = None):
+        """
+        Finds the top-k similar personas for each of many query vectors in one pass.
+
+        With the NumPy backend, region, gender and age_band conditions in
+        where_filter are resolved with the metadata index before any scoring.
+
+        Args:
+            query_vectors: Array-like of shape (m, dim), one query per row.
+            n_results (int): The number of similar results per query.
+            where_filter (dict, optional): A filter to apply to the search,
+                e.g. {'$and': [{'region': {'$in': ['Leeds', 'York']}}, {'age_band': '25-34'}]}.
+
+        Returns:
+            dict: Chroma-style results with one inner list per query.
+        """
+        try:
+            if self.store is not None:
+                results = self.store.query_batch(query_vectors, n_results=n_results, where_filter=where_filter)
+            else:
+                results = self.collection.query(
+                    query_embeddings=np.asarray(query_vectors, dtype=np.float32).tolist(),
+                    n_results=n_results,
+                    where=where_filter
+                )
+            app_logger.info(f"Answered {len(results.get('ids', []))} similarity queries in one batch.")
+            return results
+        except Exception as e:
+            app_logger.error(f"Failed to run batch similarity query: {e}", exc_info=True)
+            return None
+
+    def find_similar_personas_for_texts(self, texts: list, n_results: int = 5, where_filter: dict = None):
+        """
+        Embeds texts (e.g. every variant of a campaign) and finds the nearest personas for each.
+        """
+        return self.find_similar_personas_batch(self.embed_texts(texts), n_results=n_results, where_filter=where_filter)
@@ -1,9 +1,14 @@
 # src/services/focus_group_service.py
-import openai
+import asyncio
 from enum import Enum
 from typing import List
 from src.config import config
-from src.utils.logger import app_logger
+from src.services.image_preprocessing import aimage_content_part
+from src.services.llm_client import achat_completion, chat_completion, get_openai, run_async, run_in_executor
+from src.services.model_router import resolve_model
+from src.services.vision import adescribe_image, format_image_description
+from src.utils.logger import SAMPLED, app_logger, lazy
+from src.utils.tracing import span
 
 class PersonaStyle(Enum):
     AGREEABLE = "agreeable"
@@ -18,8 +23,12 @@ class SimulationState(Enum):
     COMPLETED = "completed"
     ERROR = "error"
 
+def _preview(messages, limit: int = 500) -> str:
+    """The start of a message list, for logs; built lazily since it may embed an image data URL."""
+    return str(messages)[:limit]
+
 class FocusGroupSimulator:
-    def __init__(self, personas_details: list[str], stimulus_message: str = None, stimulus_image_data: str = None, questions: list = None, group_size: int = None, open_discussion: bool = False):
+    def __init__(self, personas_details: list[str], stimulus_message: str = None, stimulus_image_data: str = None, questions: list = None, group_size: int = None, open_discussion: bool = False, full_vision: bool = False, model: str = None, snapshot_rounds: bool = False):
         if not personas_details:
             raise ValueError("At least one persona is required for a focus group.")
         if not stimulus_message and not stimulus_image_data:
@@ -37,16 +46,24 @@ class FocusGroupSimulator:
         self.topics_identified = []  # Track emerging topics
         self.group_size = group_size
         self.open_discussion = open_discussion
+        # Without full_vision the image is described once and personas react to the description
+        self.full_vision = full_vision
+        self._image_description = None
+        # Text model for persona turns; DEFAULT_TEXT_MODEL unless the request picks a cheaper one
+        self.model = model
+        # In a snapshot round every persona answers the history as it stood when the round began, all at once
+        self.snapshot_rounds = snapshot_rounds
         # If questions are provided, add them as moderator questions for after_round=0
         if questions:
             for q in questions:
                 self.add_moderator_question(q, after_round=0)
-        app_logger.info(f"FocusGroupSimulator initialized for {len(personas_details)} personas. Group size: {group_size}, Open discussion: {open_discussion}, Questions: {len(questions) if questions else 0}")
+        app_logger.info("FocusGroupSimulator initialized for %d personas. Group size: %s, Open discussion: %s, Questions: %d",
+                        len(personas_details), group_size, open_discussion, len(questions) if questions else 0)
 
     def set_persona_style(self, persona_index: int, style: PersonaStyle):
         """Set interaction style for a specific persona."""
         self.persona_styles[persona_index] = style
-        app_logger.info(f"Set persona {persona_index} style to {style.value}")
+        app_logger.info("Set persona %s style to %s", persona_index, style.value)
 
     def add_moderator_question(self, question: str, after_round: int = None):
         """Add a moderator question to be asked after a specific round."""
@@ -55,7 +72,7 @@ class FocusGroupSimulator:
             'after_round': after_round or self.current_round,
             'asked': False
         })
-        app_logger.info(f"Added moderator question after round {after_round}: {question[:50]}...")
+        app_logger.info("Added moderator question after round %s: %.50s...", after_round, question)
 
     def pause_simulation(self):
         """Pause the simulation."""
@@ -69,10 +86,13 @@ class FocusGroupSimulator:
 
     def inject_question(self, question: str) -> dict:
         """Inject a question mid-conversation and get immediate responses."""
+        return run_async(self.ainject_question(question))
+
+    async def ainject_question(self, question: str) -> dict:
         if self.state != SimulationState.RUNNING:
             raise ValueError("Cannot inject question when simulation is not running")
         
-        app_logger.info(f"Injecting moderator question: {question[:50]}...")
+        app_logger.info("Injecting moderator question: %.50s...", question)
         
         # Add moderator entry to transcript
         moderator_entry = {
@@ -86,7 +106,7 @@ class FocusGroupSimulator:
         # Get responses from all personas
         responses = []
         for p_idx, p_details in enumerate(self.personas_details):
-            response = self._get_llm_moderator_response(p_details, question, p_idx)
+            response = await self._get_llm_moderator_response(p_details, question, p_idx)
             response_entry = {
                 'persona_index': p_idx,
                 'persona_details': p_details,
@@ -208,8 +228,19 @@ class FocusGroupSimulator:
             }
         }
 
-    def _get_llm_initial_reaction(self, persona_details: str, persona_index: int) -> str:
-        model = config['default'].DEFAULT_TEXT_MODEL
+    async def _get_image_description_text(self):
+        """The cached description of the stimulus image, or None to fall back to sending the image."""
+        if self._image_description is None:
+            try:
+                description = format_image_description(await adescribe_image(self.stimulus_image_data))
+            except Exception as e:
+                app_logger.error("Could not describe stimulus image, using full vision: %s", e, exc_info=True)
+                description = ''
+            self._image_description = description
+        return self._image_description or None
+
+    async def _get_llm_initial_reaction(self, persona_details: str, persona_index: int) -> str:
+        model = self.model  # None lets the call site's route choose
         temperature = config['default'].DEFAULT_TEMPERATURE
         max_tokens_config_key = 'DEFAULT_MAX_TOKENS_TEXT'
         
@@ -232,7 +263,25 @@ class FocusGroupSimulator:
             "Please provide only your introduction as the persona."
         )
 
-        if self.stimulus_image_data:
+        image_description = None
+        if self.stimulus_image_data and not self.full_vision:
+            image_description = await self._get_image_description_text()
+
+        if image_description:
+            message_part = f" and the message: \"{self.stimulus_message}\"" if self.stimulus_message else ""
+            base_prompt_text_updated = (
+                f"Persona Profile: {persona_details}\n"
+                f"{name_enforcement}\n"
+                f"\nInteraction Style: {style_modifier}\n\n"
+                "You are about to give your initial, independent thoughts for a focus group. "
+                f"The topic is related to an image{message_part}. "
+                f"The image, described in detail (treat it as if you are looking at it):\n{image_description}\n\n"
+                "Be conversational. What are your very first, independent reactions and thoughts as this persona? "
+                "Please provide only your response as the persona."
+            )
+            messages.append({"role": "user", "content": base_prompt_text_updated})
+
+        elif self.stimulus_image_data:
             model = config['default'].DEFAULT_VISION_MODEL
             max_tokens_config_key = 'DEFAULT_MAX_TOKENS_VISION'
             
@@ -250,10 +299,7 @@ class FocusGroupSimulator:
                 )
                 content_list = [{"type": "text", "text": base_prompt_text_updated}]
 
-            content_list.append({
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{self.stimulus_image_data}"}
-            })
+            content_list.append(await aimage_content_part(self.stimulus_image_data))
             messages.append({"role": "user", "content": content_list})
         
         else: 
@@ -270,27 +316,29 @@ class FocusGroupSimulator:
             messages.append({"role": "user", "content": base_prompt_text_updated})
 
         max_tokens = getattr(config['default'], max_tokens_config_key, 300)
-        prompt_str = str(messages)[:500]
-        app_logger.debug(f"Initial reaction prompt for {persona_details[:30]}... using model {model}: {prompt_str}...")
+        prompt_preview = lazy(_preview, messages)
+        app_logger.debug("Initial reaction prompt for %.30s... using model %s: %s...", persona_details,
+                         lazy(resolve_model, 'focus_group.initial_reaction', model), prompt_preview)
 
         try:
             # OpenAI client is instantiated implicitly here if OPENAI_API_KEY is in env
-            response = openai.chat.completions.create(
+            response = await achat_completion(
+                call_site='focus_group.initial_reaction',
                 model=model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens
             )
             content = response.choices[0].message.content.strip()
-            app_logger.info(f"Generated initial reaction for persona {persona_details[:30]}... Output: {content[:300]}...")
+            app_logger.info("Generated initial reaction for persona %.30s... Output: %.300s...", persona_details, content, extra=SAMPLED)
             return content
         except Exception as e:
-            app_logger.error(f"Error generating initial reaction for {persona_details[:30]}... Prompt: {prompt_str}... Error: {str(e)}", exc_info=True)
+            app_logger.error("Error generating initial reaction for %.30s... Prompt: %s... Error: %s", persona_details, prompt_preview, e, exc_info=True)
             # Re-raise the exception to be caught by the main simulation loop
             raise
 
-    def _get_llm_discussion_response(self, persona_details: str, conversation_history_str: str, persona_index: int) -> str:
-        model = config['default'].DEFAULT_TEXT_MODEL
+    async def _get_llm_discussion_response(self, persona_details: str, conversation_history_str: str, persona_index: int) -> str:
+        model = self.model  # None lets the call site's route choose
         temperature = config['default'].DEFAULT_TEMPERATURE
         max_tokens = getattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT', 400)
 
@@ -316,12 +364,12 @@ class FocusGroupSimulator:
             f"{conversation_history_str}\n\n"
             "What are your thoughts now? Please provide only your response as this persona."
         )
-        prompt_str = prompt[:500]
-        app_logger.debug(f"Discussion prompt for {persona_details[:30]}...: {prompt_str}...")
+        app_logger.debug("Discussion prompt for %.30s...: %.500s...", persona_details, prompt)
 
         try:
             # OpenAI client is instantiated implicitly here if OPENAI_API_KEY is in env
-            response = openai.chat.completions.create(
+            response = await achat_completion(
+                call_site='focus_group.discussion',
                 model=model,
                 messages=[
                     {"role": "system", "content": "You are a participant in a focus group discussion."},
@@ -331,16 +379,16 @@ class FocusGroupSimulator:
                 max_tokens=max_tokens
             )
             content = response.choices[0].message.content.strip()
-            app_logger.info(f"Generated discussion response for persona {persona_details[:30]}... Output: {content[:300]}...")
+            app_logger.info("Generated discussion response for persona %.30s... Output: %.300s...", persona_details, content, extra=SAMPLED)
             return content
         except Exception as e:
-            app_logger.error(f"Error generating discussion response for {persona_details[:30]}... Prompt: {prompt_str}... Error: {str(e)}", exc_info=True)
+            app_logger.error("Error generating discussion response for %.30s... Prompt: %.500s... Error: %s", persona_details, prompt, e, exc_info=True)
             # Re-raise the exception to be caught by the main simulation loop
             raise
 
-    def _get_llm_moderator_response(self, persona_details: str, moderator_question: str, persona_index: int) -> str:
+    async def _get_llm_moderator_response(self, persona_details: str, moderator_question: str, persona_index: int) -> str:
         """Generate response to a moderator question."""
-        model = config['default'].DEFAULT_TEXT_MODEL
+        model = self.model  # None lets the call site's route choose
         temperature = config['default'].DEFAULT_TEMPERATURE
         max_tokens = getattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT', 400)
 
@@ -362,12 +410,12 @@ class FocusGroupSimulator:
             f"{conversation_history_str}\n\n"
             "How do you respond to the moderator's question as this persona? Be conversational and authentic."
         )
-        prompt_str = prompt[:500]
-        app_logger.debug(f"Moderator response prompt for {persona_details[:30]}...: {prompt_str}...")
+        app_logger.debug("Moderator response prompt for %.30s...: %.500s...", persona_details, prompt)
 
         try:
             # OpenAI client is instantiated implicitly here if OPENAI_API_KEY is in env
-            response = openai.chat.completions.create(
+            response = await achat_completion(
+                call_site='focus_group.moderator_response',
                 model=model,
                 messages=[
                     {"role": "system", "content": "You are simulating a focus group participant responding to a moderator question."},
@@ -377,15 +425,19 @@ class FocusGroupSimulator:
                 max_tokens=max_tokens
             )
             content = response.choices[0].message.content.strip()
-            app_logger.info(f"Generated moderator response for persona {persona_details[:30]}... Output: {content[:300]}...")
+            app_logger.info("Generated moderator response for persona %.30s... Output: %.300s...", persona_details, content, extra=SAMPLED)
             return content
         except Exception as e:
-            app_logger.error(f"Error generating moderator response for {persona_details[:30]}... Prompt: {prompt_str}... Error: {str(e)}", exc_info=True)
+            app_logger.error("Error generating moderator response for %.30s... Prompt: %.500s... Error: %s", persona_details, prompt, e, exc_info=True)
             # Re-raise the exception to be caught by the main simulation loop
             raise
 
     def run_simulation(self, num_discussion_rounds: int = 1) -> dict:
-        app_logger.info(f"Starting focus group simulation with {num_discussion_rounds} discussion round(s).")
+        """Runs the simulation on the shared LLM event loop; the calling thread only waits for the result."""
+        return run_async(self.arun_simulation(num_discussion_rounds))
+
+    async def arun_simulation(self, num_discussion_rounds: int = 1) -> dict:
+        app_logger.info("Starting focus group simulation with %d discussion round(s).", num_discussion_rounds)
         self.current_round = 0
         self.state = SimulationState.RUNNING
 
@@ -396,96 +448,114 @@ class FocusGroupSimulator:
                 'content': 'Hello and welcome to the focus group! Let\'s get started with some introductions.'
             })
 
-            # 2. Initial Reactions (personas introduce themselves naturally)
+            # 2. Initial Reactions (personas introduce themselves naturally; independent, so requested together)
             app_logger.info("Generating initial reactions (Round 0).")
-            for p_idx, p_details in enumerate(self.personas_details):
-                reaction = self._get_llm_initial_reaction(p_details, p_idx)
-                persona_name = p_details.split(',')[0].strip()
-                if reaction and reaction != 'undefined':
-                    self.transcript.append({
-                        'role': 'persona',
-                        'content': reaction,
-                        'persona_index': p_idx,
-                        'persona_details': p_details,
-                        'persona_name': persona_name,
-                        'sentiment': self._analyze_sentiment(reaction)
-                    })
+            with span('focus_group.initial_reactions', personas=len(self.personas_details)):
+                reactions = await asyncio.gather(*(
+                    self._get_llm_initial_reaction(p_details, p_idx) for p_idx, p_details in enumerate(self.personas_details)
+                ))
+                for p_idx, (p_details, reaction) in enumerate(zip(self.personas_details, reactions)):
+                    persona_name = p_details.split(',')[0].strip()
+                    if reaction and reaction != 'undefined':
+                        self.transcript.append({
+                            'role': 'persona',
+                            'content': reaction,
+                            'persona_index': p_idx,
+                            'persona_details': p_details,
+                            'persona_name': persona_name,
+                            'sentiment': self._analyze_sentiment(reaction)
+                        })
 
             # 3. Moderator Q&A (runs immediately after intros/reactions)
-            app_logger.info(f"Processing {len(self.moderator_questions)} moderator questions.")
-            for question_data in self.moderator_questions:
-                if not question_data.get('asked', False):
-                    question = question_data['question']
-                    app_logger.info(f"Asking moderator question: {question}")
-                    self.transcript.append({'role': 'moderator', 'content': question})
+            app_logger.info("Processing %d moderator questions.", len(self.moderator_questions))
+            with span('focus_group.moderator_questions', questions=sum(not q.get('asked', False) for q in self.moderator_questions)):
+                for question_data in self.moderator_questions:
+                    if not question_data.get('asked', False):
+                        question = question_data['question']
+                        app_logger.info("Asking moderator question: %s", question)
+                        self.transcript.append({'role': 'moderator', 'content': question})
                     
-                    # Get response from each persona
-                    for p_idx, p_details in enumerate(self.personas_details):
-                        app_logger.info(f"Getting response from persona {p_idx + 1} to question: {question[:50]}...")
-                        response = self._get_llm_moderator_response(p_details, question, p_idx)
-                        persona_name = p_details.split(',')[0].strip()
-                        if response and response != 'undefined':
-                            self.transcript.append({
-                                'role': 'persona',
-                                'content': response,
-                                'persona_index': p_idx,
-                                'persona_details': p_details,
-                                'persona_name': persona_name,
-                                'sentiment': self._analyze_sentiment(response)
-                            })
-                    question_data['asked'] = True
+                        # Get response from each persona
+                        for p_idx, p_details in enumerate(self.personas_details):
+                            app_logger.info("Getting response from persona %d to question: %.50s...", p_idx + 1, question, extra=SAMPLED)
+                            response = await self._get_llm_moderator_response(p_details, question, p_idx)
+                            persona_name = p_details.split(',')[0].strip()
+                            if response and response != 'undefined':
+                                self.transcript.append({
+                                    'role': 'persona',
+                                    'content': response,
+                                    'persona_index': p_idx,
+                                    'persona_details': p_details,
+                                    'persona_name': persona_name,
+                                    'sentiment': self._analyze_sentiment(response)
+                                })
+                        question_data['asked'] = True
 
             # 4. Discussion Rounds (if any)
             for i in range(num_discussion_rounds):
                 self.current_round = i + 1
                 if self.state == SimulationState.PAUSED:
-                    app_logger.info(f"Simulation paused before round {self.current_round}.")
+                    app_logger.info("Simulation paused before round %d.", self.current_round)
                     return self._current_simulation_status(f"Paused before round {self.current_round}")
                 
-                app_logger.info(f"Starting discussion round {self.current_round}.")
-                round_responses = [] # Store responses for this round for topic/consensus analysis
-
-                # Build conversation history string for this round
-                conversation_history_str = "\n".join([
-                    f"Persona {t.get('persona_index', '?')+1} ('{t.get('persona_details','').split(',')[0]}') said: {t.get('response_text','')}"
-                    for t in self.transcript if 'persona_index' in t and 'response_text' in t
-                ])
-
-                for p_idx, p_details in enumerate(self.personas_details):
-                    if self.state == SimulationState.PAUSED:
-                        app_logger.info(f"Simulation paused during round {self.current_round}.")
-                        return self._current_simulation_status(f"Paused during round {self.current_round}")
-
-                    app_logger.info(f"Round {self.current_round}, turn for persona {p_idx + 1}: {p_details[:50]}...")
-                    response_text = self._get_llm_discussion_response(p_details, conversation_history_str, p_idx)
-                    entry = {
-                        'persona_index': p_idx,
-                        'persona_details': p_details,
-                        'response_text': response_text,
-                        'round': self.current_round,
-                        'type': 'discussion_response',
-                        'timestamp': self._get_timestamp(),
-                        'sentiment': self._analyze_sentiment(response_text)
-                    }
-                    if response_text and response_text != 'undefined':
-                        self.transcript.append(entry)
-                        round_responses.append(entry)
-                    # Update conversation history for the next persona in the same round
-                    conversation_history_str += f"\nIn round {self.current_round}, Persona {p_idx + 1} ('{p_details.split(',')[0]}') said: {response_text}"
+                with span('focus_group.discussion_round', round=self.current_round, personas=len(self.personas_details)):
+                    app_logger.info("Starting discussion round %d.", self.current_round)
+                    round_responses = [] # Store responses for this round for topic/consensus analysis
+
+                    # Build conversation history string for this round
+                    conversation_history_str = "\n".join([
+                        f"Persona {t.get('persona_index', '?')+1} ('{t.get('persona_details','').split(',')[0]}') said: {t.get('response_text','')}"
+                        for t in self.transcript if 'persona_index' in t and 'response_text' in t
+                    ])
+
+                    snapshot_responses = None
+                    if self.snapshot_rounds:
+                        snapshot_responses = await asyncio.gather(*(
+                            self._get_llm_discussion_response(p_details, conversation_history_str, p_idx)
+                            for p_idx, p_details in enumerate(self.personas_details)
+                        ))
+
+                    for p_idx, p_details in enumerate(self.personas_details):
+                        if self.state == SimulationState.PAUSED:
+                            app_logger.info("Simulation paused during round %d.", self.current_round)
+                            return self._current_simulation_status(f"Paused during round {self.current_round}")
+
+                        app_logger.info("Round %d, turn for persona %d: %.50s...", self.current_round, p_idx + 1, p_details, extra=SAMPLED)
+                        if snapshot_responses is not None:
+                            response_text = snapshot_responses[p_idx]
+                        else:
+                            response_text = await self._get_llm_discussion_response(p_details, conversation_history_str, p_idx)
+                        entry = {
+                            'persona_index': p_idx,
+                            'persona_details': p_details,
+                            'response_text': response_text,
+                            'round': self.current_round,
+                            'type': 'discussion_response',
+                            'timestamp': self._get_timestamp(),
+                            'sentiment': self._analyze_sentiment(response_text)
+                        }
+                        if response_text and response_text != 'undefined':
+                            self.transcript.append(entry)
+                            round_responses.append(entry)
+                        # Update conversation history for the next persona in the same round
+                        conversation_history_str += f"\nIn round {self.current_round}, Persona {p_idx + 1} ('{p_details.split(',')[0]}') said: {response_text}"
                 
-                current_topics = self._extract_topics([resp['response_text'] for resp in round_responses])
-                self.topics_identified.append({'round': self.current_round, 'topics': current_topics})
-                self.sentiment_scores.append({'round': self.current_round, 'sentiments': [r['sentiment'] for r in round_responses]})
+                    current_topics = self._extract_topics([resp['response_text'] for resp in round_responses])
+                    self.topics_identified.append({'round': self.current_round, 'topics': current_topics})
+                    self.sentiment_scores.append({'round': self.current_round, 'sentiments': [r['sentiment'] for r in round_responses]})
 
             self.state = SimulationState.COMPLETED
             app_logger.info("Focus group simulation completed.")
+            with span('focus_group.analytics'):
+                # Keyword analytics and the themes call would otherwise hold up every other call on the loop
+                analytics = await run_in_executor(self._generate_analytics)
             return {
                 'status': 'completed',
                 'transcript': self.transcript,
-                'analytics': self._generate_analytics()
+                'analytics': analytics
             }
-        except openai.APIError as e:
-            app_logger.error(f"OpenAI API Error during simulation: {str(e)}", exc_info=True)
+        except get_openai().APIError as e:
+            app_logger.error("OpenAI API Error during simulation: %s", e, exc_info=True)
             self.state = SimulationState.ERROR
             return {
                 'status': 'error',
@@ -495,7 +565,7 @@ class FocusGroupSimulator:
                 'transcript': self.transcript  # Return partial transcript
             }
         except Exception as e:
-            app_logger.error(f"Unexpected error during simulation: {str(e)}", exc_info=True)
+            app_logger.error("Unexpected error during simulation: %s", e, exc_info=True)
             self.state = SimulationState.ERROR
             return {
                 'status': 'error',
@@ -557,8 +627,8 @@ class FocusGroupSimulator:
     def _extract_key_themes(self, content: str) -> list:
         """Extract key themes from focus group content using OpenAI."""
         try:
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
+            response = chat_completion(
+                call_site='focus_group.themes',
                 messages=[
                     {
                         "role": "system", 
@@ -576,7 +646,7 @@ class FocusGroupSimulator:
             themes = [theme.strip() for theme in themes_text.split('\n') if theme.strip()]
             return themes[:5]  # Limit to top 5 themes
         except Exception as e:
-            app_logger.error(f"Error extracting themes: {e}")
+            app_logger.error("Error extracting themes: %s", e)
             return ["Themes analysis unavailable"]
 
     def _get_dominant_sentiment(self, sentiments: List[dict]) -> str:
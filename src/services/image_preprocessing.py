@@ -0,0 +1,219 @@
+# src/services/image_preprocessing.py
+"""
+Normalises client images before they are sent to a vision model.
+
+Each distinct image is decoded once, its real format detected, downscaled to
+the resolution the vision model actually uses (longest side within
+IMAGE_MAX_DIMENSION, shortest side at most IMAGE_TARGET_SHORT_SIDE, which is
+where high-detail tiling tops out) and re-encoded at IMAGE_JPEG_QUALITY. The
+result is cached by content hash, so every persona call reuses the same
+small payload; a digest of the base64 string itself finds it again without
+decoding. Resizing needs the optional Pillow package; without it images are
+passed through with their detected MIME type.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from src.config import config
+from src.utils.logger import app_logger
+from src.utils.metrics import CACHE_LOOKUPS
+
+# Leading bytes of the image formats vision models accept
+IMAGE_MAGIC_NUMBERS = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+_prepared_cache = OrderedDict()
+_content_hashes = OrderedDict()  # digest of the base64 string -> content hash of the decoded image
+_cache_lock = threading.Lock()
+
+def decode_image_data(image_data: str) -> bytes:
+    """
+    Decodes base64 image data, accepting a data URL prefix and line breaks.
+
+    Raises:
+        ValueError: If the data is not valid base64 or exceeds IMAGE_MAX_INPUT_BYTES.
+    """
+    if image_data.startswith('data:') and ',' in image_data:
+        image_data = image_data.split(',', 1)[1]
+    try:
+        raw = base64.b64decode(''.join(image_data.split()), validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Image data is not valid base64: {e}")
+    max_bytes = getattr(config['default'], 'IMAGE_MAX_INPUT_BYTES', 20 * 1024 * 1024)
+    if len(raw) > max_bytes:
+        raise ValueError(f"Image is {len(raw)} bytes; the limit is {max_bytes}.")
+    return raw
+
+def _string_key(image_data: str) -> bytes:
+    return hashlib.blake2b(image_data.encode('utf-8'), digest_size=16).digest()
+
+def _remember(cache: OrderedDict, key, value):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > getattr(config['default'], 'IMAGE_CACHE_MAX_ENTRIES', 64):
+            cache.popitem(last=False)
+
+def image_content_hash(image_data: str) -> str:
+    """
+    sha256 of the decoded image, so re-encoded or re-wrapped base64 of the
+    same image matches. A given base64 string is only decoded the first time.
+
+    Raises:
+        ValueError: If the data is not valid base64 or exceeds IMAGE_MAX_INPUT_BYTES.
+    """
+    key = _string_key(image_data)
+    with _cache_lock:
+        content_hash = _content_hashes.get(key)
+        if content_hash is not None:
+            _content_hashes.move_to_end(key)
+    if content_hash is None:
+        content_hash = hashlib.sha256(decode_image_data(image_data)).hexdigest()
+        _remember(_content_hashes, key, content_hash)
+    return content_hash
+
+def detect_image_format(raw: bytes) -> str:
+    """
+    Returns the MIME type of an image from its leading bytes.
+
+    Raises:
+        ValueError: If the bytes are not a supported image format.
+    """
+    for magic, mime_type in IMAGE_MAGIC_NUMBERS:
+        if raw.startswith(magic):
+            return mime_type
+    if raw[:4] == b'RIFF' and raw[8:12] == b'WEBP':
+        return 'image/webp'
+    raise ValueError("Unsupported image format; expected JPEG, PNG, GIF or WebP.")
+
+def target_size(width: int, height: int) -> tuple:
+    """Scales (width, height) down to the vision model's working resolution, never up."""
+    max_dimension = getattr(config['default'], 'IMAGE_MAX_DIMENSION', 2048)
+    short_side = getattr(config['default'], 'IMAGE_TARGET_SHORT_SIDE', 768)
+    scale = min(1.0, max_dimension / max(width, height), short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def choose_detail(width: int, height: int) -> str:
+    """Small images gain nothing from high-detail tiling, which costs several times the tokens."""
+    return 'low' if max(width, height) <= getattr(config['default'], 'IMAGE_LOW_DETAIL_MAX_SIDE', 512) else 'high'
+
+def prepare_image(image_data: str) -> dict:
+    """
+    Decodes, normalises and caches an image for vision calls.
+
+    Returns:
+        dict: {'data': base64 str, 'mime_type', 'detail', 'width', 'height',
+            'data_url', 'original_bytes', 'bytes', 'content_hash'}. width and height are
+            None when Pillow is not installed.
+
+    Raises:
+        ValueError: If the image cannot be decoded, is too large or is not a supported format.
+    """
+    key = _string_key(image_data)
+    with _cache_lock:
+        prepared = _prepared_cache.get(_content_hashes.get(key))
+        if prepared is not None:
+            _prepared_cache.move_to_end(prepared['content_hash'])
+    if prepared is not None:
+        CACHE_LOOKUPS.inc(cache='prepared_image', result='hit')
+        return prepared
+
+    raw = decode_image_data(image_data)
+    content_hash = hashlib.sha256(raw).hexdigest()
+    _remember(_content_hashes, key, content_hash)
+    with _cache_lock:
+        prepared = _prepared_cache.get(content_hash)
+    if prepared is not None:
+        # The same image sent as a differently wrapped string
+        CACHE_LOOKUPS.inc(cache='prepared_image', result='hit')
+        return prepared
+    CACHE_LOOKUPS.inc(cache='prepared_image', result='miss')
+
+    mime_type = detect_image_format(raw)
+    prepared = _normalise(raw, mime_type)
+    # Built once so every request reuses the same string instead of re-concatenating it
+    prepared['data_url'] = f"data:{prepared['mime_type']};base64,{prepared['data']}"
+    prepared.update({'original_bytes': len(raw), 'content_hash': content_hash})
+    app_logger.info(
+        f"Prepared image {content_hash[:12]}: {len(raw)} -> {prepared['bytes']} bytes, "
+        f"{prepared['mime_type']}, detail={prepared['detail']}."
+    )
+
+    _remember(_prepared_cache, content_hash, prepared)
+    return prepared
+
+def _passthrough(raw: bytes, mime_type: str) -> dict:
+    return {
+        'data': base64.b64encode(raw).decode('ascii'), 'mime_type': mime_type, 'detail': 'auto',
+        'width': None, 'height': None, 'bytes': len(raw)
+    }
+
+def _normalise(raw: bytes, mime_type: str) -> dict:
+    try:
+        from PIL import Image
+    except ImportError:
+        return _passthrough(raw, mime_type)
+    try:
+        return _resize_and_encode(Image, raw, mime_type)
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"Image has too many pixels to process: {e}")
+    except OSError as e:
+        # e.g. a Pillow build without WebP support
+        app_logger.warning(f"Could not re-encode {mime_type} image, sending it as is: {e}")
+        return _passthrough(raw, mime_type)
+
+def _resize_and_encode(Image, raw: bytes, mime_type: str) -> dict:
+    with Image.open(io.BytesIO(raw)) as image:
+        image.seek(0)  # First frame of animated GIFs
+        width, height = target_size(*image.size)
+        resized = (width, height) != image.size
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        converted = image.convert('RGBA' if has_alpha else 'RGB')
+        if resized:
+            converted = converted.resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if has_alpha:
+            converted.save(buffer, format='PNG', optimize=True)
+            out_mime = 'image/png'
+        else:
+            converted.save(buffer, format='JPEG', quality=getattr(config['default'], 'IMAGE_JPEG_QUALITY', 85), optimize=True)
+            out_mime = 'image/jpeg'
+
+    data = buffer.getvalue()
+    # Re-encoding an already small, well-compressed file can make it bigger
+    if not resized and mime_type == out_mime and len(data) >= len(raw):
+        data = raw
+    return {
+        'data': base64.b64encode(data).decode('ascii'), 'mime_type': out_mime, 'detail': choose_detail(width, height),
+        'width': width, 'height': height, 'bytes': len(data)
+    }
+
+def image_content_part(image_data: str) -> dict:
+    """
+    The chat message content part for an image, normalised and with a detail level.
+    Decoding and resizing block; coroutines use aimage_content_part.
+
+    Raises:
+        ValueError: If the image cannot be decoded, is too large or is not a supported format;
+            such images are never sent to the model.
+    """
+    return _content_part(prepare_image(image_data))
+
+async def aimage_content_part(image_data: str) -> dict:
+    """image_content_part for the LLM event loop: the image is prepared on the executor, not the loop."""
+    # Imported here: llm_client's event loop is not needed by the blocking helpers above
+    from src.services.llm_client import run_in_executor
+    return _content_part(await run_in_executor(prepare_image, image_data))
+
+def _content_part(prepared: dict) -> dict:
+    return {
+        "type": "image_url",
+        "image_url": {"url": prepared['data_url'], "detail": prepared['detail']}
+    }
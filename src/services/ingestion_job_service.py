@@ -0,0 +1,233 @@
+# src/services/ingestion_job_service.py
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from src.config import config
+from src.database import get_db_connection
+from src.utils.logger import app_logger
+
+RESUMABLE_STATUSES = ('queued', 'failed')
+
+def incomplete_job_ids(stale_seconds: float = None) -> list:
+    """IDs of jobs still queued, or running without a checkpoint for stale_seconds (INGESTION_JOB_STALE_SECONDS by default)."""
+    if stale_seconds is None:
+        stale_seconds = getattr(config['default'], 'INGESTION_JOB_STALE_SECONDS', 120)
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            "SELECT id FROM ingestion_jobs WHERE status = 'queued' "
+            "OR (status = 'running' AND updated_at < datetime('now', ?))",
+            (f"-{int(stale_seconds)} seconds",)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+class IngestionJobService:
+    """
+    Runs client data ingestion as background jobs.
+
+    Jobs are stored in the ingestion_jobs table. After every chunk the worker
+    records the number of rows committed in the same transaction as the
+    personas themselves, so a failed or interrupted job resumes from exactly
+    the last committed row.
+    """
+    def __init__(self, client_data_service, max_workers: int = None, app_config=None):
+        """
+        Initializes the IngestionJobService.
+
+        Args:
+            client_data_service: Service that performs the chunked ingestion.
+            max_workers (int, optional): Number of concurrent ingestion workers.
+            app_config (optional): Config class to read settings from; defaults to config['default'].
+        """
+        self.client_data_service = client_data_service
+        app_config = app_config or config['default']
+        self.max_workers = max_workers or getattr(app_config, 'INGESTION_MAX_WORKERS', 2)
+        self.stale_seconds = getattr(app_config, 'INGESTION_JOB_STALE_SECONDS', 120)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingestion')
+        app_logger.info(f"IngestionJobService initialized with {self.max_workers} worker(s).")
+
+    def submit_job(self, file_path: str, owner_id: str, audience_name: str, column_mapping: dict = None, data_id: str = None) -> dict:
+        """
+        Validates an upload, creates its audience and queues it for ingestion.
+
+        Returns:
+            dict: The job ID and audience the personas will be added to.
+        """
+        app_logger.info(f"Queueing ingestion job for '{file_path}' (owner '{owner_id}').")
+        try:
+            # Imported here (it loads pandas): app startup reads incomplete_job_ids from this module
+            from src.services import client_data_readers
+            client_data_readers.detect_format(file_path)
+
+            mapping = self.client_data_service.resolve_column_mapping(file_path, column_mapping, data_id)
+            audience = self.client_data_service.audience_service.create_audience_from_filters(
+                name=audience_name,
+                audience_type='client',
+                criteria={"source_file": file_path, "column_mapping": mapping},
+                owner_id=owner_id
+            )
+            total_rows_estimate = self.client_data_service.estimate_row_count(file_path)
+
+            job_id = str(uuid.uuid4())
+            conn = get_db_connection()
+            try:
+                conn.execute(
+                    "INSERT INTO ingestion_jobs (id, owner_id, file_path, audience_id, column_mapping, status, total_rows_estimate) "
+                    "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                    (job_id, owner_id, file_path, audience.get("id"), json.dumps(mapping), total_rows_estimate)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            app_logger.error(f"Failed to queue ingestion job for {file_path}: {e}", exc_info=True)
+            return {"status": "error", "message": str(e)}
+
+        self.executor.submit(self._run_job, job_id)
+        return {
+            "status": "accepted",
+            "job_id": job_id,
+            "audience_id": audience.get("id"),
+            "audience_name": audience_name,
+            "total_rows_estimate": total_rows_estimate
+        }
+
+    def get_job_status(self, job_id: str) -> dict:
+        """
+        Returns progress for a job, including throughput and an ETA.
+        """
+        conn = get_db_connection()
+        try:
+            job = self._fetch_job(conn, job_id)
+            if not job:
+                return None
+            is_stale = self._is_stale(conn, job_id)
+        finally:
+            conn.close()
+
+        rows_done = job['rows_done']
+        total = max(job['total_rows_estimate'] or 0, rows_done)
+        rows_per_second = job['rows_per_second'] or 0.0
+        eta_seconds = None
+        if job['status'] == 'completed':
+            eta_seconds = 0
+        elif rows_per_second > 0:
+            eta_seconds = round((total - rows_done) / rows_per_second, 1)
+
+        status = job['status']
+        if status == 'running' and is_stale:
+            status = 'interrupted'
+
+        return {
+            "job_id": job['id'],
+            "status": status,
+            "audience_id": job['audience_id'],
+            "rows_done": rows_done,
+            "total_rows_estimate": total,
+            "percent_complete": round(100.0 * rows_done / total, 1) if total else (100.0 if status == 'completed' else 0.0),
+            "rows_per_second": round(rows_per_second, 1),
+            "eta_seconds": eta_seconds,
+            "attempts": job['attempts'],
+            "error": job['error'],
+            "created_at": job['created_at'],
+            "updated_at": job['updated_at'],
+            "completed_at": job['completed_at']
+        }
+
+    def resume_job(self, job_id: str) -> dict:
+        """
+        Re-queues a failed or interrupted job. It continues from its checkpoint.
+        """
+        conn = get_db_connection()
+        try:
+            job = self._fetch_job(conn, job_id)
+            if not job:
+                return {"status": "error", "message": "Job not found"}
+            if job['status'] == 'completed':
+                return {"status": "error", "message": "Job has already completed"}
+            if job['status'] == 'running' and not self._is_stale(conn, job_id):
+                return {"status": "error", "message": "Job is already running"}
+        finally:
+            conn.close()
+
+        app_logger.info(f"Resuming ingestion job {job_id} from row {job['rows_done']}.")
+        self.executor.submit(self._run_job, job_id)
+        return {"status": "accepted", "job_id": job_id, "resume_from_row": job['rows_done']}
+
+    def resume_incomplete_jobs(self) -> list:
+        """
+        Re-queues jobs left queued or interrupted by a previous process.
+        Intended to be called once at startup.
+        """
+        job_ids = incomplete_job_ids(self.stale_seconds)
+        for job_id in job_ids:
+            self.executor.submit(self._run_job, job_id)
+        if job_ids:
+            app_logger.info(f"Resuming {len(job_ids)} incomplete ingestion job(s).")
+        return job_ids
+
+    def _run_job(self, job_id: str):
+        """Worker entry point: claims the job and ingests from its checkpoint."""
+        conn = get_db_connection()
+        try:
+            if not self._claim_job(conn, job_id):
+                app_logger.info(f"Ingestion job {job_id} is not claimable; skipping.")
+                return
+
+            job = self._fetch_job(conn, job_id)
+            mapping = json.loads(job['column_mapping'])
+            app_logger.info(f"Running ingestion job {job_id} from row {job['rows_done']}.")
+
+            def checkpoint(chunk_conn, rows_done, rows_per_second):
+                chunk_conn.execute(
+                    "UPDATE ingestion_jobs SET rows_done = ?, rows_per_second = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (rows_done, rows_per_second, job_id)
+                )
+
+            stats = self.client_data_service.ingest_file(
+                job['file_path'], job['audience_id'], mapping,
+                start_row=job['rows_done'], db=conn, on_chunk=checkpoint
+            )
+
+            criteria = {"source_file": job['file_path'], "column_mapping": mapping, "record_count": stats["rows_processed"]}
+            self.client_data_service.audience_service.update_audience_criteria(job['audience_id'], criteria, db=conn)
+            conn.execute(
+                "UPDATE ingestion_jobs SET status = 'completed', rows_done = ?, total_rows_estimate = ?, error = NULL, "
+                "updated_at = CURRENT_TIMESTAMP, completed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (stats["rows_processed"], stats["rows_processed"], job_id)
+            )
+            conn.commit()
+            app_logger.info(f"Ingestion job {job_id} completed: {stats['rows_processed']} rows.")
+        except Exception as e:
+            app_logger.error(f"Ingestion job {job_id} failed: {e}", exc_info=True)
+            conn.rollback()
+            conn.execute(
+                "UPDATE ingestion_jobs SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (str(e), job_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _claim_job(self, conn, job_id: str) -> bool:
+        """Atomically moves a job to 'running' so only one worker processes it."""
+        cursor = conn.execute(
+            "UPDATE ingestion_jobs SET status = 'running', attempts = attempts + 1, error = NULL, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND (status IN (?, ?) OR (status = 'running' AND updated_at < datetime('now', ?)))",
+            (job_id, *RESUMABLE_STATUSES, f"-{int(self.stale_seconds)} seconds")
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def _is_stale(self, conn, job_id: str) -> bool:
+        row = conn.execute(
+            "SELECT updated_at < datetime('now', ?) FROM ingestion_jobs WHERE id = ?",
+            (f"-{int(self.stale_seconds)} seconds", job_id)
+        ).fetchone()
+        return bool(row and row[0])
+
+    @staticmethod
+    def _fetch_job(conn, job_id: str):
+        return conn.execute("SELECT * FROM ingestion_jobs WHERE id = ?", (job_id,)).fetchone()
@@ -0,0 +1,385 @@
+# src/services/llm_client.py
+"""
+Single entry point for OpenAI calls.
+
+The openai package takes a large share of startup time to import, so it is
+imported on the first call rather than when a service module is loaded.
+The API key is configured once, at the same moment.
+
+LLM-bound endpoints run their calls on one shared asyncio event loop with
+the async OpenAI client, so an in-flight call costs a coroutine rather than
+a thread. Request threads hand a coroutine to the loop with run_async and
+wait for its result, so a request's fan-out shares one waiting thread, but
+each request still occupies its WSGI worker thread until it completes.
+Blocking or CPU-bound work reached from the loop goes through
+run_in_executor so it never stalls the other calls.
+
+Each call is routed by its call site (see model_router), which picks the
+model, the timeout and the fallback, and may cascade from a draft model.
+An async call still running past the live p95 latency of its model and call
+site is hedged: a duplicate is sent, the first success is used and the
+other is cancelled, for at most LLM_HEDGE_PERCENT of calls.
+"""
+import asyncio
+import contextvars
+import functools
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.config import config
+from src.services.model_router import Route, escalation_reason, get_route
+from src.services.usage_service import usage_ledger
+from src.utils.latency import llm_latency
+from src.utils.logger import SAMPLED, app_logger
+from src.utils.metrics import LLM_HEDGES, LLM_REQUEST_SECONDS, LLM_ROUTE_DECISIONS, LLM_TOKENS
+from src.utils.tracing import span
+
+_openai = None
+_openai_lock = threading.Lock()
+
+_sync_client = None
+_async_client = None
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+_in_flight = None
+_executor = None
+_hedge_delays = {}  # (model, call_site) -> (refresh_at, seconds or None)
+_hedge_credit = 0.0
+
+def get_openai():
+    """Imports and configures the openai module on first use."""
+    global _openai
+    if _openai is None:
+        with _openai_lock:
+            if _openai is None:
+                import openai
+                if not getattr(openai, 'api_key', None) and config['default'].OPENAI_API_KEY:
+                    openai.api_key = config['default'].OPENAI_API_KEY
+                    app_logger.info("OpenAI API Key set in LLM client.")
+                _openai = openai
+    return _openai
+
+def _record_call(model: str, call_site: str, start_time: float, response=None, error: Exception = None, span_attributes: dict = None):
+    """Records latency and token usage for one LLM call, in metrics and the usage ledger."""
+    outcome = 'error' if error is not None else 'ok'
+    elapsed = time.perf_counter() - start_time
+    LLM_REQUEST_SECONDS.observe(elapsed, model=model, call_site=call_site, outcome=outcome)
+    if error is None:
+        llm_latency.observe((model, call_site), elapsed)
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        LLM_TOKENS.inc(prompt_tokens, model=model, call_site=call_site, kind='prompt')
+        LLM_TOKENS.inc(completion_tokens, model=model, call_site=call_site, kind='completion')
+        usage_ledger.record(model, call_site, prompt_tokens, completion_tokens)
+        if span_attributes is not None:
+            span_attributes.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+def _fallback_model(call_site: str, route: Route, model: str, error: Exception):
+    """The route's fallback model if a failed call at model should be retried with it, else None."""
+    if not route.fallback_model or route.fallback_model == model:
+        return None
+    # A rejected request would be rejected by the fallback too
+    if isinstance(error, getattr(get_openai(), 'BadRequestError', ())):
+        return None
+    LLM_ROUTE_DECISIONS.inc(call_site=call_site, decision='fallback')
+    app_logger.warning("%s call to %s failed (%s); retrying with %s.", call_site, model, type(error).__name__, route.fallback_model)
+    return route.fallback_model
+
+def _keep_draft(call_site: str, route: Route, draft) -> bool:
+    """Whether a cascade's draft is good enough to return; records the decision."""
+    reason = escalation_reason(draft, route.min_confidence) if draft is not None else 'error'
+    LLM_ROUTE_DECISIONS.inc(call_site=call_site, decision='draft_accepted' if reason is None else f'escalated_{reason}')
+    if reason is not None:
+        app_logger.info("%s draft from %s escalated to %s (%s).", call_site, route.draft_model, route.model, reason, extra=SAMPLED)
+    return reason is None
+
+def _supported_kwargs(kwargs: dict) -> dict:
+    """Drops JSON mode for models that reject response_format; their prompts still ask for JSON."""
+    if 'response_format' in kwargs and kwargs.get('model') in getattr(config['default'], 'JSON_MODE_UNSUPPORTED_MODELS', ()):
+        return {key: value for key, value in kwargs.items() if key != 'response_format'}
+    return kwargs
+
+def _retry_delay(error: Exception, attempt: int):
+    """Seconds to wait before retrying a transient error (rate limit, 5xx, connection), or None if it is not one."""
+    openai = get_openai()
+    transient = tuple(getattr(openai, name) for name in ('RateLimitError', 'InternalServerError', 'APIConnectionError') if hasattr(openai, name))
+    if not isinstance(error, transient):
+        return None
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        # The same backoff the client uses: 0.5s doubling, at most 8s
+        return min(0.5 * 2 ** attempt, 8.0)
+
+def _create(call_site: str, kwargs: dict, timeout: float):
+    """
+    A blocking completion. Like the async path, transient errors are retried
+    (up to LLM_CLIENT_MAX_RETRIES times) only while they fit in timeout, which
+    bounds the whole call; each attempt gets the time that is left.
+    """
+    model = kwargs.get('model', 'unknown')
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        with span('llm.chat_completion', model=model, call_site=call_site) as span_attributes:
+            start_time = time.perf_counter()
+            try:
+                response = get_sync_openai().chat.completions.create(timeout=deadline - time.monotonic(), **_supported_kwargs(kwargs))
+            except Exception as e:
+                _record_call(model, call_site, start_time, error=e)
+                error, delay = e, _retry_delay(e, attempt)
+                if (delay is None or attempt >= getattr(config['default'], 'LLM_CLIENT_MAX_RETRIES', 2)
+                        or time.monotonic() + delay >= deadline):
+                    raise
+            else:
+                _record_call(model, call_site, start_time, response, span_attributes=span_attributes)
+                return response
+        attempt += 1
+        app_logger.warning("%s call to %s failed (%s); retry %d in %.1fs.", call_site, model, type(error).__name__, attempt, delay)
+        time.sleep(delay)
+
+def _create_with_fallback(call_site: str, route: Route, kwargs: dict):
+    try:
+        return _create(call_site, kwargs, route.timeout)
+    except Exception as e:
+        fallback_model = _fallback_model(call_site, route, kwargs['model'], e)
+        if fallback_model is None:
+            raise
+        return _create(call_site, dict(kwargs, model=fallback_model), route.timeout)
+
+def chat_completion(call_site: str = None, **kwargs):
+    """
+    Creates a chat completion; other arguments are passed straight to the OpenAI client.
+
+    The call site's route (see model_router) supplies the model when none is
+    given, possibly as a draft-then-escalate cascade, and sets the timeout
+    and fallback model.
+
+    Args:
+        call_site (str, optional): Route and metrics label; defaults to the calling function's name.
+    """
+    call_site = call_site or sys._getframe(1).f_code.co_name
+    route = get_route(call_site)
+    if kwargs.get('model') is None and route.draft_model:
+        try:
+            draft = _create(call_site, dict(kwargs, model=route.draft_model, **route.draft_kwargs()), route.timeout)
+        except Exception:
+            draft = None
+        if _keep_draft(call_site, route, draft):
+            return draft
+    return _create_with_fallback(call_site, route, dict(kwargs, model=kwargs.get('model') or route.model))
+
+# A route's timeout bounds a whole call, retries included: asyncio.wait_for
+# around the async client's own retries, and _create's deadline for the sync
+# client, which leaves retrying to _create
+def get_sync_openai():
+    """The shared OpenAI client for blocking chat completions."""
+    global _sync_client
+    if _sync_client is None:
+        with _openai_lock:
+            if _sync_client is None:
+                _sync_client = get_openai().OpenAI(api_key=config['default'].OPENAI_API_KEY or None, max_retries=0)
+    return _sync_client
+
+def get_async_openai():
+    """The shared AsyncOpenAI client; only used from the event loop, so its connection pool is bound to it."""
+    global _async_client
+    if _async_client is None:
+        with _openai_lock:
+            if _async_client is None:
+                _async_client = get_openai().AsyncOpenAI(api_key=config['default'].OPENAI_API_KEY or None,
+                                                         max_retries=getattr(config['default'], 'LLM_CLIENT_MAX_RETRIES', 2))
+    return _async_client
+
+def _hedge_delay(model: str, call_site: str):
+    """Seconds after which a call is hedged, or None while too few calls have been seen."""
+    key = (model, call_site)
+    now = time.monotonic()
+    cached = _hedge_delays.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    delay = None
+    if llm_latency.count(key) >= getattr(config['default'], 'LLM_HEDGE_MIN_SAMPLES', 20):
+        delay = max(getattr(config['default'], 'LLM_HEDGE_MIN_DELAY', 0.5),
+                    llm_latency.percentile(key, getattr(config['default'], 'LLM_HEDGE_PERCENTILE', 95)))
+    _hedge_delays[key] = (now + getattr(config['default'], 'LLM_HEDGE_DELAY_REFRESH', 5.0), delay)
+    return delay
+
+def _earn_hedge_credit(percent: float):
+    """Every call earns percent/100 of a hedge, up to LLM_HEDGE_BURST; only touched from the event loop."""
+    global _hedge_credit
+    _hedge_credit = min(getattr(config['default'], 'LLM_HEDGE_BURST', 10), _hedge_credit + percent / 100)
+
+def _spend_hedge_credit() -> bool:
+    global _hedge_credit
+    if _hedge_credit < 1:
+        return False
+    _hedge_credit -= 1
+    return True
+
+def _record_hedge_loser(model: str, call_site: str, winner):
+    """
+    Charges the request that lost a hedge. Its prompt was sent and billed even
+    though its reply is discarded; the tokens it generated before being
+    cancelled are not known and go uncounted.
+    """
+    prompt_tokens = getattr(getattr(winner, 'usage', None), 'prompt_tokens', 0) or 0
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, model=model, call_site=call_site, kind='prompt')
+        usage_ledger.record(model, call_site, prompt_tokens, 0)
+
+async def _hedged_create(call_site: str, model: str, kwargs: dict):
+    """
+    Sends the request, plus a duplicate if it is still running after the
+    hedge delay and the budget allows one. Returns the first to succeed and
+    cancels the other; raises only when both fail.
+    """
+    create = get_async_openai().chat.completions.create
+    percent = getattr(config['default'], 'LLM_HEDGE_PERCENT', 0)
+    if percent <= 0:
+        return await create(**kwargs)
+    _earn_hedge_credit(percent)
+    delay = _hedge_delay(model, call_site)
+    if delay is None:
+        return await create(**kwargs)
+
+    primary = asyncio.ensure_future(create(**kwargs))
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result()
+        # The duplicate takes an in-flight slot of its own, or is not sent
+        if _in_flight is not None and _in_flight.locked():
+            LLM_HEDGES.inc(call_site=call_site, outcome='no_capacity')
+            return await primary
+        if not _spend_hedge_credit():
+            LLM_HEDGES.inc(call_site=call_site, outcome='over_budget')
+            return await primary
+        if _in_flight is not None:
+            await _in_flight.acquire()  # Free, so this does not wait
+        hedge = asyncio.ensure_future(create(**kwargs))
+        if _in_flight is not None:
+            hedge.add_done_callback(lambda _: _in_flight.release())
+        pending.add(hedge)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    LLM_HEDGES.inc(call_site=call_site, outcome='won' if task is hedge else 'lost')
+                    loser = primary if task is hedge else hedge
+                    if not loser.done() or loser.exception() is None:
+                        _record_hedge_loser(model, call_site, task.result())
+                    return task.result()
+                error = error or task.exception()
+        LLM_HEDGES.inc(call_site=call_site, outcome='failed')
+        raise error
+    finally:
+        # The loser, or both if the caller gave up waiting
+        for task in pending:
+            task.cancel()
+
+async def _acreate(call_site: str, kwargs: dict, timeout: float):
+    global _in_flight
+    if _in_flight is None:
+        _in_flight = asyncio.Semaphore(max(1, getattr(config['default'], 'LLM_MAX_IN_FLIGHT', 256)))
+    model = kwargs.get('model', 'unknown')
+    async with _in_flight:
+        with span('llm.chat_completion', model=model, call_site=call_site) as span_attributes:
+            start_time = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(_hedged_create(call_site, model, _supported_kwargs(kwargs)), timeout)
+            except Exception as e:
+                _record_call(model, call_site, start_time, error=e)
+                raise
+            _record_call(model, call_site, start_time, response, span_attributes=span_attributes)
+    return response
+
+async def _acreate_with_fallback(call_site: str, route: Route, kwargs: dict):
+    try:
+        return await _acreate(call_site, kwargs, route.timeout)
+    except Exception as e:
+        fallback_model = _fallback_model(call_site, route, kwargs['model'], e)
+        if fallback_model is None:
+            raise
+        return await _acreate(call_site, dict(kwargs, model=fallback_model), route.timeout)
+
+async def achat_completion(call_site: str = None, **kwargs):
+    """
+    Creates a chat completion with the async client, routed like
+    chat_completion. At most LLM_MAX_IN_FLIGHT calls run at once across the
+    process; the rest wait their turn on the loop. Latency and the route's
+    timeout are measured from when the call is sent, not while it queues.
+    """
+    call_site = call_site or sys._getframe(1).f_code.co_name
+    route = get_route(call_site)
+    if kwargs.get('model') is None and route.draft_model:
+        try:
+            draft = await _acreate(call_site, dict(kwargs, model=route.draft_model, **route.draft_kwargs()), route.timeout)
+        except Exception:
+            draft = None
+        if _keep_draft(call_site, route, draft):
+            return draft
+    return await _acreate_with_fallback(call_site, route, dict(kwargs, model=kwargs.get('model') or route.model))
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Starts the shared event loop on a daemon thread on first use."""
+    global _loop, _loop_thread
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                _loop_thread = threading.Thread(target=loop.run_forever, name='llm-event-loop', daemon=True)
+                _loop_thread.start()
+                _loop = loop
+                app_logger.info("LLM event loop started.")
+    return _loop
+
+def run_async(coro, timeout: float = None):
+    """
+    Runs a coroutine on the shared event loop and blocks the calling thread
+    until it finishes, re-raising its exception.
+
+    Raises:
+        RuntimeError: If called from the event loop itself, which would deadlock; await the coroutine instead.
+    """
+    loop = get_event_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_async called on the LLM event loop; await the coroutine instead.")
+    # Carry the caller's context variables (e.g. the current trace) onto the loop
+    return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), loop).result(timeout)
+
+async def _in_context(coro, context: contextvars.Context):
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+async def run_in_executor(func, *args, **kwargs):
+    """Runs blocking or CPU-bound work on a small thread pool without stalling the event loop."""
+    global _executor
+    if _executor is None:
+        with _loop_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, getattr(config['default'], 'LLM_EXECUTOR_WORKERS', 4)), thread_name_prefix='llm-executor'
+                )
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+async def gather_limited(coros: list, limit: int = None) -> list:
+    """Awaits coroutines concurrently, at most limit at a time, returning results in order."""
+    if not limit or limit >= len(coros):
+        return list(await asyncio.gather(*coros))
+    semaphore = asyncio.Semaphore(limit)
+
+    async def limited(coro):
+        async with semaphore:
+            return await coro
+    return list(await asyncio.gather(*(limited(coro) for coro in coros)))
@@ -0,0 +1,88 @@
+# src/services/model_router.py
+"""
+Per call site model routing.
+
+MODEL_ROUTES maps an LLM call site (the call_site label llm_client records
+metrics under) to the model it should use, a timeout, and a fallback model
+tried once when the call fails or times out. A route with a draft_model
+runs as a cascade: the fast draft model answers first, and the route's
+model is only called when the draft is truncated, empty, flagged (a
+refusal or an out-of-character reply), or, with min_confidence set, when
+the draft's mean token probability falls below it.
+
+A model passed explicitly by the caller always wins over the route's model
+and skips the cascade; timeouts and fallbacks still apply.
+"""
+import math
+import re
+from src.config import config
+
+# Replies that mean the model stepped out of the persona or refused
+FLAGGED_PATTERN = re.compile(
+    r"\b(as an ai|as a language model|i(?:'m| am) (?:sorry|unable)|i can(?:no|')t (?:help|assist|comply|provide))\b",
+    re.IGNORECASE
+)
+
+class Route:
+    def __init__(self, call_site: str, model: str = None, timeout: float = None, fallback_model: str = None,
+                 draft_model: str = None, min_confidence: float = None):
+        """
+        Args:
+            call_site (str): The call site this route applies to.
+            model (str, optional): Model for the call; DEFAULT_TEXT_MODEL when unset.
+            timeout (float, optional): Seconds per call, client retries included; DEFAULT_LLM_TIMEOUT when unset.
+                The fallback model gets as long again.
+            fallback_model (str, optional): Model tried once if the call fails or times out.
+            draft_model (str, optional): Fast model that drafts first, making the route a cascade.
+            min_confidence (float, optional): Mean token probability below which a draft escalates.
+                Drafts are requested with logprobs only when this is set.
+        """
+        self.call_site = call_site
+        self.model = model or config['default'].DEFAULT_TEXT_MODEL
+        self.timeout = timeout or getattr(config['default'], 'DEFAULT_LLM_TIMEOUT', 60)
+        self.fallback_model = fallback_model
+        self.draft_model = draft_model
+        self.min_confidence = min_confidence
+
+    def draft_kwargs(self) -> dict:
+        """Extra arguments for the draft request."""
+        return {'logprobs': True} if self.min_confidence else {}
+
+    def __repr__(self):
+        return f"<Route {self.call_site} model={self.model} draft={self.draft_model} fallback={self.fallback_model}>"
+
+def get_route(call_site: str) -> Route:
+    """The configured route for call_site, or a default route (DEFAULT_TEXT_MODEL, DEFAULT_LLM_TIMEOUT, no fallback)."""
+    return Route(call_site, **getattr(config['default'], 'MODEL_ROUTES', {}).get(call_site, {}))
+
+def resolve_model(call_site: str, requested: str = None) -> str:
+    """The model a call at call_site will use: the requested one, else the route's (its draft model for cascades)."""
+    if requested:
+        return requested
+    route = get_route(call_site)
+    return route.draft_model or route.model
+
+def _confidence(choice):
+    """exp(mean token logprob) of a reply, or None when logprobs were not returned."""
+    tokens = getattr(getattr(choice, 'logprobs', None), 'content', None)
+    if not tokens:
+        return None
+    return math.exp(sum(token.logprob for token in tokens) / len(tokens))
+
+def escalation_reason(response, min_confidence: float = None):
+    """Why a cascade's draft should go to the large model ('truncated', 'empty', 'flagged', 'low_confidence'), or None to keep it."""
+    choice = response.choices[0] if getattr(response, 'choices', None) else None
+    if choice is None:
+        return 'empty'
+    if getattr(choice, 'finish_reason', None) == 'length':
+        return 'truncated'
+    content = (choice.message.content or '').strip()
+    if not content:
+        return 'empty'
+    if FLAGGED_PATTERN.search(content):
+        return 'flagged'
+    if min_confidence:
+        confidence = _confidence(choice)
+        if confidence is not None and confidence < min_confidence:
+            return 'low_confidence'
+    return None
@@ -1,5 +1,4 @@
 # src/services/ons_data_service.py
-import pandas as pd
 from src.utils.logger import app_logger
 
 class ONSDataService:
@@ -10,31 +9,43 @@ class ONSDataService:
     """
     def __init__(self, data_path: str = 'data/ons_demographics.csv'):
         """
-        Initializes the ONSDataService and loads the dataset.
+        Initializes the ONSDataService. The dataset (and pandas) is loaded on
+        first access to self.df rather than here.
 
         Args:
             data_path (str): The file path to the ONS data CSV.
         """
         self.data_path = data_path
+        self._df = None
+        app_logger.info(f"ONSDataService initialized; data from '{data_path}' loads on first use.")
+
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = self._load_data()
+        return self._df
+
+    def _load_data(self):
+        import pandas as pd
         try:
-            # self.df = pd.read_csv(data_path)
+            # df = pd.read_csv(self.data_path)
             # For now, creating a dummy dataframe to avoid file errors
-            self.df = pd.DataFrame({
+            df = pd.DataFrame({
                 'region': ['Manchester', 'Manchester', 'Birmingham', 'Leeds'],
                 'age': [25, 45, 33, 22],
                 'gender': ['female', 'male', 'male', 'female'],
                 'income': [35000, 55000, 42000, 31000],
                 'occupation': ['teacher', 'engineer', 'manager', 'student']
             })
-            app_logger.info(f"ONSDataService initialized with data from '{data_path}'.")
+            app_logger.info(f"ONS data loaded from '{self.data_path}'.")
+            return df
         except FileNotFoundError:
-            app_logger.error(f"ONS data file not found at: {data_path}")
+            app_logger.error(f"ONS data file not found at: {self.data_path}")
             # Create an empty dataframe to prevent crashes
-            self.df = pd.DataFrame()
+            return pd.DataFrame()
         except Exception as e:
             app_logger.error(f"Error loading ONS data: {e}", exc_info=True)
-            self.df = pd.DataFrame()
-
+            return pd.DataFrame()
 
     def get_demographic_distribution(self, region: str) -> dict:
         """
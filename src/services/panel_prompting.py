@@ -0,0 +1,177 @@
+# src/services/panel_prompting.py
+import asyncio
+import json
+from src.config import config
+from src.services.image_preprocessing import aimage_content_part
+from src.services.llm_client import achat_completion, run_async
+from src.services.persona import agenerate_persona_response
+from src.services.vision import aanalyze_image, aanalyze_combined, adescribe_image, format_image_description
+from src.utils.logger import app_logger
+
+PANEL_INSTRUCTIONS = (
+    "Each numbered profile below is a different real person. Answer separately as each of them: "
+    "give yourself a name, be conversational and react honestly, as if talking to a friend. "
+    "Include specific details about what resonates with you or puts you off based on your background and values, "
+    "and give recommendations on how you would improve it. "
+    "Keep every person's voice distinct; do not let one answer echo another."
+)
+
+def chunk_panel(items: list, batch_size: int) -> list:
+    """Splits items into consecutive batches of at most batch_size."""
+    batch_size = max(1, batch_size)
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+def build_panel_messages(personas_details: list, stimulus_prompt: str, image_part: dict = None,
+                         system_prompt: str = "You are a consumer simulator that replies in JSON.") -> list:
+    """
+    Packs several persona profiles into one request with a single copy of the stimulus.
+    image_part is a content part from aimage_content_part, prepared once for all batches.
+
+    The reply is expected to be a JSON object {"responses": [...]} whose items
+    each carry the 1-based "persona" number they answer for.
+    """
+    profiles = "\n".join(f"Persona {i + 1}: {details}" for i, details in enumerate(personas_details))
+    prompt = f"{profiles}\n\n{stimulus_prompt}"
+    if image_part:
+        user_content = [
+            {"type": "text", "text": prompt},
+            image_part
+        ]
+    else:
+        user_content = prompt
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
+def parse_panel_reply(raw: str, count: int, validate) -> list:
+    """
+    Maps a panel reply back onto persona positions.
+
+    Args:
+        raw (str): The model's JSON reply.
+        count (int): Number of personas in the batch.
+        validate: Callable turning one reply item into a result; raises ValueError/TypeError when invalid.
+
+    Returns:
+        list: One validated result per persona, or None where the entry was missing or malformed.
+    """
+    results = [None] * count
+    try:
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        return results
+    items = data.get('responses') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return results
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get('persona', position + 1)) - 1
+        except (ValueError, TypeError):
+            continue
+        if not 0 <= index < count or results[index] is not None:
+            continue
+        try:
+            results[index] = validate(item)
+        except (ValueError, TypeError) as e:
+            app_logger.debug(f"Discarding malformed panel entry for persona {index + 1}: {e}")
+    return results
+
+async def complete_panel(messages: list, model: str, temperature: float, max_tokens: int) -> str:
+    response = await achat_completion(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        response_format={"type": "json_object"}
+    )
+    return response.choices[0].message.content
+
+def _validate_response(item: dict) -> str:
+    text = item.get('response')
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("missing 'response' text")
+    return text.strip()
+
+async def persona_reaction(persona_detail: str, message: str, image_data: str, full_vision: bool = False) -> str:
+    """One persona's free-text reaction to a message, an image or both, in its own call."""
+    if image_data and message:
+        return await aanalyze_combined(image_data, message, persona_detail, full_vision=full_vision)
+    if image_data:
+        return await aanalyze_image(image_data, persona_detail, full_vision=full_vision)
+    return await agenerate_persona_response(message, persona_detail)
+
+async def _panel_batch_responses(batch: list, message: str, image_data: str, model: str, temperature: float,
+                           full_vision: bool = False, description_text: str = None, image_part: dict = None) -> list:
+    if description_text:
+        message_line = f"Marketing Message: \"{message}\"\n" if message else ""
+        stimulus = f"{message_line}Image (described in detail, treat it as if you are looking at it):\n{description_text}\nReact to it."
+    elif image_data and message:
+        stimulus = f"Marketing Message: \"{message}\"\nThe attached image goes with this message. React to both and how they work together."
+    elif image_data:
+        stimulus = "React to the attached image."
+    else:
+        stimulus = f"Marketing Message: \"{message}\"\nReact to this marketing message."
+    stimulus += (
+        f"\n{PANEL_INSTRUCTIONS}\n"
+        'Respond with a JSON object {"responses": [{"persona": <number>, "response": "<reaction>"}, ...]} '
+        f"with exactly one entry for each of the {len(batch)} personas."
+    )
+    per_persona_tokens = getattr(config['default'], 'DEFAULT_MAX_TOKENS_VISION' if image_part else 'DEFAULT_MAX_TOKENS_TEXT', 300)
+    messages = build_panel_messages(batch, stimulus, image_part)
+    try:
+        raw = await complete_panel(messages, model, temperature, per_persona_tokens * len(batch))
+        results = parse_panel_reply(raw, len(batch), _validate_response)
+    except Exception as e:
+        app_logger.error(f"Panel request for {len(batch)} personas failed: {e}", exc_info=True)
+        results = [None] * len(batch)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        app_logger.warning(f"Panel reply missing {len(missing)}/{len(batch)} personas; falling back to single calls.")
+    fallbacks = await asyncio.gather(*(persona_reaction(batch[i], message, image_data, full_vision) for i in missing))
+    for i, response in zip(missing, fallbacks):
+        results[i] = response
+    return results
+
+def generate_panel_responses(personas_details: list, message: str = None, image_data: str = None,
+                             batch_size: int = None, model: str = None, temperature: float = None,
+                             full_vision: bool = False) -> list:
+    """
+    Gets each persona's free-text reaction to a message and/or image, packing
+    PANEL_BATCH_SIZE personas into each request so the stimulus (and above all
+    the image) is sent once per batch rather than once per persona.
+
+    Unless full_vision is set, an image is replaced by its cached description
+    and the batches run on the text model.
+
+    Returns:
+        list: One response string per persona, in input order.
+    """
+    return run_async(agenerate_panel_responses(personas_details, message, image_data, batch_size, model, temperature, full_vision))
+
+async def agenerate_panel_responses(personas_details: list, message: str = None, image_data: str = None,
+                                    batch_size: int = None, model: str = None, temperature: float = None,
+                                    full_vision: bool = False) -> list:
+    batch_size = batch_size or getattr(config['default'], 'PANEL_BATCH_SIZE', 8)
+    description_text = None
+    if image_data and not full_vision:
+        try:
+            description_text = format_image_description(await adescribe_image(image_data))
+        except Exception as e:
+            app_logger.error(f"Could not describe image for panel prompting, sending it instead: {e}", exc_info=True)
+    use_vision = bool(image_data) and description_text is None
+    # Prepared once, off the event loop, for every batch
+    image_part = await aimage_content_part(image_data) if use_vision else None
+    model = model or (config['default'].DEFAULT_VISION_MODEL if use_vision else config['default'].DEFAULT_TEXT_MODEL)
+    temperature = temperature or config['default'].DEFAULT_TEMPERATURE
+    batches = chunk_panel(personas_details, batch_size)
+    app_logger.info(f"Generating responses for {len(personas_details)} personas in {len(batches)} panel requests.")
+
+    batch_results = await asyncio.gather(*(
+        _panel_batch_responses(batch, message, image_data, model, temperature, full_vision, description_text, image_part)
+        for batch in batches
+    ))
+    return [response for batch in batch_results for response in batch]
@@ -0,0 +1,118 @@
+# src/services/panel_selector.py
+import numpy as np
+from src.config import config
+from src.utils.logger import app_logger
+
+def mmr_select(vectors: np.ndarray, k: int, diversity: float = 0.7) -> list:
+    """
+    Maximal marginal relevance over unit vectors.
+
+    Relevance is similarity to the candidate centroid (how typical a persona is
+    of the audience); redundancy is the highest similarity to anyone already
+    picked. Each step picks argmax of
+        (1 - diversity) * relevance - diversity * redundancy.
+
+    Returns:
+        list: Indices of the selected rows, in selection order.
+    """
+    n = len(vectors)
+    if k >= n:
+        return list(range(n))
+    similarity = vectors @ vectors.T
+    centroid = vectors.mean(axis=0)
+    relevance = vectors @ (centroid / (np.linalg.norm(centroid) or 1.0))
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = (1 - diversity) * relevance - diversity * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        np.maximum(redundancy, similarity[pick], out=redundancy)
+    return selected
+
+def k_center_greedy(vectors: np.ndarray, k: int) -> list:
+    """
+    Greedy k-center: start from the most central point, then repeatedly add
+    the candidate farthest (in cosine distance) from everything selected.
+
+    Returns:
+        list: Indices of the selected rows, in selection order.
+    """
+    n = len(vectors)
+    if k >= n:
+        return list(range(n))
+    distance = 1.0 - vectors @ vectors.T
+    first = int(np.argmin(distance.sum(axis=1)))
+    selected = [first]
+    min_distance = distance[first].copy()
+    while len(selected) < k:
+        min_distance[selected] = -np.inf
+        pick = int(np.argmax(min_distance))
+        selected.append(pick)
+        np.minimum(min_distance, distance[pick], out=min_distance)
+    return selected
+
+def mean_pairwise_similarity(vectors: np.ndarray) -> float:
+    """Average cosine similarity between distinct rows (lower means a more varied panel)."""
+    n = len(vectors)
+    if n < 2:
+        return 0.0
+    similarity = vectors @ vectors.T
+    return float((similarity.sum() - np.trace(similarity)) / (n * (n - 1)))
+
+class PanelSelector:
+    """
+    Picks a maximally diverse panel from an oversampled pool of candidate personas.
+    """
+    STRATEGIES = {'mmr', 'k_center'}
+
+    def __init__(self, embedding_service, strategy: str = None, oversample_factor: int = None, diversity: float = None):
+        """
+        Initializes the PanelSelector.
+
+        Args:
+            embedding_service: Service used to embed persona descriptions.
+            strategy (str, optional): 'mmr' or 'k_center'.
+            oversample_factor (int, optional): Candidates drawn per panel slot.
+            diversity (float, optional): MMR trade-off between typicality (0) and diversity (1).
+        """
+        self.embedding_service = embedding_service
+        self.strategy = strategy or getattr(config['default'], 'PANEL_DIVERSITY_STRATEGY', 'mmr')
+        self.oversample_factor = oversample_factor or getattr(config['default'], 'PANEL_OVERSAMPLE_FACTOR', 3)
+        self.diversity = diversity if diversity is not None else getattr(config['default'], 'PANEL_MMR_DIVERSITY', 0.7)
+        if self.strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown panel selection strategy: {self.strategy}")
+
+    def select(self, descriptions: list, k: int) -> tuple:
+        """
+        Selects k of the candidate descriptions.
+
+        Returns:
+            tuple: (selected indices, stats dict comparing the panel with the
+                first k candidates, i.e. what independent sampling would give).
+        """
+        if k >= len(descriptions):
+            return list(range(len(descriptions))), {}
+        # Candidates are generated per request and mostly discarded, so they are not cached
+        vectors = np.asarray(self.embedding_service.embed_texts(descriptions, cache=False), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        if self.strategy == 'k_center':
+            selected = k_center_greedy(vectors, k)
+        else:
+            selected = mmr_select(vectors, k, self.diversity)
+
+        stats = {
+            'strategy': self.strategy,
+            'candidates': len(descriptions),
+            'panel_mean_similarity': round(mean_pairwise_similarity(vectors[selected]), 4),
+            'baseline_mean_similarity': round(mean_pairwise_similarity(vectors[:k]), 4)
+        }
+        app_logger.info(f"Selected diverse panel of {k} from {len(descriptions)} candidates: {stats}")
+        return selected, stats
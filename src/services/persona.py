@@ -1,7 +1,7 @@
 # src/services/persona.py
-import openai
 from src.config import config
-from src.utils.logger import app_logger # Import logger
+from src.services.llm_client import achat_completion, run_async
+from src.utils.logger import SAMPLED, app_logger # Import logger
 
 
 class Persona:
@@ -16,17 +16,13 @@ class Persona:
         self.model = model
         self.temperature = temperature
 
-# Ensure OpenAI API key is configured (idempotent check)
-# This relies on openai_service.py or app.py having configured it.
-if not openai.api_key and config['default'].OPENAI_API_KEY:
-    openai.api_key = config['default'].OPENAI_API_KEY
-    app_logger.info("OpenAI API Key re-checked/set in persona service.")
+def generate_persona_response(message, persona_details, model=None, temperature=None):
+    return run_async(agenerate_persona_response(message, persona_details, model, temperature))
 
-
-def generate_persona_response(self,message, persona_details, model=None, temperature=None):
+async def agenerate_persona_response(message, persona_details, model=None, temperature=None):
     model = model or config['default'].DEFAULT_TEXT_MODEL
     temperature = temperature or config['default'].DEFAULT_TEMPERATURE
-    app_logger.debug(f"Generating persona response for: {persona_details[:50]} with model: {model}")
+    app_logger.debug("Generating persona response for: %.50s with model: %s", persona_details, model)
 
     prompt = (
         f"Persona Profile: {persona_details}\n"
@@ -39,7 +35,7 @@ def generate_persona_response(self,message, persona_details, model=None, tempera
         "Give recommendations on how you would improve the message as if you are talking to your friend."
     )
     try:
-        response = openai.chat.completions.create(
+        response = await achat_completion(
             model=model,
             messages=[
                 {"role": "system", "content": "You are a consumer simulator."},
@@ -49,10 +45,10 @@ def generate_persona_response(self,message, persona_details, model=None, tempera
             max_tokens=config['default'].DEFAULT_MAX_TOKENS_TEXT if hasattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT') else 300 # Add max_tokens
         )
         response_content = response.choices[0].message.content
-        app_logger.info(f"Persona response generated successfully for: {persona_details[:50]}")
+        app_logger.info("Persona response generated successfully for: %.50s", persona_details, extra=SAMPLED)
         return response_content
     except Exception as e:
-        app_logger.error(f"OpenAI API Error in generate_persona_response for {persona_details[:50]}: {str(e)}", exc_info=True)
+        app_logger.error("OpenAI API Error in generate_persona_response for %.50s: %s", persona_details, e, exc_info=True)
         if "model_not_found" in str(e):
             return "Error: The text analysis model is not available. Please try again later or contact support."
         # Consider returning a more structured error or raising an exception
@@ -41,8 +41,7 @@ class PersonaService:
         description = self._generate_persona_description(demographics)
 
         # 3. Generate an embedding for the description
-        # This will be an actual call to an embedding model like OpenAI's
-        embedding_vector = [0.1, 0.2, 0.3] # Placeholder
+        embedding_vector = self.embedding_service.embed_texts([description])[0]
 
         # 4. Store the persona in the SQL database
         cursor = self.db.cursor()
@@ -58,6 +57,55 @@ class PersonaService:
         
         return {"id": persona_id, "description": description, "demographics": demographics}
 
+    def create_personas_from_records(self, audience_id: int, records: list, source: str = 'client', db=None, before_commit=None) -> list:
+        """
+        Stores a batch of personas built from client-supplied demographic records.
+
+        All rows are written in a single transaction, so a batch is either fully
+        stored or not stored at all. Descriptions are embedded before that
+        transaction opens, leaving the database free for the embedding cache to
+        write to, and vectors are only added to the vector store once it has
+        committed, so a rolled-back batch leaves no orphan ids behind.
+
+        Args:
+            audience_id (int): The audience the personas belong to.
+            records (list): Demographic dicts already mapped to the persona schema.
+            source (str): The source of the persona data.
+            db: Optional connection to write with (defaults to the service connection).
+            before_commit (callable, optional): Called as before_commit(conn) once the
+                rows are written, so extra writes (e.g. a checkpoint) land in the same
+                transaction.
+
+        Returns:
+            list: The IDs of the created personas, in record order.
+        """
+        conn = db or self.db
+        descriptions = [self._generate_persona_description(demographics) for demographics in records]
+        embedding_vectors = self.embedding_service.embed_texts(descriptions)
+
+        cursor = conn.cursor()
+        persona_ids = []
+        try:
+            for demographics, description in zip(records, descriptions):
+                cursor.execute(
+                    "INSERT INTO personas (audience_id, demographics, embedding_id, description, source) VALUES (?, ?, ?, ?, ?)",
+                    (audience_id, json.dumps(demographics), None, description, source)
+                )
+                persona_ids.append(cursor.lastrowid)
+            if before_commit:
+                before_commit(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        self.embedding_service.add_persona_embeddings(
+            [str(persona_id) for persona_id in persona_ids],
+            embedding_vectors,
+            metadatas=records
+        )
+        return persona_ids
+
     def generate_ephemeral_persona(self, region: str) -> dict:
         """
         Generates a persona's data without storing it in the database.
@@ -0,0 +1,243 @@
+# src/services/simulation_estimator.py
+"""
+Pre-flight cost and latency estimates for focus group simulations.
+
+Lays out the calls a /api/focus_group/simulate request will make, stage by
+stage, in the order FocusGroupSimulator makes them. Each call's prompt
+tokens include the conversation history that moderator and discussion
+prompts carry. Wall-clock time comes from the live latency of recent calls
+per model and call site, or ESTIMATE_DEFAULT_LATENCY_SECONDS before any
+have been seen. A stage whose calls run concurrently takes about one slow
+call per wave, a sequential stage one typical call per turn. Each stage is
+priced at the model its MODEL_ROUTES entry picks; cascades at their draft
+model, since escalations are the exception.
+"""
+import math
+from src.config import config
+from src.services.model_router import resolve_model
+from src.services.summary import count_tokens
+from src.utils.latency import llm_latency
+from src.utils.metrics import LLM_REQUEST_SECONDS, LLM_TOKENS
+
+# Prompt text around the persona profile and stimulus, measured on the simulator's templates
+INITIAL_TEMPLATE_TOKENS = 150
+TURN_TEMPLATE_TOKENS = 130
+HISTORY_LINE_TOKENS = 12  # "In round 2, Persona 3 ('Ann') said: "
+DEFAULT_PERSONA_TOKENS = 60  # Profiles sampled from an audience are not known up front
+IMAGE_TOKENS = 765  # A high-detail image sent to every persona with full_vision
+IMAGE_DESCRIPTION_TOKENS = 250  # The formatted description sent instead
+THEMES_PROMPT_TOKENS = 810  # Instructions plus the first 3000 characters of the transcript
+THEMES_MAX_TOKENS = 200
+
+# Latency samples needed before observed percentiles replace the defaults
+MIN_LATENCY_SAMPLES = 5
+
+def _latency(model: str, call_site: str) -> tuple:
+    """(p50, p95, source) seconds for one call."""
+    key = (model, call_site)
+    if llm_latency.count(key) >= MIN_LATENCY_SAMPLES:
+        return llm_latency.percentile(key, 50), llm_latency.percentile(key, 95), 'observed'
+    p50, p95 = getattr(config['default'], 'ESTIMATE_DEFAULT_LATENCY_SECONDS', (3.0, 8.0))
+    return p50, p95, 'default'
+
+def _completion_tokens(model: str, call_site: str, max_tokens: int) -> float:
+    """Mean completion tokens of recent calls, or max_tokens before any were seen."""
+    calls = LLM_REQUEST_SECONDS.count(model=model, call_site=call_site, outcome='ok')
+    if not calls:
+        return max_tokens
+    return LLM_TOKENS.value(model=model, call_site=call_site, kind='completion') / calls
+
+def _cost(model: str, prompt_tokens: float, completion_tokens: float):
+    prices = getattr(config['default'], 'MODEL_PRICES_PER_MILLION', {}).get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+def _stage(name: str, model: str, call_site: str, prompts: list, max_tokens: int, concurrency: int) -> dict:
+    completion_tokens = _completion_tokens(model, call_site, max_tokens) * len(prompts)
+    p50, p95, source = _latency(model, call_site)
+    waves = math.ceil(len(prompts) / concurrency) if prompts else 0
+    cost = _cost(model, sum(prompts), completion_tokens)
+    return {
+        'stage': name,
+        'model': model,
+        'call_site': call_site,
+        'calls': len(prompts),
+        'concurrency': concurrency,
+        'prompt_tokens': round(sum(prompts)),
+        'completion_tokens': round(completion_tokens),
+        'cost_usd': round(cost, 6) if cost is not None else None,
+        # A concurrent wave lasts as long as its slowest call
+        'expected_seconds': round(waves * (p95 if concurrency > 1 else p50), 2),
+        'p95_seconds': round(waves * p95, 2),
+        'latency_source': source
+    }
+
+def estimate_focus_group(data: dict) -> dict:
+    """
+    Estimates the calls, tokens, cost and time of a focus group simulation.
+
+    Args:
+        data (dict): A /api/focus_group/simulate request body.
+
+    Returns:
+        dict: Totals plus a 'stages' list with the same fields per stage.
+    """
+    personas = data.get('personas') or []
+    persona_count = max(1, len(personas) or int(data.get('group_size') or 8))
+    persona_tokens = sum(count_tokens(p) for p in personas) / len(personas) if personas else DEFAULT_PERSONA_TOKENS
+    message_tokens = count_tokens(data.get('message') or '')
+    questions = list(data.get('questions') or []) + [mq.get('question') or '' for mq in data.get('moderator_questions') or []]
+    rounds = int(data.get('num_discussion_rounds', 1))
+    has_image = bool(data.get('image_data'))
+    full_vision = bool(data.get('full_vision', False))
+    snapshot_rounds = bool(data.get('snapshot_rounds', False))
+    initial_model = resolve_model('focus_group.initial_reaction', data.get('model'))
+    moderator_model = resolve_model('focus_group.moderator_response', data.get('model'))
+    discussion_model = resolve_model('focus_group.discussion', data.get('model'))
+    initial_max_tokens = getattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT', 300)
+    turn_max_tokens = getattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT', 400)
+
+    stages = []
+    stimulus_tokens = 0
+    if has_image and full_vision:
+        stimulus_tokens = IMAGE_TOKENS
+    elif has_image:
+        vision_max_tokens = getattr(config['default'], 'DEFAULT_MAX_TOKENS_VISION', 500) * 2
+        stages.append(_stage('image_description', config['default'].DEFAULT_VISION_MODEL, '_request_image_description',
+                             [IMAGE_TOKENS + TURN_TEMPLATE_TOKENS], vision_max_tokens, 1))
+        stimulus_tokens = IMAGE_DESCRIPTION_TOKENS
+
+    base_tokens = persona_tokens + message_tokens
+    stages.append(_stage('initial_reactions', initial_model, 'focus_group.initial_reaction',
+                         [INITIAL_TEMPLATE_TOKENS + base_tokens + stimulus_tokens] * persona_count, initial_max_tokens, persona_count))
+
+    # Moderator prompts carry the last ten moderator and persona turns of the transcript
+    answer_tokens = _completion_tokens(moderator_model, 'focus_group.moderator_response', turn_max_tokens) + HISTORY_LINE_TOKENS
+    history = [HISTORY_LINE_TOKENS * 2] + [_completion_tokens(initial_model, 'focus_group.initial_reaction', initial_max_tokens) + HISTORY_LINE_TOKENS] * persona_count
+    moderator_prompts = []
+    for question in questions:
+        question_tokens = count_tokens(question)
+        history.append(question_tokens + HISTORY_LINE_TOKENS)
+        for _ in range(persona_count):
+            moderator_prompts.append(TURN_TEMPLATE_TOKENS + persona_tokens + question_tokens + sum(history[-10:]))
+            history.append(answer_tokens)
+    stages.append(_stage('moderator_questions', moderator_model, 'focus_group.moderator_response', moderator_prompts, turn_max_tokens, 1))
+
+    # Discussion prompts carry every earlier discussion turn; a snapshot round only those before it
+    turn_tokens = _completion_tokens(discussion_model, 'focus_group.discussion', turn_max_tokens) + HISTORY_LINE_TOKENS
+    discussion_prompts = []
+    for round_index in range(rounds):
+        for persona_index in range(persona_count):
+            earlier_turns = round_index * persona_count + (0 if snapshot_rounds else persona_index)
+            discussion_prompts.append(TURN_TEMPLATE_TOKENS + base_tokens + earlier_turns * turn_tokens)
+    stages.append(_stage('discussion_rounds', discussion_model, 'focus_group.discussion', discussion_prompts, turn_max_tokens,
+                         persona_count if snapshot_rounds else 1))
+
+    stages.append(_stage('themes', resolve_model('focus_group.themes'), 'focus_group.themes', [THEMES_PROMPT_TOKENS], THEMES_MAX_TOKENS, 1))
+
+    stages = [stage for stage in stages if stage['calls']]
+    prompt_tokens = sum(stage['prompt_tokens'] for stage in stages)
+    completion_tokens = sum(stage['completion_tokens'] for stage in stages)
+    return {
+        'personas': persona_count,
+        'calls': sum(stage['calls'] for stage in stages),
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'cost_usd': round(sum(stage['cost_usd'] or 0 for stage in stages), 6),
+        'expected_seconds': round(sum(stage['expected_seconds'] for stage in stages), 2),
+        'p95_seconds': round(sum(stage['p95_seconds'] for stage in stages), 2),
+        'stages': stages
+    }
+
+def live_simulation_request(simulator, num_discussion_rounds: int = 1) -> dict:
+    """The /api/focus_group/simulate body equivalent to calling run_simulation on a live simulator."""
+    return {
+        'personas': simulator.personas_details,
+        'message': simulator.stimulus_message,
+        'image_data': simulator.stimulus_image_data,
+        'full_vision': simulator.full_vision,
+        'snapshot_rounds': simulator.snapshot_rounds,
+        'model': simulator.model,
+        'moderator_questions': [{'question': q['question']} for q in simulator.moderator_questions],
+        'num_discussion_rounds': num_discussion_rounds
+    }
+
+def estimate_injected_question(simulator, question: str) -> dict:
+    """Estimates inject_question on a live simulator: one moderator-response call per persona, in turn."""
+    model = resolve_model('focus_group.moderator_response', simulator.model)
+    max_tokens = getattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT', 400)
+    question_tokens = count_tokens(question)
+    # The prompt carries the last ten moderator and persona turns, which these answers do not join
+    history_tokens = sum(count_tokens(t.get('content') or '') + HISTORY_LINE_TOKENS
+                         for t in simulator.transcript[-10:] if t.get('role') in ('moderator', 'persona'))
+    prompts = [TURN_TEMPLATE_TOKENS + count_tokens(p) + question_tokens + history_tokens for p in simulator.personas_details]
+    stage = _stage('moderator_questions', model, 'focus_group.moderator_response', prompts, max_tokens, 1)
+    return dict(stage, total_tokens=stage['prompt_tokens'] + stage['completion_tokens'])
+
+def estimate_analytics(simulator) -> dict:
+    """Estimates _generate_analytics on a live simulator: one themes call, or none before any persona has answered."""
+    has_responses = any(t.get('role') == 'persona' for t in simulator.transcript)
+    prompts = [THEMES_PROMPT_TOKENS] if has_responses else []
+    stage = _stage('themes', resolve_model('focus_group.themes'), 'focus_group.themes', prompts, THEMES_MAX_TOKENS, 1)
+    return dict(stage, total_tokens=stage['prompt_tokens'] + stage['completion_tokens'])
+
+def _persona_change(data: dict, count: int) -> dict:
+    """The change that keeps the first `count` personas (or samples that many from the audience)."""
+    personas = data.get('personas') or []
+    return {'personas': personas[:count]} if personas else {'group_size': count}
+
+def suggest_configurations(data: dict, target_seconds: float = None, limit: int = 5) -> list:
+    """
+    Cheaper or faster variations of a simulation config: snapshot rounds,
+    the ESTIMATE_FAST_MODELS, fewer rounds and fewer personas. With a target
+    only those expected to finish within it are returned, fewest tokens
+    first; fewer rounds and personas are cut only as far as the target needs.
+
+    Returns:
+        list: Dicts of the 'changes' to make and the resulting estimate totals.
+    """
+    current = estimate_focus_group(data)
+    model = resolve_model('focus_group.discussion', data.get('model'))
+    rounds = int(data.get('num_discussion_rounds', 1))
+    persona_count = current['personas']
+
+    def meets(changes: dict) -> bool:
+        return target_seconds is None or estimate_focus_group(dict(data, **changes))['expected_seconds'] <= target_seconds
+
+    candidates = []
+    if rounds and not data.get('snapshot_rounds'):
+        candidates.append({'snapshot_rounds': True})
+    for fast_model in getattr(config['default'], 'ESTIMATE_FAST_MODELS', []):
+        if fast_model != model:
+            candidates.append({'model': fast_model})
+            if rounds and not data.get('snapshot_rounds'):
+                candidates.append({'model': fast_model, 'snapshot_rounds': True})
+    fewer_rounds = next((r for r in range(rounds - 1, -1, -1) if meets({'num_discussion_rounds': r})), None)
+    if fewer_rounds is not None:
+        candidates.append({'num_discussion_rounds': fewer_rounds})
+    fewer_personas = next((n for n in range(persona_count - 1, 1, -1) if meets(_persona_change(data, n))), None)
+    if fewer_personas is not None:
+        candidates.append(_persona_change(data, fewer_personas))
+
+    suggestions = []
+    for changes in candidates:
+        estimate = estimate_focus_group(dict(data, **changes))
+        if target_seconds is not None and estimate['expected_seconds'] > target_seconds:
+            continue
+        if target_seconds is None and estimate['expected_seconds'] >= current['expected_seconds'] and estimate['total_tokens'] >= current['total_tokens']:
+            continue
+        shown = dict(changes)
+        if 'personas' in shown:
+            shown = dict(shown, personas=len(shown['personas']))
+        suggestions.append({
+            'changes': shown,
+            'calls': estimate['calls'],
+            'total_tokens': estimate['total_tokens'],
+            'cost_usd': estimate['cost_usd'],
+            'expected_seconds': estimate['expected_seconds'],
+            'p95_seconds': estimate['p95_seconds']
+        })
+    suggestions.sort(key=lambda s: (s['cost_usd'], s['total_tokens'], s['expected_seconds']))
+    return suggestions[:limit]
@@ -1,7 +1,13 @@
 # src/services/summary.py
-import openai
+import hashlib
+import json
+import uuid
 from src.config import config
+from src.database import get_db_connection
+from src.services.llm_client import achat_completion, gather_limited, run_async, run_in_executor
+from src.services.model_router import resolve_model
 from src.utils.logger import app_logger
+from src.utils.metrics import CACHE_LOOKUPS
 
 class Summary:
     def __init__(self, summary_text, summary_type, summary_source):
@@ -10,42 +16,279 @@ class Summary:
         self.summary_source = summary_source
         self.responses_data = responses_data
 
-if not getattr(openai, 'api_key', None) and config['default'].OPENAI_API_KEY:
-    openai.api_key = config['default'].OPENAI_API_KEY
-    app_logger.info("OpenAI API Key re-checked/set in summary service.")
+SUMMARY_SYSTEM_PROMPT = "You are an expert at analyzing and summarizing consumer feedback."
 
-def generate_summary_from_responses(self, responses_data): # Renamed 'responses' to 'responses_data'
-    model = config['default'].DEFAULT_TEXT_MODEL # Summary usually uses a text model
+SUMMARY_SECTIONS = (
+    "1. Key themes and patterns across responses\n"
+    "2. Common positive and negative feedback\n"
+    "3. Specific recommendations for improvement\n"
+    "4. Notable demographic-specific insights\n\n"
+)
+
+MAP_PROMPT = (
+    "The following is part {part} of {parts} of a larger set of persona responses. "
+    "Write a dense partial summary of just this part covering:\n" + SUMMARY_SECTIONS +
+    "Say roughly how many personas hold each view, keep one or two short verbatim quotes, "
+    "and do not add an introduction or conclusion.\n\n"
+    "Responses:\n"
+)
+
+COMBINE_PROMPT = (
+    "The following are partial summaries of disjoint groups of persona responses. "
+    "Merge them into one dense partial summary covering:\n" + SUMMARY_SECTIONS +
+    "Add up how many personas hold each view across groups and keep the most telling quotes.\n\n"
+    "Partial summaries:\n"
+)
+
+REDUCE_PROMPT = (
+    "The following are partial summaries of disjoint groups of persona responses, together covering "
+    "{count} responses. Combine them into one comprehensive summary that includes:\n" + SUMMARY_SECTIONS +
+    "Weigh each point by how many personas raised it.\n\n"
+    "Partial summaries:\n"
+)
+
+UPDATE_PROMPT = (
+    "Below is the current summary of {covered} persona responses, followed by {new} new responses. "
+    "Update the summary so it covers all {total} responses. Keep the same structure:\n" + SUMMARY_SECTIONS +
+    "Revise counts and emphasis where the new responses change the picture, add new themes they raise, "
+    "and keep everything from the current summary that still holds.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New responses:\n"
+)
+
+def count_tokens(text: str, model: str = None) -> int:
+    """
+    Counts tokens with tiktoken when it is installed, otherwise estimates at
+    four characters per token, which is close for English text.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return len(text) // 4 + 1
+    try:
+        encoding = tiktoken.encoding_for_model(model or config['default'].DEFAULT_TEXT_MODEL)
+    except KeyError:
+        encoding = tiktoken.get_encoding('cl100k_base')
+    return len(encoding.encode(text))
+
+def total_tokens(texts: list, model: str = None) -> int:
+    return sum(count_tokens(text, model) for text in texts)
+
+def format_response(resp_item: dict) -> str:
+    return f"\nPersona: {resp_item.get('persona', 'Unknown Persona')}\nResponse: {resp_item.get('response', 'No response text')}\n"
+
+def chunk_by_tokens(texts: list, budget: int, model: str = None) -> list:
+    """
+    Greedily packs texts into consecutive chunks of at most budget tokens.
+    A single text over budget is truncated to fit its own chunk.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text, model)
+        if tokens > budget:
+            text = text[:int(len(text) * budget / tokens)]
+            tokens = budget
+        if current and current_tokens + tokens > budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def _complete_summary(prompt: str, model: str, temperature: float, max_tokens: int) -> str:
+    response = await achat_completion(
+        call_site='summary',
+        model=model,
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
+    return response.choices[0].message.content
+
+async def _map_reduce_summary(entries: list, model: str, temperature: float, max_tokens: int, budget: int) -> str:
+    """
+    Summarises chunks of entries in parallel, then merges the partial
+    summaries in groups of SUMMARY_REDUCE_FAN_IN until one is left, so
+    latency grows with the log of the number of responses.
+    """
+    fan_in = max(2, getattr(config['default'], 'SUMMARY_REDUCE_FAN_IN', 8))
+    max_workers = getattr(config['default'], 'SUMMARY_MAX_WORKERS', 8)
+    # Tokenising thousands of responses is CPU-bound; keep it off the event loop
+    chunks = await run_in_executor(chunk_by_tokens, entries, budget, model)
+    app_logger.info(f"Map-reduce summary of {len(entries)} responses in {len(chunks)} chunks.")
+
+    prompts = [MAP_PROMPT.format(part=i + 1, parts=len(chunks)) + ''.join(chunk) for i, chunk in enumerate(chunks)]
+    partials = await gather_limited([_complete_summary(prompt, model, temperature, max_tokens) for prompt in prompts], max_workers)
+
+    while len(partials) > fan_in:
+        groups = [partials[i:i + fan_in] for i in range(0, len(partials), fan_in)]
+        prompts = [COMBINE_PROMPT + _join_partials(group) for group in groups]
+        partials = await gather_limited([_complete_summary(prompt, model, temperature, max_tokens) for prompt in prompts], max_workers)
+
+    return await _complete_summary(
+        REDUCE_PROMPT.format(count=len(entries)) + _join_partials(partials), model, temperature, max_tokens
+    )
+
+def _join_partials(partials: list) -> str:
+    return ''.join(f"\n--- Group {i + 1} ---\n{partial}\n" for i, partial in enumerate(partials))
+
+async def _summarize_entries(entries: list) -> str:
+    """Summarises formatted responses in one call if they fit the budget, map-reduce style otherwise."""
+    model = resolve_model('summary')
     temperature = config['default'].DEFAULT_TEMPERATURE
     max_tokens = config['default'].DEFAULT_MAX_TOKENS_TEXT if hasattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT') else 1000 # Potentially longer for summaries
-    app_logger.debug(f"Generating summary for {len(responses_data)} responses with model: {model}")
+    budget = getattr(config['default'], 'SUMMARY_CHUNK_TOKEN_BUDGET', 6000)
+    app_logger.debug(f"Generating summary for {len(entries)} responses with model: {model}")
 
     prompt = (
-        "Based on the following persona responses, provide a comprehensive summary that includes:\n"
-        "1. Key themes and patterns across responses\n"
-        "2. Common positive and negative feedback\n"
-        "3. Specific recommendations for improvement\n"
-        "4. Notable demographic-specific insights\n\n"
+        "Based on the following persona responses, provide a comprehensive summary that includes:\n" + SUMMARY_SECTIONS +
         "Responses:\n"
     )
-    for resp_item in responses_data:
-        prompt += f"\nPersona: {resp_item.get('persona', 'Unknown Persona')}\nResponse: {resp_item.get('response', 'No response text')}\n"
-    
+    if await run_in_executor(total_tokens, entries, model) <= budget:
+        return await _complete_summary(prompt + ''.join(entries), model, temperature, max_tokens)
+    return await _map_reduce_summary(entries, model, temperature, max_tokens, budget)
+
+async def _update_summary(prior_summary: str, covered: int, new_entries: list) -> str:
+    """Folds new responses into an existing summary without revisiting the old ones."""
+    model = resolve_model('summary')
+    temperature = config['default'].DEFAULT_TEMPERATURE
+    max_tokens = config['default'].DEFAULT_MAX_TOKENS_TEXT if hasattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT') else 1000
+    budget = getattr(config['default'], 'SUMMARY_CHUNK_TOKEN_BUDGET', 6000)
+
+    if await run_in_executor(total_tokens, new_entries, model) > budget:
+        # Too many new responses for one prompt: condense them first
+        new_text = "\n(Summary of the new responses)\n" + await _map_reduce_summary(new_entries, model, temperature, max_tokens, budget)
+    else:
+        new_text = ''.join(new_entries)
+    prompt = UPDATE_PROMPT.format(
+        covered=covered, new=len(new_entries), total=covered + len(new_entries), summary=prior_summary
+    ) + new_text
+    return await _complete_summary(prompt, model, temperature, max_tokens)
+
+def generate_summary_from_responses(responses_data): # Renamed 'responses' to 'responses_data'
+    """
+    Summarises persona responses. Inputs that fit SUMMARY_CHUNK_TOKEN_BUDGET
+    go to the model in one call; larger ones are summarised map-reduce style.
+    """
     try:
-        response = openai.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert at analyzing and summarizing consumer feedback."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
-        summary_content = response.choices[0].message.content
+        summary_content = run_async(_summarize_entries([format_response(resp_item) for resp_item in responses_data]))
         app_logger.info(f"Summary generated successfully for {len(responses_data)} responses.")
         return summary_content
     except Exception as e:
         app_logger.error(f"OpenAI API Error in generate_summary_from_responses: {str(e)}", exc_info=True)
         if "model_not_found" in str(e):
             return "Error: The summary generation model is not available."
-        return f"Error generating summary: {str(e)}" 
\ No newline at end of file
+        return f"Error generating summary: {str(e)}"
+
+def response_hash(resp_item: dict) -> str:
+    return hashlib.sha256(format_response(resp_item).encode('utf-8')).hexdigest()
+
+def fingerprint(hashes: list) -> str:
+    """Identifies an ordered list of responses."""
+    return hashlib.sha256('\n'.join(hashes).encode('utf-8')).hexdigest()
+
+class SummarySessionService:
+    """
+    Keeps the last summary of a response list together with per-response
+    hashes, so follow-up summaries only pay for what changed.
+    """
+    def summarize(self, responses_data: list, session_id: str = None) -> dict:
+        """
+        Summarises responses within a session.
+
+        - Responses identical to an earlier summary (in this session or any
+          other) are served from the stored summary.
+        - Responses that extend the session's list are folded into the prior
+          summary with one incremental update.
+        - Anything else (edits, removals, reordering) is summarised afresh.
+
+        Args:
+            responses_data (list): The full, current list of responses.
+            session_id (str, optional): Session to continue; a new one is created if omitted or unknown.
+
+        Returns:
+            dict: {'summary', 'session_id', 'mode': 'cached' | 'incremental' | 'full',
+                'responses_covered', 'new_responses'}
+        """
+        hashes = [response_hash(resp_item) for resp_item in responses_data]
+        current_fingerprint = fingerprint(hashes)
+        session = self._load_session(session_id) if session_id else None
+
+        if session and session['fingerprint'] == current_fingerprint:
+            CACHE_LOOKUPS.inc(cache='summary', result='hit')
+            app_logger.info(f"Summary session {session_id}: responses unchanged, served from cache.")
+            return self._result(session['summary'], session_id, 'cached', len(hashes), 0)
+
+        session_id = session_id or str(uuid.uuid4())
+        cached = self._find_by_fingerprint(current_fingerprint)
+        if cached:
+            CACHE_LOOKUPS.inc(cache='summary', result='hit')
+            self._save_session(session_id, cached['summary'], hashes, current_fingerprint)
+            app_logger.info(f"Summary session {session_id}: identical responses already summarised, served from cache.")
+            return self._result(cached['summary'], session_id, 'cached', len(hashes), 0)
+
+        CACHE_LOOKUPS.inc(cache='summary', result='miss')
+        prior_hashes = session['response_hashes'] if session else []
+        if prior_hashes and hashes[:len(prior_hashes)] == prior_hashes:
+            new_items = responses_data[len(prior_hashes):]
+            summary_text = run_async(_update_summary(session['summary'], len(prior_hashes), [format_response(r) for r in new_items]))
+            mode = 'incremental'
+        else:
+            new_items = responses_data
+            summary_text = run_async(_summarize_entries([format_response(r) for r in responses_data]))
+            mode = 'full'
+
+        self._save_session(session_id, summary_text, hashes, current_fingerprint)
+        app_logger.info(f"Summary session {session_id}: {mode} summary, {len(new_items)} of {len(hashes)} responses sent.")
+        return self._result(summary_text, session_id, mode, len(hashes), len(new_items))
+
+    @staticmethod
+    def _result(summary_text, session_id, mode, covered, new):
+        return {'summary': summary_text, 'session_id': session_id, 'mode': mode, 'responses_covered': covered, 'new_responses': new}
+
+    def _load_session(self, session_id: str):
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT summary, response_hashes, fingerprint FROM summary_sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return {'summary': row['summary'], 'response_hashes': json.loads(row['response_hashes']), 'fingerprint': row['fingerprint']}
+
+    def _find_by_fingerprint(self, current_fingerprint: str):
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT summary FROM summary_sessions WHERE fingerprint = ? ORDER BY updated_at DESC LIMIT 1",
+                (current_fingerprint,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return {'summary': row['summary']} if row else None
+
+    def _save_session(self, session_id: str, summary_text: str, hashes: list, current_fingerprint: str):
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                """
+                INSERT INTO summary_sessions (id, summary, response_hashes, fingerprint)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    summary = excluded.summary,
+                    response_hashes = excluded.response_hashes,
+                    fingerprint = excluded.fingerprint,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                (session_id, summary_text, json.dumps(hashes), current_fingerprint)
+            )
+            conn.commit()
+        finally:
+            conn.close()
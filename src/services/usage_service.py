@@ -0,0 +1,300 @@
+# src/services/usage_service.py
+"""
+Token usage accounting and admission control.
+
+Every completion's usage is recorded in the UsageLedger against the owner
+and endpoint of the request that made it. The attribution travels in a
+context variable, so calls made on the LLM event loop and its executor are
+attributed too. Records are buffered in memory and written to SQLite in
+batches by a background thread, both as raw rows (llm_usage) and as daily
+rollups per owner, endpoint and model (llm_usage_daily).
+
+The AdmissionController estimates a request's tokens before it runs. It
+rejects the request when the owner's daily budget would be exceeded, and
+holds it while the estimated tokens of requests already running across the
+process would exceed the global capacity.
+"""
+import atexit
+import contextvars
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from src.config import config
+from src.database import get_db_connection
+from src.utils.logger import app_logger
+from src.utils.metrics import ADMITTED_TOKENS
+
+ANONYMOUS_OWNER = 'anonymous'
+
+# Rough prompt size of one persona call (profile, instructions and stimulus) for estimates
+PROMPT_TOKENS_PER_CALL = 350
+
+_usage_context = contextvars.ContextVar('usage_context', default=None)
+
+def set_usage_context(owner_id: str, endpoint: str):
+    """Attributes LLM usage in the current context to owner_id and endpoint; returns a token for reset_usage_context."""
+    return _usage_context.set((owner_id or ANONYMOUS_OWNER, endpoint))
+
+def reset_usage_context(token):
+    _usage_context.reset(token)
+
+def current_usage_context() -> tuple:
+    """(owner_id, endpoint) that LLM usage is attributed to; calls outside a request count as 'background'."""
+    return _usage_context.get() or (ANONYMOUS_OWNER, 'background')
+
+def _utc_day(moment: datetime = None) -> str:
+    return (moment or datetime.now(timezone.utc)).strftime('%Y-%m-%d')
+
+class UsageLedger:
+    def __init__(self, flush_interval: float = None):
+        """
+        Args:
+            flush_interval (float, optional): Seconds between batched writes. Defaults to USAGE_FLUSH_INTERVAL.
+        """
+        self.flush_interval = flush_interval or getattr(config['default'], 'USAGE_FLUSH_INTERVAL', 2.0)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, model: str, call_site: str, prompt_tokens: int, completion_tokens: int):
+        """Queues one completion's usage for the next flush; cheap enough for the event loop."""
+        owner_id, endpoint = current_usage_context()
+        with self._lock:
+            self._pending.append((_utc_day(), owner_id, endpoint, call_site, model, prompt_tokens, completion_tokens))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='usage-ledger', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> int:
+        """Writes pending records and their rollups in one transaction; returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            rollups = {}
+            for day, owner_id, endpoint, _, model, prompt_tokens, completion_tokens in batch:
+                calls, prompt_total, completion_total = rollups.get((day, owner_id, endpoint, model), (0, 0, 0))
+                rollups[(day, owner_id, endpoint, model)] = (calls + 1, prompt_total + prompt_tokens, completion_total + completion_tokens)
+
+            conn = get_db_connection()
+            try:
+                conn.executemany(
+                    "INSERT INTO llm_usage (day, owner_id, endpoint, call_site, model, prompt_tokens, completion_tokens) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    batch
+                )
+                conn.executemany(
+                    """
+                    INSERT INTO llm_usage_daily (day, owner_id, endpoint, model, calls, prompt_tokens, completion_tokens)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (day, owner_id, endpoint, model) DO UPDATE SET
+                        calls = calls + excluded.calls,
+                        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                        completion_tokens = completion_tokens + excluded.completion_tokens
+                    """,
+                    [key + totals for key, totals in rollups.items()]
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                app_logger.error("Failed to write %d usage records: %s", len(batch), e, exc_info=True)
+                return 0
+            finally:
+                conn.close()
+        return len(batch)
+
+    def owner_tokens(self, owner_id: str, day: str = None) -> int:
+        """Tokens an owner has used on a UTC day (today by default), including records not yet flushed."""
+        day = day or _utc_day()
+        # Holding the flush lock keeps a batch being written from being counted in neither place
+        with self._flush_lock:
+            with self._lock:
+                pending = sum(p + c for d, o, _, _, _, p, c in self._pending if d == day and o == owner_id)
+            conn = get_db_connection()
+            try:
+                row = conn.execute(
+                    "SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) FROM llm_usage_daily WHERE day = ? AND owner_id = ?",
+                    (day, owner_id)
+                ).fetchone()
+            finally:
+                conn.close()
+        return row[0] + pending
+
+    def rollups(self, owner_id: str = None, days: int = 7) -> list:
+        """Daily usage per owner, endpoint and model over the last `days` UTC days, newest first."""
+        self.flush()
+        since = _utc_day(datetime.now(timezone.utc) - timedelta(days=max(1, days) - 1))
+        query = "SELECT * FROM llm_usage_daily WHERE day >= ?"
+        params = [since]
+        if owner_id:
+            query += " AND owner_id = ?"
+            params.append(owner_id)
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(query + " ORDER BY day DESC, owner_id, endpoint, model", params).fetchall()
+        finally:
+            conn.close()
+        return [dict(row, total_tokens=row['prompt_tokens'] + row['completion_tokens']) for row in rows]
+
+class AdmissionRejected(Exception):
+    """A request was not admitted; carries the HTTP status and details for the response."""
+    def __init__(self, message: str, status_code: int, estimated_tokens: int, retry_after: int = None, **details):
+        super().__init__(message)
+        self.status_code = status_code
+        self.estimated_tokens = estimated_tokens
+        self.retry_after = retry_after
+        self.details = details
+
+class AdmissionController:
+    def __init__(self, ledger: UsageLedger, max_tokens_in_flight: int = None, queue_timeout: float = None):
+        """
+        Args:
+            ledger (UsageLedger): Source of each owner's usage so far today.
+            max_tokens_in_flight (int, optional): Estimated tokens admitted at once; 0 for no limit.
+                Defaults to ADMISSION_MAX_TOKENS_IN_FLIGHT.
+            queue_timeout (float, optional): Seconds a request waits for capacity. Defaults to ADMISSION_QUEUE_TIMEOUT.
+        """
+        self.ledger = ledger
+        self.max_tokens_in_flight = (max_tokens_in_flight if max_tokens_in_flight is not None
+                                     else getattr(config['default'], 'ADMISSION_MAX_TOKENS_IN_FLIGHT', 0))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else getattr(config['default'], 'ADMISSION_QUEUE_TIMEOUT', 30)
+        self.tokens_in_flight = 0
+        self._owner_tokens_in_flight = {}
+        self._capacity = threading.Condition()
+
+    def budget_for(self, owner_id: str) -> int:
+        """The owner's daily token budget; 0 means unlimited."""
+        overrides = getattr(config['default'], 'OWNER_TOKEN_BUDGETS', {})
+        return overrides.get(owner_id, getattr(config['default'], 'OWNER_DAILY_TOKEN_BUDGET', 0))
+
+    def admit(self, owner_id: str, estimated_tokens: int) -> tuple:
+        """
+        Reserves capacity for a request, waiting up to queue_timeout for it.
+
+        Returns:
+            tuple: (owner_id, reserved tokens, whether the request had to wait), to pass to release().
+
+        Raises:
+            AdmissionRejected: 429 when the owner's budget would be exceeded, 503 when capacity
+                did not free up in time.
+        """
+        budget = self.budget_for(owner_id)
+        # Read outside the lock: it may query the database
+        used_today = self.ledger.owner_tokens(owner_id) if budget else 0
+
+        deadline = time.monotonic() + self.queue_timeout
+        waited = False
+        with self._capacity:
+            self._check_budget(owner_id, budget, used_today, estimated_tokens)
+            # A request larger than the whole capacity still runs, once nothing else is in flight
+            while (self.max_tokens_in_flight and self.tokens_in_flight
+                   and self.tokens_in_flight + estimated_tokens > self.max_tokens_in_flight):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionRejected(
+                        "The service is at capacity; try again shortly.", 503, estimated_tokens,
+                        retry_after=max(1, int(self.queue_timeout))
+                    )
+                waited = True
+                self._capacity.wait(remaining)
+            # Checked again in the same critical section as the reservation, since the
+            # owner's other requests may have reserved tokens while this one waited
+            self._check_budget(owner_id, budget, used_today, estimated_tokens)
+            self.tokens_in_flight += estimated_tokens
+            self._owner_tokens_in_flight[owner_id] = self._owner_tokens_in_flight.get(owner_id, 0) + estimated_tokens
+            ADMITTED_TOKENS.set(self.tokens_in_flight)
+        return owner_id, estimated_tokens, waited
+
+    def _check_budget(self, owner_id: str, budget: int, used_today: int, estimated_tokens: int):
+        """Raises a 429 AdmissionRejected if the owner's budget would be exceeded; call holding _capacity."""
+        if not budget:
+            return
+        used = used_today + self._owner_tokens_in_flight.get(owner_id, 0)
+        if used + estimated_tokens > budget:
+            now = datetime.now(timezone.utc)
+            midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            raise AdmissionRejected(
+                f"Daily token budget of {budget} would be exceeded for owner '{owner_id}'.", 429, estimated_tokens,
+                retry_after=int((midnight - now).total_seconds()) + 1, remaining_tokens=max(0, budget - used)
+            )
+
+    def release(self, reservation: tuple):
+        owner_id, estimated_tokens, _ = reservation
+        with self._capacity:
+            self.tokens_in_flight -= estimated_tokens
+            remaining = self._owner_tokens_in_flight.get(owner_id, 0) - estimated_tokens
+            if remaining > 0:
+                self._owner_tokens_in_flight[owner_id] = remaining
+            else:
+                self._owner_tokens_in_flight.pop(owner_id, None)
+            ADMITTED_TOKENS.set(self.tokens_in_flight)
+            self._capacity.notify_all()
+
+# --- Pre-flight estimates ---
+
+def _call_tokens() -> int:
+    return PROMPT_TOKENS_PER_CALL + getattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT', 400)
+
+def _estimate_focus_group(data: dict) -> int:
+    # Imported here: the estimator reaches llm_client, which records into this module's ledger
+    from src.services.simulation_estimator import estimate_focus_group
+    return estimate_focus_group(data)['total_tokens']
+
+def _estimate_live_start(data: dict) -> int:
+    return len(data.get('personas') or []) * _call_tokens()
+
+def _estimate_analyze(data: dict) -> int:
+    return len(data.get('personas') or []) * _call_tokens()
+
+def _estimate_content_test(data: dict) -> int:
+    return int(data.get('sample_size', 15)) * _call_tokens()
+
+def _estimate_variant_test(data: dict) -> int:
+    return int(data.get('sample_size', 15)) * max(1, len(data.get('variants') or [])) * _call_tokens()
+
+def _estimate_summary(data: dict) -> int:
+    # Four characters per token, as in summary.count_tokens without tiktoken
+    return len(json.dumps(data.get('responses') or [])) // 4 + _call_tokens()
+
+# Estimators for LLM-bound routes, by route rule; other routes are admitted without a check
+REQUEST_ESTIMATORS = {
+    '/api/focus_group/simulate': _estimate_focus_group,
+    '/api/focus_group/start_live': _estimate_live_start,
+    '/api/analyze': _estimate_analyze,
+    '/api/test_content/run': _estimate_content_test,
+    '/api/test_content/variants': _estimate_variant_test,
+    '/api/summary': _estimate_summary,
+}
+
+def estimate_request_tokens(route: str, data: dict, view_args: dict = None, estimators: dict = None):
+    """
+    Estimated tokens a request to route will use, or None for routes that are not LLM-bound.
+
+    Args:
+        route (str): The request's route rule.
+        data (dict): The request body.
+        view_args (dict, optional): The route's URL arguments, passed to the estimator as keywords.
+        estimators (dict, optional): Estimators by route rule, in addition to REQUEST_ESTIMATORS; for
+            routes whose estimate needs state held by their blueprint.
+    """
+    estimator = (estimators or {}).get(route) or REQUEST_ESTIMATORS.get(route)
+    if estimator is None:
+        return None
+    try:
+        return estimator(data or {}, **(view_args or {}))
+    except (TypeError, ValueError):
+        # Malformed payloads are rejected by the route itself
+        return 0
+
+# Process-wide ledger that llm_client records every completion in
+usage_ledger = UsageLedger()
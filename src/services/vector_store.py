@@ -0,0 +1,477 @@
+# src/services/vector_store.py
+import json
+import os
+import threading
+from array import array
+import numpy as np
+from src.utils.logger import app_logger
+
+# Metadata fields with a precomputed row index. age_band is derived from 'age'.
+INDEXED_FIELDS = ('region', 'gender', 'age_band')
+AGE_BANDS = ((18, '<18'), (25, '18-24'), (35, '25-34'), (45, '35-44'), (55, '45-54'), (65, '55-64'))
+QUERY_BLOCK_ROWS = 65536  # Candidate rows scored per matrix multiply, bounds temporary memory
+
+def age_band(age) -> str:
+    """Maps an age to its band label ('18-24', ..., '65+'), or None if it is not a number."""
+    try:
+        age = float(age)
+    except (TypeError, ValueError):
+        return None
+    for upper, label in AGE_BANDS:
+        if age < upper:
+            return label
+    return '65+'
+
+def _field_value(metadata: dict, field: str):
+    """A metadata field as filters see it; age_band falls back to the band of 'age'."""
+    value = metadata.get(field)
+    if field == 'age_band' and value is None:
+        return age_band(metadata.get('age'))
+    return value
+
+class MetadataIndex:
+    """
+    Sorted row numbers per (field, value) for region, gender and age band.
+
+    Filtering a million rows becomes a handful of vectorised scatters into one
+    mask instead of evaluating the filter against every metadata dict. Each
+    row costs one int64 per indexed field however many distinct values a
+    field has. Values match exactly, as in the residual filter and Chroma.
+    """
+    def __init__(self):
+        self.size = 0
+        self._rows = {field: {} for field in INDEXED_FIELDS}
+
+    def add(self, first_row: int, metadatas: list):
+        """Indexes metadatas occupying rows first_row .. first_row + len(metadatas) - 1."""
+        for offset, metadata in enumerate(metadatas):
+            for field, field_rows in self._rows.items():
+                value = _field_value(metadata, field)
+                if value is None or isinstance(value, (list, dict)):
+                    continue
+                rows = field_rows.get(value)
+                if rows is None:
+                    rows = field_rows[value] = array('q')
+                rows.append(first_row + offset)
+        self.size = max(self.size, first_row + len(metadatas))
+
+    def mask(self, conditions: list, size: int) -> np.ndarray:
+        """
+        Rows matching every field condition (the values of one condition are OR-ed).
+
+        Args:
+            conditions (list): (field, [values]) pairs for indexed fields.
+            size (int): Number of rows in the store.
+        """
+        result = np.ones(size, dtype=bool)
+        for field, values in conditions:
+            field_mask = np.zeros(size, dtype=bool)
+            for value in values:
+                rows = self._rows[field].get(value) if not isinstance(value, (list, dict)) else None
+                if rows:
+                    rows = np.frombuffer(rows, dtype=np.int64)
+                    field_mask[rows[:np.searchsorted(rows, size)]] = True
+            result &= field_mask
+        return result
+
+    @staticmethod
+    def _indexed_values(key: str, condition):
+        """The values an equality / $eq / $in condition on an indexed field matches, or None."""
+        if key.startswith('$'):
+            return None
+        if isinstance(condition, (list, tuple)):
+            raise ValueError(f"Filter on '{key}' must be a value or an operator such as {{'$in': [...]}}, not a list")
+        if key not in INDEXED_FIELDS:
+            return None
+        if not isinstance(condition, dict):
+            return [condition]
+        if not condition or not set(condition) <= {'$in', '$eq'}:
+            return None
+        # Operators in one condition must all hold, as in _matches
+        values = list(condition['$in']) if '$in' in condition else [condition['$eq']]
+        if '$in' in condition and '$eq' in condition:
+            values = [value for value in values if value == condition['$eq']]
+        return values
+
+    @staticmethod
+    def split_filter(where_filter: dict):
+        """
+        Separates the parts of a Chroma-style filter the index can answer
+        (equality / $eq / $in on indexed fields, at the top level or as
+        single-field clauses of a top-level $and) from the residual filter.
+
+        Returns:
+            tuple: ([(field, [values])], residual_filter or None)
+
+        Raises:
+            ValueError: For a bare list of values, which Chroma rejects too; use {'$in': [...]}.
+        """
+        indexed = []
+        residual = {}
+        residual_clauses = []
+        for key, condition in (where_filter or {}).items():
+            if key == '$and':
+                for clause in condition:
+                    values = MetadataIndex._indexed_values(*next(iter(clause.items()))) if len(clause) == 1 else None
+                    if values is None:
+                        residual_clauses.append(clause)
+                    else:
+                        indexed.append((next(iter(clause)), values))
+                continue
+            values = MetadataIndex._indexed_values(key, condition)
+            if values is None:
+                residual[key] = condition
+            else:
+                indexed.append((key, values))
+        if residual_clauses:
+            residual['$and'] = residual_clauses
+        return indexed, residual or None
+
+class NumpyVectorStore:
+    """
+    Append-only, memory-mapped float32 vector store.
+
+    On-disk layout (all inside `path`):
+        vectors.f32     raw float32 rows, L2-normalised so dot product == cosine
+        ids.txt         one id per row
+        metadata.jsonl  one JSON metadata object per row
+        manifest.json   {"dim": int, "count": int, "generation": int}, rewritten
+                        after each append
+
+    Only the first `count` rows listed in the manifest are trusted, so a crash
+    mid-append never exposes a half-written row. Updating an id appends a new
+    row and the id map points at the latest one; compact() writes the live rows
+    to the next generation's files (vectors.<generation>.f32, ...) and switches
+    to them by replacing the manifest, so a crash mid-compact leaves the old
+    generation in place.
+    """
+    VECTORS_FILE = 'vectors.f32'
+    IDS_FILE = 'ids.txt'
+    METADATA_FILE = 'metadata.jsonl'
+    MANIFEST_FILE = 'manifest.json'
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Directory holding the snapshot files. Created if missing.
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.dim = None
+        self.count = 0
+        self.generation = 0
+        self._vectors = None     # np.memmap of shape (count, dim)
+        self._ids = []           # row -> id
+        self._metadatas = []     # row -> metadata dict
+        self._id_to_row = {}     # id -> latest row
+        self._live = np.zeros(0, dtype=bool)
+        self.index = MetadataIndex()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _data_file(self, name: str, generation: int = None) -> str:
+        """Path of a data file in the given (default: current) generation; generation 0 uses the bare name."""
+        generation = self.generation if generation is None else generation
+        if not generation:
+            return self._file(name)
+        stem, extension = os.path.splitext(name)
+        return self._file(f"{stem}.{generation}{extension}")
+
+    def _remove_generation(self, generation: int):
+        for name in (self.VECTORS_FILE, self.IDS_FILE, self.METADATA_FILE):
+            path = self._data_file(name, generation)
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                app_logger.warning(f"Could not remove superseded vector store file '{path}': {e}")
+
+    def _ensure_loaded(self):
+        """Maps the snapshot into memory on first use."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            manifest_path = self._file(self.MANIFEST_FILE)
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                self.dim = manifest.get('dim')
+                self.count = manifest.get('count', 0)
+                self.generation = manifest.get('generation', 0)
+            # Files of an interrupted compact that never reached the manifest
+            self._remove_generation(self.generation + 1)
+            self._truncate_to_manifest()
+            self._ids = self._read_lines(self.IDS_FILE, self.count)
+            self._metadatas = [json.loads(line) for line in self._read_lines(self.METADATA_FILE, self.count)]
+            self._id_to_row = {persona_id: row for row, persona_id in enumerate(self._ids)}
+            self._live = np.zeros(self.count, dtype=bool)
+            self._live[list(self._id_to_row.values())] = True
+            self.index = MetadataIndex()
+            self.index.add(0, self._metadatas)
+            self._remap()
+            self._loaded = True
+            app_logger.info(f"Vector store loaded from '{self.path}': {len(self._id_to_row)} vectors (dim={self.dim}).")
+
+    def _read_lines(self, name: str, limit: int) -> list:
+        path = self._data_file(name)
+        if not os.path.exists(path):
+            return []
+        lines = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if len(lines) >= limit:
+                    break
+                lines.append(line.rstrip('\n'))
+        return lines
+
+    def _truncate_to_manifest(self):
+        """Drops bytes/lines written after the last manifest update (e.g. a crash mid-append)."""
+        vectors_path = self._data_file(self.VECTORS_FILE)
+        if os.path.exists(vectors_path) and self.dim:
+            expected = self.count * self.dim * 4
+            if os.path.getsize(vectors_path) > expected:
+                with open(vectors_path, 'r+b') as f:
+                    f.truncate(expected)
+        for name in (self.IDS_FILE, self.METADATA_FILE):
+            lines = self._read_lines(name, self.count)
+            path = self._data_file(name)
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                line_count = sum(1 for _ in f)
+            if line_count > len(lines):
+                self._write_lines(path, lines)
+
+    @staticmethod
+    def _write_lines(path: str, lines: list):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _write_manifest(self):
+        tmp_path = self._file(self.MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'dim': self.dim, 'count': self.count, 'generation': self.generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file(self.MANIFEST_FILE))
+
+    def _remap(self):
+        if self.count and self.dim:
+            self._vectors = np.memmap(self._data_file(self.VECTORS_FILE), dtype=np.float32, mode='r', shape=(self.count, self.dim))
+        else:
+            self._vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._id_to_row)
+
+    def upsert(self, ids: list, vectors, metadatas: list = None):
+        """
+        Appends vectors, replacing any existing entries with the same ids.
+
+        Args:
+            ids (list): Unique string ids, one per vector.
+            vectors: Array-like of shape (n, dim).
+            metadatas (list, optional): One JSON-serialisable dict per vector.
+        """
+        if not ids:
+            return
+        self._ensure_loaded()
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+            raise ValueError("vectors must be a 2-D array with one row per id")
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match store dimension {self.dim}")
+
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+
+            with open(self._data_file(self.VECTORS_FILE), 'ab') as f:
+                f.write(np.ascontiguousarray(matrix).tobytes())
+            with open(self._data_file(self.IDS_FILE), 'a', encoding='utf-8') as f:
+                f.writelines(f"{persona_id}\n" for persona_id in ids)
+            with open(self._data_file(self.METADATA_FILE), 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(metadata or {}, default=str) + '\n' for metadata in metadatas)
+
+            first_row = self.count
+            self.count += len(ids)
+            self._write_manifest()
+
+            self._live = np.concatenate([self._live, np.ones(len(ids), dtype=bool)])
+            for offset, persona_id in enumerate(ids):
+                previous_row = self._id_to_row.get(persona_id)
+                if previous_row is not None:
+                    self._live[previous_row] = False
+                self._id_to_row[persona_id] = first_row + offset
+            self._ids.extend(ids)
+            self._metadatas.extend(metadatas)
+            self.index.add(first_row, metadatas)
+            self._remap()
+
+    def get(self, persona_id: str):
+        """Returns (vector, metadata) for an id, or None if it is not stored."""
+        self._ensure_loaded()
+        row = self._id_to_row.get(persona_id)
+        if row is None:
+            return None
+        return np.array(self._vectors[row]), self._metadatas[row]
+
+    def query(self, query_vector, n_results: int = 5, where_filter: dict = None) -> dict:
+        """
+        Finds the nearest stored vectors to a single query vector by cosine similarity.
+
+        Returns:
+            dict: Chroma-style {'ids': [[...]], 'distances': [[...]], 'metadatas': [[...]]}
+                where distance is 1 - cosine similarity.
+        """
+        query_matrix = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        return self.query_batch(query_matrix, n_results=n_results, where_filter=where_filter)
+
+    def query_batch(self, query_matrix, n_results: int = 5, where_filter: dict = None) -> dict:
+        """
+        Finds the top-k nearest stored vectors for every row of a query matrix.
+
+        Candidates are pre-filtered with the metadata index (plus a scan
+        of any non-indexed filter conditions over the survivors only), then
+        scored block by block with one matrix multiply per block and reduced
+        with argpartition, so memory stays bounded for large stores.
+
+        Args:
+            query_matrix: Array-like of shape (m, dim).
+            n_results (int): Results per query.
+            where_filter (dict, optional): Chroma-style metadata filter.
+
+        Returns:
+            dict: Chroma-style results with one inner list per query row.
+        """
+        self._ensure_loaded()
+        queries = np.atleast_2d(np.asarray(query_matrix, dtype=np.float32))
+        num_queries = queries.shape[0]
+        empty = {'ids': [[] for _ in range(num_queries)], 'distances': [[] for _ in range(num_queries)], 'metadatas': [[] for _ in range(num_queries)]}
+        if not self.count or not num_queries:
+            return empty
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match store dimension {self.dim}")
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            vectors, size = self._vectors, self.count
+            live = self._live[:size].copy()
+            metadatas, ids, index = self._metadatas, self._ids, self.index
+            indexed_conditions, residual_filter = MetadataIndex.split_filter(where_filter)
+            if indexed_conditions:
+                live &= index.mask(indexed_conditions, size)
+
+        candidates = np.flatnonzero(live)
+        if residual_filter is not None and len(candidates):
+            keep = np.fromiter((self._matches(metadatas[row], residual_filter) for row in candidates), dtype=bool, count=len(candidates))
+            candidates = candidates[keep]
+        if not len(candidates):
+            return empty
+
+        k = min(n_results, len(candidates))
+        all_rows = len(candidates) == size
+        best_scores = np.full((num_queries, 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((num_queries, 0), dtype=np.int64)
+        for start in range(0, len(candidates), QUERY_BLOCK_ROWS):
+            block_rows = candidates[start:start + QUERY_BLOCK_ROWS]
+            block = vectors[start:start + len(block_rows)] if all_rows else vectors[block_rows]
+            scores = queries @ np.asarray(block).T
+            # Merge this block's scores with the running top-k of each query
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            merged_rows = np.concatenate([best_rows, np.broadcast_to(block_rows, scores.shape)], axis=1)
+            keep = min(k, merged_scores.shape[1])
+            top = np.argpartition(-merged_scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(merged_scores, top, axis=1)
+            best_rows = np.take_along_axis(merged_rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return {
+            'ids': [[ids[row] for row in rows] for rows in best_rows],
+            'distances': [[float(1.0 - score) for score in scores] for scores in best_scores],
+            'metadatas': [[metadatas[row] for row in rows] for rows in best_rows]
+        }
+
+    @staticmethod
+    def _matches(metadata: dict, where_filter: dict) -> bool:
+        """Evaluates a Chroma-style filter: equality, $eq, $ne, $in, $nin, $and, $or."""
+        for key, condition in where_filter.items():
+            if key == '$and':
+                if not all(NumpyVectorStore._matches(metadata, sub) for sub in condition):
+                    return False
+                continue
+            if key == '$or':
+                if not any(NumpyVectorStore._matches(metadata, sub) for sub in condition):
+                    return False
+                continue
+            if isinstance(condition, (list, tuple)):
+                raise ValueError(f"Filter on '{key}' must be a value or an operator such as {{'$in': [...]}}, not a list")
+            value = _field_value(metadata, key)
+            if isinstance(condition, dict):
+                for op, expected in condition.items():
+                    if op == '$eq' and value != expected:
+                        return False
+                    if op == '$ne' and value == expected:
+                        return False
+                    if op == '$in' and value not in expected:
+                        return False
+                    if op == '$nin' and value in expected:
+                        return False
+            elif value != condition:
+                return False
+        return True
+
+    def compact(self):
+        """
+        Rewrites the snapshot without superseded rows, as a new generation of
+        files. Replacing the manifest is the commit point; the old generation is
+        deleted afterwards.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            rows = np.flatnonzero(self._live)
+            matrix = np.array(self._vectors[rows]) if len(rows) else np.zeros((0, self.dim or 0), dtype=np.float32)
+            ids = [self._ids[row] for row in rows]
+            metadatas = [self._metadatas[row] for row in rows]
+
+            old_generation = self.generation
+            new_generation = old_generation + 1
+            with open(self._data_file(self.VECTORS_FILE, new_generation), 'wb') as f:
+                f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._write_lines(self._data_file(self.IDS_FILE, new_generation), ids)
+            self._write_lines(self._data_file(self.METADATA_FILE, new_generation), [json.dumps(m, default=str) for m in metadatas])
+
+            self.generation = new_generation
+            self.count = len(ids)
+            self._write_manifest()
+            self._vectors = None
+            self._remove_generation(old_generation)
+
+            self._ids = ids
+            self._metadatas = metadatas
+            self._id_to_row = {persona_id: row for row, persona_id in enumerate(ids)}
+            self._live = np.ones(self.count, dtype=bool)
+            self.index = MetadataIndex()
+            self.index.add(0, metadatas)
+            self._remap()
+            app_logger.info(f"Vector store compacted to {self.count} vectors.")
@@ -1,7 +1,42 @@
 # src/services/vision.py
-import openai
+import asyncio
+import json
+import time
+from collections import OrderedDict
 from src.config import config
-from src.utils.logger import app_logger
+from src.database import get_db_connection
+from src.services.image_preprocessing import aimage_content_part, image_content_hash
+from src.services.llm_client import achat_completion, run_async, run_in_executor
+from src.utils.logger import SAMPLED, app_logger
+from src.utils.metrics import CACHE_LOOKUPS
+
+DESCRIPTION_FIELDS = (
+    'summary', 'subjects', 'setting', 'text_in_image', 'brand_elements', 'colours_and_style', 'mood', 'composition'
+)
+
+DESCRIBE_IMAGE_PROMPT = (
+    "Describe this marketing image in enough detail that someone who cannot see it could react to it as if they had. "
+    "Be factual and neutral; do not judge the creative. Respond with a JSON object with these keys:\n"
+    '  "summary": two or three sentences on what the image shows overall\n'
+    '  "subjects": the people, products and objects shown, with notable details\n'
+    '  "setting": where the scene takes place\n'
+    '  "text_in_image": all visible text, verbatim\n'
+    '  "brand_elements": logos, brand names, slogans and calls to action\n'
+    '  "colours_and_style": palette, photographic or illustrative style, production quality\n'
+    '  "mood": the emotional tone the image conveys\n'
+    '  "composition": layout and what draws the eye first\n'
+    "Return only the JSON object."
+)
+
+# In-process LRU in front of the image_descriptions table, recent failures,
+# and the descriptions in progress that concurrent callers await. Only
+# touched from the event loop, so they need no locks.
+_description_cache = OrderedDict()
+_description_failures = {}  # key -> (retry_at, error)
+_pending_descriptions = {}
+
+class ImageDescriptionUnavailable(RuntimeError):
+    """Describing this image failed moments ago; raised instead of calling the model again until IMAGE_DESCRIPTION_FAILURE_TTL passes."""
 
 class Vision:
     def __init__(self, image_data, persona_details, model=None, temperature=None):
@@ -9,18 +44,201 @@ class Vision:
         self.persona_details = persona_details
         self.model = model
         self.temperature = temperature
-        
 
-# Ensure OpenAI API key is configured
-if not getattr(openai, 'api_key', None) and config['default'].OPENAI_API_KEY:
-    openai.api_key = config['default'].OPENAI_API_KEY
-    app_logger.info("OpenAI API Key re-checked/set in vision service.")
+def format_image_description(description: dict) -> str:
+    """Renders a structured description as the text stand-in for the image in persona prompts."""
+    lines = []
+    for field in DESCRIPTION_FIELDS:
+        value = description.get(field)
+        if isinstance(value, list):
+            value = '; '.join(str(v) for v in value)
+        if value:
+            lines.append(f"{field.replace('_', ' ').capitalize()}: {value}")
+    return '\n'.join(lines)
+
+def describe_image(image_data, model=None) -> dict:
+    """Blocking form of adescribe_image, for callers outside the event loop."""
+    return run_async(adescribe_image(image_data, model))
+
+async def adescribe_image(image_data, model=None) -> dict:
+    """
+    Produces a structured description of an image with one vision call,
+    cached by content hash in memory and in the image_descriptions table.
+
+    Concurrent callers for the same image await the first caller's result
+    rather than each paying for a vision call; waiting costs them a
+    coroutine, not an executor thread. A failure is remembered for
+    IMAGE_DESCRIPTION_FAILURE_TTL seconds, so callers arriving after it
+    fail fast instead of retrying the vision call one after another.
+
+    Returns:
+        dict: The description, keyed by DESCRIPTION_FIELDS.
+
+    Raises:
+        ValueError: If the image is unusable or the model's description was malformed.
+        ImageDescriptionUnavailable: If the last vision call for this image failed within the TTL.
+    """
+    model = model or config['default'].DEFAULT_VISION_MODEL
+    key = (await run_in_executor(image_content_hash, image_data), model)
+    if key in _description_cache:
+        _description_cache.move_to_end(key)
+        CACHE_LOOKUPS.inc(cache='image_description', result='hit')
+        return _description_cache[key]
+    _raise_recent_failure(key)
+    pending = _pending_descriptions.get(key)
+    if pending is not None:
+        CACHE_LOOKUPS.inc(cache='image_description', result='hit')
+        return await asyncio.shield(pending)
+
+    pending = _pending_descriptions[key] = asyncio.get_running_loop().create_future()
+    try:
+        description = await run_in_executor(_load_image_description, *key)
+        CACHE_LOOKUPS.inc(cache='image_description', result='miss' if description is None else 'hit')
+        if description is None:
+            description = await _request_image_description(image_data, model)
+            await run_in_executor(_store_image_description, key[0], model, description)
+            app_logger.info(f"Described image {key[0][:12]} with {model}.")
+        _cache_description(key, description)
+        pending.set_result(description)
+        return description
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            e = RuntimeError("Image description was cancelled.")
+        else:
+            _remember_failure(key, e)
+        pending.set_exception(e)
+        pending.exception()  # Retrieved, so a failure nobody else awaited is not logged as lost
+        raise
+    finally:
+        del _pending_descriptions[key]
+
+def _cache_description(key, description):
+    _description_cache[key] = description
+    _description_failures.pop(key, None)
+    while len(_description_cache) > getattr(config['default'], 'IMAGE_DESCRIPTION_CACHE_MAX_ENTRIES', 256):
+        _description_cache.popitem(last=False)
+
+def _remember_failure(key, error):
+    now = time.monotonic()
+    for stale in [k for k, (retry_at, _) in _description_failures.items() if retry_at <= now]:
+        del _description_failures[stale]
+    _description_failures[key] = (now + getattr(config['default'], 'IMAGE_DESCRIPTION_FAILURE_TTL', 60), error)
+
+def _raise_recent_failure(key):
+    failure = _description_failures.get(key)
+    if failure is None:
+        return
+    retry_at, error = failure
+    if retry_at <= time.monotonic():
+        del _description_failures[key]
+        return
+    CACHE_LOOKUPS.inc(cache='image_description', result='negative_hit')
+    # Keep the kind of failure, so callers can tell a bad description from an unavailable model
+    if isinstance(error, ValueError):
+        raise ValueError(f"Image description failed recently: {error}")
+    raise ImageDescriptionUnavailable(f"Image description failed recently: {error}")
+
+async def _request_image_description(image_data, model) -> dict:
+    max_tokens = config['default'].DEFAULT_MAX_TOKENS_VISION if hasattr(config['default'], 'DEFAULT_MAX_TOKENS_VISION') else 500
+    image_part = await aimage_content_part(image_data)
+    response = await achat_completion(
+        model=model,
+        messages=[
+            {"role": "user", "content": [
+                {"type": "text", "text": DESCRIBE_IMAGE_PROMPT},
+                image_part
+            ]}
+        ],
+        max_tokens=max_tokens * 2,
+        temperature=0,
+        response_format={"type": "json_object"}
+    )
+    description = json.loads(response.choices[0].message.content)
+    if not isinstance(description, dict) or not description.get('summary'):
+        raise ValueError("Image description is missing a summary.")
+    return {field: description.get(field, '') for field in DESCRIPTION_FIELDS}
+
+def _load_image_description(content_hash, model):
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT description FROM image_descriptions WHERE content_hash = ? AND model = ?", (content_hash, model)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        app_logger.warning(f"Image description cache lookup failed: {e}")
+        return None
+    finally:
+        conn.close()
+
+def _store_image_description(content_hash, model, description):
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO image_descriptions (content_hash, model, description) VALUES (?, ?, ?)",
+            (content_hash, model, json.dumps(description))
+        )
+        conn.commit()
+    except Exception as e:
+        app_logger.warning(f"Failed to cache image description: {e}")
+    finally:
+        conn.close()
+
+async def _react_to_description(description_text, persona_details, message, model, temperature):
+    """Text-only persona reaction to an image, via its cached description."""
+    message_line = f"Marketing Message: \"{message}\"\n" if message else ""
+    subject = "both the marketing message and the image, explaining how they work together or against each other" if message else "this image"
+    prompt = (
+        f"Persona Profile: {persona_details}\n"
+        f"{message_line}"
+        f"Image (described in detail, treat it as if you are looking at it):\n{description_text}\n\n"
+        "You are a real person with this background. Give yourself a name and be conversational in response. "
+        f"Give your genuine reaction to {subject} and explain why you feel this way as if you are talking to a friend. "
+        "Include specific details about what you notice and why they matter to you based on your background and values. "
+        "Be authentic and honest about both positive and negative aspects that catch your attention. "
+        "Give recommendations on how you would improve the creative shown to you as if you are talking to your friend."
+    )
+    max_tokens = config['default'].DEFAULT_MAX_TOKENS_TEXT if hasattr(config['default'], 'DEFAULT_MAX_TOKENS_TEXT') else 300
+    response = await achat_completion(
+        model=model,
+        messages=[
+            {"role": "system", "content": "You are a consumer simulator."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        temperature=temperature
+    )
+    return response.choices[0].message.content
+
+def analyze_image(image_data, persona_details, model=None, temperature=None, full_vision=False):
+    """
+    A persona's reaction to an image. By default the image is described once
+    (cached) and the persona reacts to the description with a text model;
+    full_vision=True sends the image itself for high-fidelity runs.
+    """
+    return run_async(aanalyze_image(image_data, persona_details, model, temperature, full_vision))
 
-def analyze_image(image_data, persona_details, model=None, temperature=None):
+async def aanalyze_image(image_data, persona_details, model=None, temperature=None, full_vision=False):
+    if not full_vision:
+        try:
+            description_text = format_image_description(await adescribe_image(image_data))
+            response_content = await _react_to_description(
+                description_text, persona_details, None,
+                model or config['default'].DEFAULT_TEXT_MODEL, temperature or config['default'].DEFAULT_TEMPERATURE
+            )
+            app_logger.info("Image reaction via description successful for: %.50s", persona_details, extra=SAMPLED)
+            return response_content
+        except Exception as e:
+            # A malformed description may still work as a direct vision call; a failing
+            # vision model would only fail again, once per persona
+            if not isinstance(e, ValueError):
+                app_logger.error("Describe-once image analysis failed for %.50s: %s", persona_details, e, exc_info=True)
+                return f"Error analyzing image: {str(e)}"
+            app_logger.error("Describe-once image analysis failed for %.50s, using full vision: %s", persona_details, e, exc_info=True)
     model = model or config['default'].DEFAULT_VISION_MODEL
     temperature = temperature or config['default'].DEFAULT_TEMPERATURE
     max_tokens = config['default'].DEFAULT_MAX_TOKENS_VISION if hasattr(config['default'], 'DEFAULT_MAX_TOKENS_VISION') else 500
-    app_logger.debug(f"Analyzing image for: {persona_details[:50]} with model: {model}")
+    app_logger.debug("Analyzing image for: %.50s with model: %s", persona_details, model)
 
     prompt = (
         f"Persona Profile: {persona_details}\n"
@@ -32,31 +250,55 @@ def analyze_image(image_data, persona_details, model=None, temperature=None):
         "Give recommendations on how you would improve the creative shown to you as if you are talking to your friend."
     )
     try:
-        response = openai.chat.completions.create(
+        image_part = await aimage_content_part(image_data)
+        response = await achat_completion(
             model=model,
             messages=[
                 {"role": "user", "content": [
                     {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}}
+                    image_part
                 ]}
             ],
             max_tokens=max_tokens,
             temperature=temperature
         )
         response_content = response.choices[0].message.content
-        app_logger.info(f"Image analysis successful for: {persona_details[:50]}")
+        app_logger.info("Image analysis successful for: %.50s", persona_details, extra=SAMPLED)
         return response_content
     except Exception as e:
-        app_logger.error(f"OpenAI API Error in analyze_image for {persona_details[:50]}: {str(e)}", exc_info=True)
+        app_logger.error("OpenAI API Error in analyze_image for %.50s: %s", persona_details, e, exc_info=True)
         if "model_not_found" in str(e):
             return "Error: The image analysis model is not available."
         return f"Error analyzing image: {str(e)}"
 
-def analyze_combined(image_data, message, persona_details, model=None, temperature=None):
+def analyze_combined(image_data, message, persona_details, model=None, temperature=None, full_vision=False):
+    """
+    A persona's reaction to a message and image together; see analyze_image
+    for the describe-once default and full_vision.
+    """
+    return run_async(aanalyze_combined(image_data, message, persona_details, model, temperature, full_vision))
+
+async def aanalyze_combined(image_data, message, persona_details, model=None, temperature=None, full_vision=False):
+    if not full_vision:
+        try:
+            description_text = format_image_description(await adescribe_image(image_data))
+            response_content = await _react_to_description(
+                description_text, persona_details, message,
+                model or config['default'].DEFAULT_TEXT_MODEL, temperature or config['default'].DEFAULT_TEMPERATURE
+            )
+            app_logger.info("Combined reaction via description successful for: %.50s", persona_details, extra=SAMPLED)
+            return response_content
+        except Exception as e:
+            # A malformed description may still work as a direct vision call; a failing
+            # vision model would only fail again, once per persona
+            if not isinstance(e, ValueError):
+                app_logger.error("Describe-once combined analysis failed for %.50s: %s", persona_details, e, exc_info=True)
+                return f"Error analyzing combined input: {str(e)}"
+            app_logger.error("Describe-once combined analysis failed for %.50s, using full vision: %s", persona_details, e, exc_info=True)
     model = model or config['default'].DEFAULT_VISION_MODEL
     temperature = temperature or config['default'].DEFAULT_TEMPERATURE
     max_tokens = config['default'].DEFAULT_MAX_TOKENS_VISION if hasattr(config['default'], 'DEFAULT_MAX_TOKENS_VISION') else 500
-    app_logger.debug(f"Analyzing combined input for: {persona_details[:50]} with model: {model}")
+    app_logger.debug("Analyzing combined input for: %.50s with model: %s", persona_details, model)
 
     prompt = (
         f"Persona Profile: {persona_details}\n"
@@ -69,22 +311,23 @@ def analyze_combined(image_data, message, persona_details, model=None, temperatu
         "Give recommendations on how you would improve both the message and the creative as if you are talking to your friend."
     )
     try:
-        response = openai.chat.completions.create(
+        image_part = await aimage_content_part(image_data)
+        response = await achat_completion(
             model=model,
             messages=[
                 {"role": "user", "content": [
                     {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}}
+                    image_part
                 ]}
             ],
             max_tokens=max_tokens,
             temperature=temperature
         )
         response_content = response.choices[0].message.content
-        app_logger.info(f"Combined analysis successful for: {persona_details[:50]}")
+        app_logger.info("Combined analysis successful for: %.50s", persona_details, extra=SAMPLED)
         return response_content
     except Exception as e:
-        app_logger.error(f"OpenAI API Error in analyze_combined for {persona_details[:50]}: {str(e)}", exc_info=True)
+        app_logger.error("OpenAI API Error in analyze_combined for %.50s: %s", persona_details, e, exc_info=True)
         if "model_not_found" in str(e):
             return "Error: The combined analysis model is not available."
         return f"Error analyzing combined input: {str(e)}" 
\ No newline at end of file
@@ -0,0 +1,51 @@
+# src/utils/latency.py
+"""
+Live latency percentiles over a sliding window of recent samples.
+
+The Prometheus histograms in src.utils.metrics are cumulative and bucketed
+too coarsely to read a useful p95 back from; this keeps the last few
+hundred samples per key so estimators can use exact recent percentiles.
+"""
+import threading
+from collections import deque
+
+class LatencyTracker:
+    def __init__(self, window: int = 500):
+        """
+        Args:
+            window (int): Samples kept per key; older ones are forgotten.
+        """
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: tuple, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def count(self, key: tuple) -> int:
+        samples = self._samples.get(key)
+        return len(samples) if samples else 0
+
+    def percentile(self, key: tuple, q: float):
+        """The q-th percentile (0-100) of recent samples for key, or None before any were observed."""
+        with self._lock:
+            samples = sorted(self._samples.get(key) or ())
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._samples)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+# Successful LLM call latencies, keyed by (model, call_site)
+llm_latency = LatencyTracker()
@@ -1,8 +1,119 @@
 # src/utils/logger.py
+"""
+Application logging.
+
+Loggers built here carry a single QueueHandler: a log call renders its
+message and enqueues the record, and a QueueListener thread formats it and
+writes it to stdout and a rotating logs/app.log. Pass arguments %-style
+(app_logger.info("... %s", value)) so nothing is built for disabled levels,
+and wrap arguments that are costly to render, such as prompt previews, in
+lazy(). Per-turn records logged with extra=SAMPLED are rate limited per
+call site by SampleFilter.
+"""
+import atexit
+import copy
+import json
 import logging
-import sys
+import logging.handlers
 import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
 from src.config import config # Import config to get log level
+from src.utils.tracing import current_trace
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(module)s:%(lineno)d - %(message)s'
+
+# Pass as extra= on per-turn records that may be rate limited
+SAMPLED = {'sampled': True}
+
+class lazy:
+    """A log argument built only if the record is emitted: lazy(func, *args) renders as str(func(*args))."""
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+class SampleFilter(logging.Filter):
+    """
+    Lets at most `per_second` SAMPLED records through per call site each
+    second; unmarked records always pass. The first record let through after
+    a suppression says how many were dropped. A limit of 0 disables sampling.
+    """
+    def __init__(self, per_second: int = 5):
+        super().__init__()
+        self.per_second = per_second
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        if self.per_second <= 0 or not getattr(record, 'sampled', False):
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window_start, count, suppressed = self._sites.get(key, (now, 0, 0))
+            if now - window_start >= 1.0:
+                window_start, count = now, 0
+            if count >= self.per_second:
+                self._sites[key] = (window_start, count, suppressed + 1)
+                return False
+            self._sites[key] = (window_start, count + 1, 0)
+        if suppressed:
+            record.msg = f"{record.msg} [{suppressed} similar records suppressed]"
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, carrying the request's trace id when it was traced."""
+    def format(self, record) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'] = record.trace_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records for the listener thread. Only the message is rendered
+    on the calling thread, since its arguments may change once the call
+    returns. A full queue drops the record (counted in `dropped`) rather
+    than blocking the request.
+    """
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.listener = None
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        trace = current_trace()
+        record.trace_id = trace.trace_id if trace is not None else None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 def setup_logger(name='app_logger', level_str=None):
     """
@@ -10,11 +121,11 @@ def setup_logger(name='app_logger', level_str=None):
     Uses log level from config if available, otherwise defaults to INFO.
     """
     logger = logging.getLogger(name)
-    
+
     if not logger.handlers: # Avoid adding multiple handlers
         default_level_str = config['default'].LOG_LEVEL if hasattr(config['default'], 'LOG_LEVEL') else 'INFO'
         level_to_use_str = level_str or default_level_str
-        
+
         try:
             level = getattr(logging, level_to_use_str.upper())
         except AttributeError:
@@ -22,23 +133,38 @@ def setup_logger(name='app_logger', level_str=None):
             print(f"Warning: Invalid LOG_LEVEL '{level_to_use_str}'. Defaulting to INFO.")
 
         logger.setLevel(level)
-        
+
+        if getattr(config['default'], 'LOG_FORMAT', 'text') == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(TEXT_FORMAT)
+
         ch = logging.StreamHandler(sys.stdout)
         ch.setLevel(level)
-        
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(module)s:%(lineno)d - %(message)s')
         ch.setFormatter(formatter)
-        logger.addHandler(ch)
 
-        # Add file handler
+        # Add rotating file handler
         logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'logs')
         logs_dir = os.path.abspath(logs_dir)
         os.makedirs(logs_dir, exist_ok=True)
-        file_handler = logging.FileHandler(os.path.join(logs_dir, 'app.log'))
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(logs_dir, 'app.log'),
+            maxBytes=getattr(config['default'], 'LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backupCount=getattr(config['default'], 'LOG_BACKUP_COUNT', 5)
+        )
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+
+        # Handlers run on the listener thread; the logger itself only enqueues
+        queue_handler = LogQueueHandler(queue.Queue(getattr(config['default'], 'LOG_QUEUE_SIZE', 10000)))
+        queue_handler.listener = logging.handlers.QueueListener(
+            queue_handler.queue, ch, file_handler, respect_handler_level=True
+        )
+        queue_handler.listener.start()
+        atexit.register(queue_handler.listener.stop)
+        logger.addHandler(queue_handler)
+        logger.addFilter(SampleFilter(getattr(config['default'], 'LOG_SAMPLED_PER_SECOND', 5)))
     return logger
 
 # Default application logger instance
-app_logger = setup_logger() 
\ No newline at end of file
+app_logger = setup_logger()
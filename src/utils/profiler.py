@@ -0,0 +1,68 @@
+# src/utils/profiler.py
+"""
+A stack-sampling profiler for on-demand profiling of a single request.
+
+Samples the stacks of the request thread and the LLM event loop and
+executor threads (where most of a request's work now runs) at a fixed
+interval, and reports them as folded stacks: one line per distinct stack,
+"thread;outer;...;inner count", the input format of flamegraph.pl and
+speedscope. Work on those shared threads for concurrent requests is
+sampled too; profile on a quiet worker for a clean picture.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+
+# Threads sampled besides the one that started the profiler
+SHARED_THREAD_PREFIXES = ('llm-event-loop', 'llm-executor')
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        """
+        Args:
+            interval (float): Seconds between samples.
+            max_depth (int): Frames kept per stack, innermost first.
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._target_ident = None
+
+    def start(self):
+        self._target_ident = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident, str(ident))
+            if ident != self._target_ident and not name.startswith(SHARED_THREAD_PREFIXES):
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(name.replace(';', ':'))
+            self.samples[';'.join(reversed(stack))] += 1
+        self.sample_count += 1
+
+    def folded(self) -> str:
+        """Folded stacks, heaviest first."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
@@ -0,0 +1,70 @@
+# src/utils/startup_benchmark.py
+"""
+Measures application startup in a fresh interpreter, the way a new worker
+pays for it.
+
+    python -m src.utils.startup_benchmark --runs 5 --warmup eager
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Libraries that must not be imported just to create the app
+HEAVY_MODULES = ('pandas', 'openai', 'sklearn', 'scipy', 'chromadb', 'pyarrow', 'openpyxl')
+
+RESULT_PREFIX = 'STARTUP_BENCHMARK '
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from src.app import create_app
+imported = time.perf_counter()
+app = create_app(warmup={warmup!r})
+created = time.perf_counter()
+print({prefix!r} + json.dumps({{
+    'import_seconds': imported - start,
+    'create_app_seconds': created - imported,
+    'total_seconds': created - start,
+    'heavy_modules': [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+def measure_startup(warmup: str = 'none', cwd: str = None) -> dict:
+    """
+    Imports src.app and calls create_app in a new Python process.
+
+    Args:
+        warmup (str): Passed to create_app.
+        cwd (str, optional): Working directory for the child, e.g. to keep its SQLite file out of the repo.
+
+    Returns:
+        dict: {'import_seconds', 'create_app_seconds', 'total_seconds', 'heavy_modules'}
+    """
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [project_root, os.environ.get('PYTHONPATH')])))
+    probe = _PROBE.format(warmup=warmup, prefix=RESULT_PREFIX, heavy=HEAVY_MODULES)
+    completed = subprocess.run(
+        [sys.executable, '-c', probe], cwd=cwd or project_root, env=env, capture_output=True, text=True, check=True
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"Startup probe produced no result:\n{completed.stderr}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark application startup time.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--warmup', choices=('none', 'background', 'eager'), default='none')
+    args = parser.parse_args()
+
+    results = [measure_startup(args.warmup) for _ in range(args.runs)]
+    for key in ('import_seconds', 'create_app_seconds', 'total_seconds'):
+        values = [r[key] for r in results]
+        print(f"{key:20s} median {statistics.median(values):.3f}s  min {min(values):.3f}s  max {max(values):.3f}s")
+    print(f"heavy modules loaded: {', '.join(results[-1]['heavy_modules']) or 'none'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# src/utils/stats.py
+import math
+import numpy as np
+
+def mean_confidence_interval(values, confidence: float = 0.95) -> dict:
+    """
+    Mean with a Student-t confidence interval.
+
+    Args:
+        values: Sequence of numbers.
+        confidence (float): Confidence level, e.g. 0.95.
+
+    Returns:
+        dict: {'mean', 'std', 'n', 'ci_low', 'ci_high', 'half_width'}; the
+            interval is None when there are fewer than two values.
+    """
+    data = np.asarray(values, dtype=float)
+    n = len(data)
+    if n == 0:
+        return {'mean': None, 'std': None, 'n': 0, 'ci_low': None, 'ci_high': None, 'half_width': None}
+    mean = float(data.mean())
+    if n < 2:
+        return {'mean': mean, 'std': 0.0, 'n': 1, 'ci_low': None, 'ci_high': None, 'half_width': None}
+    from scipy import stats
+    std = float(data.std(ddof=1))
+    half_width = float(stats.t.ppf((1 + confidence) / 2, n - 1) * std / math.sqrt(n))
+    return {'mean': mean, 'std': std, 'n': n, 'ci_low': mean - half_width, 'ci_high': mean + half_width, 'half_width': half_width}
+
+def proportion_confidence_interval(successes: int, n: int, confidence: float = 0.95) -> dict:
+    """
+    Wilson score interval for a proportion; well behaved for small n and
+    proportions near 0 or 1, unlike the normal approximation.
+
+    Returns:
+        dict: {'proportion', 'n', 'ci_low', 'ci_high', 'half_width'}
+    """
+    if n == 0:
+        return {'proportion': None, 'n': 0, 'ci_low': None, 'ci_high': None, 'half_width': None}
+    from scipy import stats
+    z = float(stats.norm.ppf((1 + confidence) / 2))
+    p = successes / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return {'proportion': p, 'n': n, 'ci_low': centre - margin, 'ci_high': centre + margin, 'half_width': margin}
@@ -0,0 +1,141 @@
+# src/utils/tracing.py
+"""
+Lightweight per-request tracing.
+
+A Trace is started for a request and every span() opened while it is the
+current trace is recorded against it, including spans opened on the LLM
+event loop and its executor (llm_client carries the context across). With
+no current trace, span() costs a context variable lookup.
+
+Finished traces are kept in a bounded in-memory buffer and can be exported
+as JSON or in the Chrome trace event format (chrome://tracing, Perfetto).
+"""
+import contextvars
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+_span_ids = itertools.count(1)
+
+class Trace:
+    def __init__(self, name: str, attributes: dict = None):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def add_span(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, **attributes):
+        self.attributes.update(attributes)
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['start'])
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start_time': self.start_wall,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'attributes': self.attributes,
+            'has_profile': self.profile is not None,
+            'spans': [dict(s, start_ms=round(s['start'] * 1000, 3), duration_ms=round(s['duration'] * 1000, 3)) for s in spans]
+        }
+
+    def to_chrome_trace(self) -> dict:
+        """Chrome trace event format: one complete ('X') event per span, timestamps in microseconds."""
+        pid = os.getpid()
+        events = [{
+            'name': self.name, 'cat': 'request', 'ph': 'X', 'pid': pid, 'tid': 'request',
+            'ts': 0, 'dur': round((self.duration or 0) * 1e6, 1), 'args': self.attributes
+        }]
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            events.append({
+                'name': s['name'], 'cat': s['name'].split('.')[0], 'ph': 'X', 'pid': pid, 'tid': s['thread'],
+                'ts': round(s['start'] * 1e6, 1), 'dur': round(s['duration'] * 1e6, 1),
+                'args': dict(s['attributes'], span_id=s['span_id'], parent_id=s['parent_id'])
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'trace_id': self.trace_id}}
+
+class TraceBuffer:
+    """The most recent finished traces, oldest evicted first."""
+    def __init__(self, max_traces: int = 200):
+        self.max_traces = max_traces
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str):
+        return self._traces.get(trace_id)
+
+    def recent(self, limit: int = 50) -> list:
+        with self._lock:
+            traces = list(self._traces.values())
+        return traces[::-1][:limit]
+
+def start_trace(name: str, **attributes) -> tuple:
+    """Makes a new trace current; returns (trace, token) for end_trace."""
+    trace = Trace(name, attributes)
+    return trace, _current_trace.set(trace)
+
+def end_trace(token, **attributes) -> Trace:
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    if trace is not None:
+        trace.finish(**attributes)
+    return trace
+
+def current_trace():
+    return _current_trace.get()
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Records a span on the current trace. Yields the span's attributes dict
+    (or None when nothing is being traced) so callers can add results such
+    as token counts before it closes.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    span_id = next(_span_ids)
+    token = _current_span.set(span_id)
+    start_time = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes['error'] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.add_span({
+            'span_id': span_id,
+            'parent_id': _current_span.get(),
+            'name': name,
+            'start': start_time - trace.start,
+            'duration': time.perf_counter() - start_time,
+            'thread': threading.current_thread().name,
+            'attributes': attributes
+        })
@@ -27,9 +27,19 @@ def app(monkeypatch):
     monkeypatch.setattr('src.services.persona.generate_persona_response', lambda message, persona_details, model=None, temperature=None: f"response for {persona_details}")
     monkeypatch.setattr('src.services.vision.analyze_image', lambda image_data, persona_details, model=None, temperature=None: "image response")
     monkeypatch.setattr('src.services.vision.analyze_combined', lambda image_data, message, persona_details, model=None, temperature=None: "combined response")
-    monkeypatch.setattr('src.routes.analyze.generate_persona_response', lambda message, persona_details, model=None, temperature=None: f"response for {persona_details}")
-    monkeypatch.setattr('src.routes.analyze.analyze_image', lambda image_data, persona_details, model=None, temperature=None: "image response")
-    monkeypatch.setattr('src.routes.analyze.analyze_combined', lambda image_data, message, persona_details, model=None, temperature=None: "combined response")
+    # The route awaits the async variants on the shared event loop
+    async def agenerate_persona_response(message, persona_details, model=None, temperature=None):
+        return f"response for {persona_details}"
+
+    async def aanalyze_image(image_data, persona_details, model=None, temperature=None, full_vision=False):
+        return "image response"
+
+    async def aanalyze_combined(image_data, message, persona_details, model=None, temperature=None, full_vision=False):
+        return "combined response"
+
+    monkeypatch.setattr('src.services.panel_prompting.agenerate_persona_response', agenerate_persona_response)
+    monkeypatch.setattr('src.services.panel_prompting.aanalyze_image', aanalyze_image)
+    monkeypatch.setattr('src.services.panel_prompting.aanalyze_combined', aanalyze_combined)
 
     history_manager = HistoryManager(db_path=':memory:')
     flask_app = Flask(__name__)
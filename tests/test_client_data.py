@@ -0,0 +1,231 @@
+import pytest
+
+from src import database
+from src.services.audience_service import AudienceService
+from src.services.client_data_service import ClientDataService
+from src.services.ingestion_job_service import IngestionJobService
+from src.services.persona_service import PersonaService
+
+
+class RecordingEmbeddingService:
+    def __init__(self):
+        self.ids = []
+
+    def embed_texts(self, texts):
+        return [[0.0, 0.0, 1.0] for _ in texts]
+
+    def add_persona_embeddings(self, persona_ids, embedding_vectors, metadatas=None):
+        self.ids.extend(persona_ids)
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    database.create_tables()
+    conn = database.get_db_connection()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def service(conn):
+    persona_service = PersonaService(conn, RecordingEmbeddingService(), ons_data_service=None)
+    audience_service = AudienceService(conn, persona_service)
+    service = ClientDataService(conn, audience_service)
+    service.chunk_size = 2
+    return service
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "crm.csv"
+    path.write_text(
+        "Full Name,Years,Town,Notes\n"
+        "Ann,34,Leeds,vip\n"
+        "Ben,not known,York,\n"
+        "Cat,51,Hull,x\n"
+        "Dan,28,,y\n"
+        "Eve,40,Bath,z\n"
+    )
+    return str(path)
+
+
+def test_process_uploaded_file_streams_mapped_rows(service, conn, csv_file):
+    mapping = {"Full Name": "name", "Years": "age", "Town": "region"}
+    result = service.process_uploaded_file(csv_file, "owner-1", "CRM", column_mapping=mapping)
+
+    assert result["status"] == "success"
+    assert result["records_processed"] == 5
+    assert result["personas_created"] == 5
+    assert result["rows_per_second"] > 0
+
+    rows = conn.execute(
+        "SELECT demographics FROM personas WHERE audience_id = ? ORDER BY id", (result["audience_id"],)
+    ).fetchall()
+    assert len(rows) == 5
+    assert '"age": 34' in rows[0][0] and "Notes" not in rows[0][0]
+    assert '"age"' not in rows[1][0]  # unparseable age is dropped, not fatal
+
+    audience = service.audience_service.get_audience_by_id(result["audience_id"])
+    assert audience["criteria"]["record_count"] == 5
+
+
+def test_saved_mapping_is_used_when_none_is_supplied(service, csv_file):
+    assert service.map_columns(csv_file, {"Full Name": "name", "Town": "region"})["status"] == "success"
+    assert service.resolve_column_mapping(csv_file) == {"Full Name": "name", "Town": "region"}
+
+
+def test_unknown_persona_field_is_rejected(service, csv_file):
+    result = service.process_uploaded_file(csv_file, "owner-1", "CRM", column_mapping={"Notes": "shoe_size"})
+    assert result["status"] == "error"
+    assert "shoe_size" in result["message"]
+
+
+def _drain(jobs):
+    # Single worker: once a no-op has run, every earlier job has finished
+    jobs.executor.submit(lambda: None).result()
+
+
+def test_ingestion_job_reports_progress(service, csv_file):
+    jobs = IngestionJobService(service, max_workers=1)
+    submitted = jobs.submit_job(csv_file, "owner-1", "CRM", column_mapping={"Full Name": "name", "Town": "region"})
+    assert submitted["status"] == "accepted"
+    assert submitted["total_rows_estimate"] == 5
+    _drain(jobs)
+
+    status = jobs.get_job_status(submitted["job_id"])
+    assert status["status"] == "completed"
+    assert status["rows_done"] == 5
+    assert status["percent_complete"] == 100.0
+    assert status["eta_seconds"] == 0
+
+
+def test_failed_job_resumes_from_checkpoint(service, conn, csv_file, monkeypatch):
+    persona_service = service.audience_service.persona_service
+    original = persona_service.create_personas_from_records
+    calls = {"count": 0}
+
+    def flaky(*args, **kwargs):
+        calls["count"] += 1
+        if calls["count"] == 2:
+            raise RuntimeError("worker crashed")
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(persona_service, "create_personas_from_records", flaky)
+    jobs = IngestionJobService(service, max_workers=1)
+    submitted = jobs.submit_job(csv_file, "owner-1", "CRM", column_mapping={"Full Name": "name"})
+    _drain(jobs)
+
+    status = jobs.get_job_status(submitted["job_id"])
+    assert status["status"] == "failed"
+    assert status["rows_done"] == 2  # first chunk committed with its checkpoint
+
+    assert jobs.resume_job(submitted["job_id"])["resume_from_row"] == 2
+    _drain(jobs)
+
+    status = jobs.get_job_status(submitted["job_id"])
+    assert status["status"] == "completed"
+    assert status["attempts"] == 2
+    names = [row[0] for row in conn.execute(
+        "SELECT json_extract(demographics, '$.name') FROM personas WHERE audience_id = ? ORDER BY id",
+        (submitted["audience_id"],)
+    )]
+    assert names == ["Ann", "Ben", "Cat", "Dan", "Eve"]
+
+
+def test_rolled_back_chunk_leaves_no_vectors(service, conn, csv_file):
+    audience_id = service.audience_service.create_audience_from_filters(name="CRM", audience_type="client", criteria={})["id"]
+
+    def checkpoint(chunk_conn, rows_done, rows_per_second):
+        if rows_done > 2:
+            raise RuntimeError("checkpoint failed")
+
+    with pytest.raises(RuntimeError):
+        service.ingest_file(csv_file, audience_id, {"Full Name": "name"}, on_chunk=checkpoint)
+
+    stored = [row[0] for row in conn.execute("SELECT id FROM personas WHERE audience_id = ? ORDER BY id", (audience_id,))]
+    assert len(stored) == 2
+    assert service.audience_service.persona_service.embedding_service.ids == [str(i) for i in stored]
+
+
+def test_ingestion_fills_the_embedding_cache_across_chunks(conn, csv_file, tmp_path):
+    import time
+    from src.services.embedding_providers import HashingEmbeddingProvider
+    from src.services.embedding_service import EmbeddingService
+
+    embedding_service = EmbeddingService(persistent_path=str(tmp_path / "vectors"), backend="numpy", provider=HashingEmbeddingProvider(dim=32))
+    persona_service = PersonaService(conn, embedding_service, ons_data_service=None)
+    service = ClientDataService(conn, AudienceService(conn, persona_service))
+    service.chunk_size = 2
+    jobs = IngestionJobService(service, max_workers=1)
+
+    start = time.perf_counter()
+    submitted = jobs.submit_job(csv_file, "owner-1", "CRM", column_mapping={"Full Name": "name", "Town": "region"})
+    _drain(jobs)
+
+    assert jobs.get_job_status(submitted["job_id"])["status"] == "completed"
+    assert time.perf_counter() - start < 3  # no chunk waits out the SQLite busy timeout
+    assert conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0] == 5
+    assert len(embedding_service.store) == 5
+
+
+def test_csv_resume_skips_rows_by_count(csv_file):
+    from src.services import client_data_readers
+
+    chunks = list(client_data_readers.iter_chunks(csv_file, columns=["Full Name", "Town"], chunk_size=2, skip_rows=3))
+    assert all(list(c.columns) == ["Full Name", "Town"] for c in chunks)
+    assert [name for c in chunks for name in c["Full Name"]] == ["Dan", "Eve"]
+
+
+def _frame():
+    import pandas as pd
+    return pd.DataFrame({
+        "customer_name": ["Ann", "Ben", "Cat", "Dan", "Eve"],
+        "Years": [34, 45, 51, 28, 40],
+        "Sex": ["F", "M", "F", "M", "F"],
+        "Salary": [31000, 52000, 47000, 29000, 61000],
+        "unused_wide_column": ["x" * 50] * 5,
+    })
+
+
+def test_parquet_reads_only_mapped_columns_across_row_groups(tmp_path):
+    from src.services import client_data_readers
+
+    path = str(tmp_path / "crm.parquet")
+    _frame().to_parquet(path, row_group_size=2)
+
+    assert client_data_readers.detect_format(path)["format"] == "parquet"
+    assert client_data_readers.count_rows(path) == 5
+    chunks = list(client_data_readers.iter_chunks(path, columns=["customer_name"], chunk_size=2, skip_rows=3))
+    assert all(list(c.columns) == ["customer_name"] for c in chunks)
+    assert [name for c in chunks for name in c["customer_name"]] == ["Dan", "Eve"]
+
+
+def test_gzip_and_excel_files_are_ingested(service, tmp_path):
+    frame = _frame()
+    gz_path = str(tmp_path / "crm.csv.gz")
+    frame.to_csv(gz_path, index=False, compression="gzip")
+    xlsx_path = str(tmp_path / "crm.xlsx")
+    frame.to_excel(xlsx_path, index=False)
+
+    mapping = {"customer_name": "name", "Years": "age"}
+    for path in (gz_path, xlsx_path):
+        result = service.process_uploaded_file(path, "owner-1", "CRM", column_mapping=mapping)
+        assert result["status"] == "success", result
+        assert result["records_processed"] == 5
+
+
+def test_profile_proposes_mapping(service, tmp_path):
+    path = str(tmp_path / "crm.parquet")
+    _frame().to_parquet(path)
+
+    profile = service.profile_file(path)
+    assert profile["status"] == "success"
+    assert profile["proposed_mapping"] == {
+        "customer_name": "name",
+        "Years": "age",
+        "Sex": "gender",
+        "Salary": "income",
+    }
+    years = next(c for c in profile["columns"] if c["name"] == "Years")
+    assert years["inferred_type"] == "numeric" and years["median"] == 40.0
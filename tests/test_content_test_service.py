@@ -0,0 +1,180 @@
+import json
+import re
+import threading
+
+from src.config import config
+from src.services.content_test_service import ContentTestService
+
+
+class FixedPanel:
+    def __init__(self, personas):
+        self.personas = personas
+
+    def sample_personas_from_audience(self, audience_id, count=8, diverse=False):
+        return self.personas[:count]
+
+
+def _service(personas, replies):
+    service = ContentTestService(FixedPanel(personas), persona_service=None)
+    calls = []
+    lock = threading.Lock()
+
+    async def complete(messages, model, max_tokens=None):
+        persona = messages[1]["content"].split("\n")[0]
+        with lock:
+            calls.append(persona)
+            attempt = calls.count(persona) - 1
+        reply = replies[persona]
+        return reply[attempt] if isinstance(reply, list) else reply
+
+    service._complete = complete
+    return service, calls
+
+
+def test_content_test_aggregates_structured_feedback():
+    feedback = {
+        "Persona Profile: A": {"sentiment": "positive", "clarity_score": 8, "recommendations": "Add a price.", "summary": "Clear offer."},
+        "Persona Profile: B": {"sentiment": "negative", "clarity_score": 4, "recommendations": "Shorter headline.", "summary": "Too wordy."},
+        "Persona Profile: C": {"sentiment": "positive", "clarity_score": 9, "recommendations": "Add a price.", "summary": "Liked the price."},
+    }
+    personas = [key.split(": ")[1] for key in feedback]
+    service, _ = _service(personas, {k: json.dumps(v) for k, v in feedback.items()})
+
+    result = service.test_content("aud-1", {"type": "ad", "text": "Buy now"}, sample_size=3)
+
+    assert result["total_responses"] == 3
+    assert result["overall_sentiment"] == "positive"
+    assert result["sentiment_breakdown"] == {"positive": 2, "negative": 1}
+    assert result["average_clarity_score"] == 7.0
+    assert result["clarity_score_distribution"]["8"] == 1
+    assert result["clarity_score_stats"]["ci95_low"] < 7.0 < result["clarity_score_stats"]["ci95_high"]
+    # The least satisfied persona's suggestion comes first and duplicates collapse
+    assert result["key_recommendations"] == ["Shorter headline.", "Add a price."]
+    assert [f["persona"] for f in result["per_persona_feedback"]] == personas
+    json.dumps(result)
+
+
+def test_invalid_feedback_is_retried_once_then_reported():
+    good = json.dumps({"sentiment": "neutral", "clarity_score": 6, "recommendations": "", "summary": "Fine."})
+    replies = {
+        "Persona Profile: A": ['{"sentiment": "meh"}', good],
+        "Persona Profile: B": ["not json", "still not json"],
+    }
+    service, calls = _service(["A", "B"], replies)
+
+    result = service.test_content("aud-1", {"type": "ad", "text": "Buy now"}, sample_size=2)
+
+    assert calls.count("Persona Profile: A") == 2
+    assert calls.count("Persona Profile: B") == 2
+    assert result["total_responses"] == 1
+    assert result["failed_evaluations"] == 1
+    assert "error" in result["per_persona_feedback"][1]
+
+
+def test_variant_test_reports_paired_differences_on_a_shared_panel():
+    def rating(label, sentiment, clarity):
+        return {"label": label, "sentiment": sentiment, "clarity_score": clarity, "recommendations": "", "summary": ""}
+
+    # Every persona rates B about two points clearer than A, from very different
+    # starting points; one lists the versions in the wrong order
+    replies = {
+        f"Persona Profile: {name}": json.dumps({"variants": [rating("A", "neutral", base), rating("B", "positive", base + lift)]})
+        for name, base, lift in (("A", 2, 2), ("B", 5, 3), ("C", 7, 2))
+    }
+    replies["Persona Profile: D"] = json.dumps({"variants": [rating("Version B", "positive", 4), rating("Version A", "neutral", 3)]})
+    service, calls = _service(["A", "B", "C", "D"], replies)
+    variants = [{"type": "ad", "text": "Old headline"}, {"type": "ad", "text": "New headline"}]
+
+    result = service.test_variants("aud-1", variants, sample_size=4)
+
+    assert len(calls) == 4
+    comparison = result["comparisons"]["B"]
+    assert comparison["paired_personas"] == 4
+    assert comparison["clarity_difference"]["mean"] == 2.0
+    assert comparison["clarity_difference"]["significant"]
+    assert comparison["preferred_by"] == 4
+    assert result["ranking"] == ["B", "A"]
+    assert set(result["per_persona_feedback"][0]["feedback"]) == {"A", "B"}
+
+
+def test_adaptive_mode_stops_once_the_interval_is_tight():
+    personas = [f"P{i}" for i in range(40)]
+    reply = json.dumps({"sentiment": "positive", "clarity_score": 8, "recommendations": "", "summary": ""})
+    service, calls = _service(personas, {f"Persona Profile: {p}": reply for p in personas})
+
+    result = service.test_content("aud-1", {"type": "ad", "text": "Buy now"}, sample_size=40, adaptive=True, metric="sentiment")
+
+    stopping = result["adaptive"]
+    assert stopping["stopped_early"]
+    assert len(calls) == stopping["evaluated"] == result["total_responses"] < 40
+    assert stopping["history"][-1]["half_width"] <= stopping["precision"]
+    assert stopping["ci95_low"] <= 1.0 <= stopping["ci95_high"]
+
+
+def test_panel_batch_packs_personas_and_falls_back_for_bad_entries(monkeypatch):
+    monkeypatch.setattr(config["default"], "PANEL_BATCH_SIZE", 3, raising=False)
+    personas = ["A", "B", "C", "D"]
+    good = {"sentiment": "positive", "clarity_score": 7, "recommendations": "", "summary": ""}
+    service = ContentTestService(FixedPanel(personas), persona_service=None)
+    prompts = []
+
+    async def complete(messages, model, max_tokens=None):
+        prompt = messages[1]["content"]
+        prompts.append(prompt)
+        if prompt.startswith("Persona Profile:"):
+            return json.dumps(good)
+        # Persona 2 of the first batch comes back malformed
+        count = len(re.findall(r"^Persona \d+:", prompt, flags=re.M))
+        entries = [dict(good, persona=i + 1) for i in range(count)]
+        if "Persona 1: A" in prompt:
+            entries[1]["sentiment"] = "ecstatic"
+        return json.dumps({"responses": entries})
+
+    service._complete = complete
+    result = service.test_content("aud-1", {"type": "ad", "text": "Buy now"}, sample_size=4, panel_batch=True)
+
+    assert result["total_responses"] == 4
+    assert [f["persona"] for f in result["per_persona_feedback"]] == personas
+    # Two panel calls plus one single-persona retry for B
+    assert len(prompts) == 3
+    assert [p.split("\n")[0] for p in prompts if p.startswith("Persona Profile:")] == ["Persona Profile: B"]
+
+
+def test_identical_paired_differences_are_degenerate():
+    summary = ContentTestService._paired_summary([2.0, 2.0, 2.0])
+    assert summary["mean"] == 2.0
+    assert summary["degenerate"] and not summary["significant"]
+    assert ContentTestService._paired_summary([1.0])["degenerate"]
+
+
+def test_variant_entries_must_carry_the_expected_labels():
+    def rating(label):
+        return {"label": label, "sentiment": "neutral", "clarity_score": 5, "recommendations": "", "summary": ""}
+
+    replies = {"Persona Profile: A": [
+        json.dumps({"variants": [rating("A"), rating("A")]}),
+        json.dumps({"variants": [rating("A"), rating("C")]}),
+    ]}
+    service, calls = _service(["A"], replies)
+    variants = [{"type": "ad", "text": "Old headline"}, {"type": "ad", "text": "New headline"}]
+
+    result = service.test_variants("aud-1", variants, sample_size=1)
+
+    assert len(calls) == 2
+    assert "error" in result["per_persona_feedback"][0]["feedback"]["A"]
+
+
+def test_content_test_routes_reject_missing_or_malformed_bodies():
+    from flask import Flask
+    from src.routes.test_content import create_test_content_blueprint
+
+    app = Flask(__name__)
+    app.register_blueprint(create_test_content_blueprint(content_test_service=None))
+    client = app.test_client()
+
+    for path in ("/api/test_content/run", "/api/test_content/variants"):
+        assert client.post(path).status_code == 400
+        assert client.post(path, json=["not", "an", "object"]).status_code == 400
+        assert client.post(path, json={"audience_id": 1}).get_json()["status"] == "error"
+    assert client.post("/api/test_content/run", json={"content": {"text": "Hi"}, "sample_size": "many"}).status_code == 400
+    assert client.post("/api/test_content/variants", json={"variants": "Hi"}).status_code == 400
@@ -0,0 +1,65 @@
+import pytest
+
+from src import database
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "test.db")
+    monkeypatch.setattr(database, "DATABASE_PATH", path)
+    return path
+
+
+def _index_names(conn):
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    return {row[0] for row in rows}
+
+
+def test_create_tables_applies_all_migrations(db_path):
+    database.create_tables()
+
+    conn = database.get_db_connection()
+    try:
+        assert database.get_schema_version(conn) == database.MIGRATIONS[-1][0]
+        assert {
+            "idx_personas_audience_id",
+            "idx_audiences_owner_id",
+            "idx_history_timestamp",
+        } <= _index_names(conn)
+    finally:
+        conn.close()
+
+
+def test_run_migrations_is_idempotent(db_path):
+    database.create_tables()
+    version = database.run_migrations()
+
+    conn = database.get_db_connection()
+    try:
+        applied = conn.execute("SELECT COUNT(*) FROM schema_migrations").fetchone()[0]
+    finally:
+        conn.close()
+    assert version == database.MIGRATIONS[-1][0]
+    assert applied == len(database.MIGRATIONS)
+
+
+def test_failed_migration_rolls_back(db_path, monkeypatch):
+    database.create_tables()
+    broken = database.MIGRATIONS + [
+        (999, "Broken migration", [
+            "CREATE TABLE partial_table (id INTEGER)",
+            "THIS IS NOT SQL",
+        ]),
+    ]
+    monkeypatch.setattr(database, "MIGRATIONS", broken)
+
+    with pytest.raises(Exception):
+        database.run_migrations()
+
+    conn = database.get_db_connection()
+    try:
+        assert database.get_schema_version(conn) == broken[-2][0]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert "partial_table" not in tables
+    finally:
+        conn.close()
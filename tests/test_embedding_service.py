@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from src import database
+from src.services.embedding_providers import HashingEmbeddingProvider
+from src.services.embedding_service import EmbeddingService
+
+
+class CountingProvider(HashingEmbeddingProvider):
+    def __init__(self):
+        super().__init__(dim=64)
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return super().embed(texts)
+
+
+@pytest.fixture
+def embedding_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    database.create_tables()
+    return EmbeddingService(persistent_path=str(tmp_path / "vectors"), backend="numpy", provider=CountingProvider())
+
+
+def test_hashing_provider_is_deterministic_and_similarity_aware():
+    provider = HashingEmbeddingProvider(dim=256)
+    vectors = provider.embed([
+        "Ann, a 34-year-old teacher living in Leeds.",
+        "Ann, a 35-year-old teacher living in Leeds.",
+        "Retired fisherman who loves the sea.",
+    ])
+    assert vectors.shape == (3, 256) and vectors.dtype == np.float32
+    assert np.allclose(vectors, provider.embed([
+        "Ann, a 34-year-old teacher living in Leeds.",
+        "Ann, a 35-year-old teacher living in Leeds.",
+        "Retired fisherman who loves the sea.",
+    ]))
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+def test_embed_texts_batches_and_caches_by_content(embedding_service):
+    embedding_service.batch_size = 2
+    texts = ["alpha", "beta", "alpha", "gamma"]
+
+    first = embedding_service.embed_texts(texts)
+    assert first.shape == (4, 64)
+    assert np.allclose(first[0], first[2])
+    assert embedding_service.provider.calls == [["alpha", "beta"], ["gamma"]]
+
+    second = embedding_service.embed_texts(["gamma", "alpha", "delta"])
+    assert embedding_service.provider.calls[-1] == ["delta"]
+    assert np.allclose(second[0], first[3])
+    assert embedding_service.cache_hits == 2
+
+
+def test_embedding_cache_keeps_only_the_newest_rows(embedding_service):
+    embedding_service.cache_max_rows = 3
+    embedding_service.embed_texts(["one", "two", "three", "four", "five"])
+    embedding_service.embed_texts(["six"])
+
+    conn = database.get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0] == 3
+    finally:
+        conn.close()
+    embedding_service.embed_texts(["six", "one"])
+    assert embedding_service.provider.calls[-1] == ["one"]
+
+
+def test_embed_texts_can_skip_the_cache(embedding_service):
+    embedding_service.embed_texts(["throwaway"], cache=False)
+    embedding_service.embed_texts(["throwaway"], cache=False)
+
+    assert embedding_service.provider.calls == [["throwaway"], ["throwaway"]]
+    conn = database.get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0] == 0
+    finally:
+        conn.close()
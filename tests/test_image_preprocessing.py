@@ -0,0 +1,98 @@
+import base64
+import io
+import threading
+
+import pytest
+
+from src.config import config
+from src.services import image_preprocessing
+from src.services.image_preprocessing import (
+    detect_image_format,
+    image_content_part,
+    prepare_image,
+    target_size,
+)
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n" + b"\x00" * 24
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "_prepared_cache", image_preprocessing.OrderedDict())
+    monkeypatch.setattr(image_preprocessing, "_content_hashes", image_preprocessing.OrderedDict())
+
+
+def test_format_is_detected_from_bytes_not_assumed():
+    assert detect_image_format(PNG_HEADER) == "image/png"
+    assert detect_image_format(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    with pytest.raises(ValueError):
+        detect_image_format(b"%PDF-1.7")
+
+
+def test_target_size_caps_short_side_and_never_upscales():
+    assert target_size(4000, 3000) == (1024, 768)
+    assert target_size(6000, 1000) == (2048, 341)
+    assert target_size(300, 200) == (300, 200)
+
+
+def test_oversized_and_undecodable_images_are_never_sent(monkeypatch):
+    monkeypatch.setattr(config["default"], "IMAGE_MAX_INPUT_BYTES", 16, raising=False)
+    with pytest.raises(ValueError):
+        prepare_image(base64.b64encode(PNG_HEADER).decode())
+    with pytest.raises(ValueError):
+        image_content_part(base64.b64encode(PNG_HEADER).decode())
+    with pytest.raises(ValueError):
+        image_content_part("not base64 at all!")
+
+
+def test_prepared_image_is_cached_by_content(monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "_normalise", lambda raw, mime: {
+        "data": base64.b64encode(raw).decode(), "mime_type": mime, "detail": "auto",
+        "width": None, "height": None, "bytes": len(raw),
+    })
+    encoded = base64.b64encode(PNG_HEADER).decode()
+
+    first = prepare_image(encoded)
+    second = prepare_image(f"data:image/jpeg;base64,{encoded[:10]}\n{encoded[10:]}")
+
+    assert second is first
+    assert image_content_part(encoded)["image_url"]["url"].startswith("data:image/png;base64,")
+
+    # A string seen before is found by its own digest, without decoding it again
+    monkeypatch.setattr(image_preprocessing, "decode_image_data", lambda data: pytest.fail("decoded twice"))
+    assert prepare_image(encoded) is first
+    assert image_preprocessing.image_content_hash(encoded) == first["content_hash"]
+
+
+def test_large_photo_is_downscaled_and_reencoded():
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", (3000, 2000), (200, 30, 30)).save(buffer, format="PNG")
+
+    prepared = prepare_image(base64.b64encode(buffer.getvalue()).decode())
+
+    assert (prepared["width"], prepared["height"]) == (1152, 768)
+    assert prepared["mime_type"] == "image/jpeg"
+    assert prepared["detail"] == "high"
+    assert prepared["bytes"] < prepared["original_bytes"]
+
+
+def test_images_are_prepared_off_the_event_loop(monkeypatch):
+    from src.services import llm_client
+    threads = []
+    prepare = image_preprocessing.prepare_image
+
+    def recording_prepare(image_data):
+        threads.append(threading.current_thread())
+        return prepare(image_data)
+
+    monkeypatch.setattr(image_preprocessing, "prepare_image", recording_prepare)
+    encoded = base64.b64encode(PNG_HEADER).decode()
+
+    async def prepare_on_loop():
+        return await image_preprocessing.aimage_content_part(encoded), threading.current_thread()
+
+    part, loop_thread = llm_client.run_async(prepare_on_loop())
+
+    assert part == image_content_part(encoded)
+    assert threads[0] is not loop_thread
@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.config import config
+from src.services import llm_client
+from src.utils.latency import llm_latency
+from src.utils.metrics import LLM_HEDGES, LLM_TOKENS
+
+
+class SlowCompletions:
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def create(self, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.2)
+        self.in_flight -= 1
+        return kwargs["messages"][0]["content"]
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    completions = SlowCompletions()
+    monkeypatch.setattr(llm_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    return completions
+
+
+def test_hundreds_of_calls_share_one_loop_thread(completions):
+    llm_client.get_event_loop()
+    threads_before = threading.active_count()
+
+    async def fan_out():
+        return await asyncio.gather(*(
+            llm_client.achat_completion(messages=[{"role": "user", "content": str(i)}]) for i in range(200)
+        ))
+
+    start = time.perf_counter()
+    results = llm_client.run_async(fan_out())
+
+    assert results == [str(i) for i in range(200)]
+    assert completions.peak == 200
+    assert time.perf_counter() - start < 1.5
+    assert threading.active_count() == threads_before
+
+
+def test_gather_limited_caps_concurrency(completions):
+    calls = [llm_client.achat_completion(messages=[{"role": "user", "content": str(i)}]) for i in range(6)]
+
+    assert llm_client.run_async(llm_client.gather_limited(calls, 2)) == [str(i) for i in range(6)]
+    assert completions.peak == 2
+
+
+def test_blocking_work_runs_off_the_loop():
+    async def work():
+        return await llm_client.run_in_executor(lambda: threading.current_thread().name)
+
+    assert llm_client.run_async(work()).startswith("llm-executor")
+
+
+def test_run_async_refuses_to_block_the_loop():
+    async def nested():
+        async def inner():
+            return 1
+        return llm_client.run_async(inner())
+
+    with pytest.raises(RuntimeError):
+        llm_client.run_async(nested())
+
+
+def test_json_mode_is_dropped_for_models_that_reject_it(monkeypatch):
+    sent = []
+
+    async def create(**kwargs):
+        sent.append(kwargs)
+        return "{}"
+
+    monkeypatch.setattr(llm_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    for model in ("gpt-4-vision-preview", "gpt-4o"):
+        llm_client.run_async(llm_client.achat_completion(model=model, messages=[], response_format={"type": "json_object"}))
+
+    assert "response_format" not in sent[0]
+    assert sent[1]["response_format"] == {"type": "json_object"}
+
+
+class RateLimited(Exception):
+    response = SimpleNamespace(headers={"retry-after": "0.05"})
+
+
+def test_sync_calls_retry_transient_errors_within_the_route_timeout(monkeypatch):
+    clients, attempts = [], []
+
+    def create(**kwargs):
+        attempts.append(kwargs["timeout"])
+        if len(attempts) < 3:
+            raise RateLimited()
+        return kwargs
+
+    def client(**options):
+        clients.append(options)
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    monkeypatch.setattr(llm_client, "get_openai", lambda: SimpleNamespace(OpenAI=client, AsyncOpenAI=client, RateLimitError=RateLimited))
+    monkeypatch.setattr(llm_client, "_sync_client", None)
+    monkeypatch.setattr(llm_client, "_async_client", None)
+
+    llm_client.chat_completion(model="gpt-4o", messages=[])
+    llm_client.get_async_openai()
+
+    # Two rate limits are retried, each attempt getting what is left of the timeout
+    assert len(attempts) == 3
+    assert config["default"].DEFAULT_LLM_TIMEOUT >= attempts[0] > attempts[1] > attempts[2]
+    # The sync client leaves retrying to the deadline-bound loop; the async one retries inside wait_for
+    assert [options["max_retries"] for options in clients] == [0, config["default"].LLM_CLIENT_MAX_RETRIES]
+
+    # Retries stop at the deadline
+    attempts.clear()
+    with pytest.raises(RateLimited):
+        llm_client._create("test", {"model": "gpt-4o", "messages": []}, timeout=0.01)
+    assert len(attempts) == 1
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(config["default"], "LLM_HEDGE_MIN_DELAY", 0.05)
+    monkeypatch.setattr(llm_client, "_hedge_delays", {})
+    monkeypatch.setattr(llm_client, "_hedge_credit", 0.0)
+    for _ in range(20):
+        llm_latency.observe(("hedge-model", "hedge_test"), 0.01)
+    started, cancelled = [], []
+
+    async def create(**kwargs):
+        started.append(kwargs["model"])
+        try:
+            # The first request stalls; its duplicate answers promptly
+            await asyncio.sleep(1 if len(started) == 1 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(len(started))
+            raise
+        return "reply %d" % len(started)
+
+    monkeypatch.setattr(llm_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    yield started, cancelled
+    llm_latency.clear()
+
+
+def hedged_call():
+    return llm_client.run_async(llm_client.achat_completion(call_site="hedge_test", model="hedge-model", messages=[]))
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled(hedging, monkeypatch):
+    monkeypatch.setattr(config["default"], "LLM_HEDGE_PERCENT", 100)
+    started, cancelled = hedging
+    wins = LLM_HEDGES.value(call_site="hedge_test", outcome="won")
+
+    start = time.perf_counter()
+    assert hedged_call() == "reply 2"
+
+    assert time.perf_counter() - start < 0.5
+    assert started == ["hedge-model", "hedge-model"]
+    assert cancelled == [2]
+    assert LLM_HEDGES.value(call_site="hedge_test", outcome="won") == wins + 1
+
+
+def test_hedges_are_capped_by_the_budget(hedging, monkeypatch):
+    monkeypatch.setattr(config["default"], "LLM_HEDGE_PERCENT", 50)
+    started, _ = hedging
+    over_budget = LLM_HEDGES.value(call_site="hedge_test", outcome="over_budget")
+
+    assert hedged_call() == "reply 1"
+
+    assert started == ["hedge-model"]
+    assert LLM_HEDGES.value(call_site="hedge_test", outcome="over_budget") == over_budget + 1
+
+
+def test_hedge_needs_a_free_in_flight_slot(hedging, monkeypatch):
+    monkeypatch.setattr(config["default"], "LLM_HEDGE_PERCENT", 100)
+    monkeypatch.setattr(llm_client, "_in_flight", asyncio.Semaphore(1))
+    started, _ = hedging
+    no_capacity = LLM_HEDGES.value(call_site="hedge_test", outcome="no_capacity")
+
+    assert hedged_call() == "reply 1"
+
+    assert started == ["hedge-model"]
+    assert LLM_HEDGES.value(call_site="hedge_test", outcome="no_capacity") == no_capacity + 1
+    assert not llm_client._in_flight.locked()
+
+
+def test_cancelled_hedge_is_charged_its_prompt_tokens(hedging, monkeypatch):
+    monkeypatch.setattr(config["default"], "LLM_HEDGE_PERCENT", 100)
+    started, cancelled = hedging
+    create = llm_client._async_client.chat.completions.create
+
+    async def create_with_usage(**kwargs):
+        await create(**kwargs)
+        return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10))
+
+    monkeypatch.setattr(llm_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create_with_usage))))
+    recorded = []
+    monkeypatch.setattr(llm_client, "usage_ledger", SimpleNamespace(record=lambda *args: recorded.append(args)))
+    prompt_before = LLM_TOKENS.value(model="hedge-model", call_site="hedge_test", kind="prompt")
+
+    hedged_call()
+
+    assert cancelled == [2]
+    assert LLM_TOKENS.value(model="hedge-model", call_site="hedge_test", kind="prompt") == prompt_before + 200
+    assert sorted(recorded) == [("hedge-model", "hedge_test", 100, 0), ("hedge-model", "hedge_test", 100, 10)]
@@ -0,0 +1,83 @@
+import json
+import logging
+import threading
+import uuid
+from types import SimpleNamespace
+
+from src.config import config
+from src.utils import logger as logger_module
+from src.utils import tracing
+from src.utils.logger import SAMPLED, SampleFilter, lazy, setup_logger
+
+
+def _new_logger(level="INFO"):
+    log = setup_logger(f"test_logger_{uuid.uuid4().hex}", level)
+    log.propagate = False
+    return log
+
+
+def _flush(log):
+    log.handlers[0].queue.join()
+
+
+def test_records_are_written_by_the_listener_thread(capsys):
+    log = _new_logger()
+    writers = []
+    log.handlers[0].listener.handlers[0].addFilter(lambda record: writers.append(threading.current_thread().name) or True)
+
+    items = [1]
+    log.info("Items: %s", items)
+    items.append(2)
+    _flush(log)
+
+    assert "Items: [1]" in capsys.readouterr().out
+    assert writers and writers[0] != threading.current_thread().name
+
+
+def test_lazy_arguments_are_only_built_for_emitted_records(capsys):
+    log = _new_logger("INFO")
+    calls = []
+
+    def preview():
+        calls.append(1)
+        return "expensive"
+
+    log.debug("Prompt: %s", lazy(preview))
+    assert calls == []
+    log.info("Prompt: %s", lazy(preview))
+    _flush(log)
+    assert calls == [1]
+    assert "Prompt: expensive" in capsys.readouterr().out
+
+
+def test_json_output_carries_the_trace_id(capsys, monkeypatch):
+    monkeypatch.setattr(config["default"], "LOG_FORMAT", "json", raising=False)
+    log = _new_logger()
+
+    trace, token = tracing.start_trace("test")
+    log.warning("Panel of %d", 3)
+    tracing.end_trace(token)
+    _flush(log)
+
+    entry = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert entry["message"] == "Panel of 3"
+    assert entry["level"] == "WARNING"
+    assert entry["trace_id"] == trace.trace_id
+
+
+def test_sampled_records_are_rate_limited_per_call_site(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(logger_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    sample_filter = SampleFilter(per_second=2)
+
+    def record(lineno, sampled=True):
+        return logging.makeLogRecord(dict(SAMPLED if sampled else {}, msg="turn", pathname="fg.py", lineno=lineno))
+
+    assert [sample_filter.filter(record(10)) for _ in range(5)] == [True, True, False, False, False]
+    assert sample_filter.filter(record(20))
+    assert sample_filter.filter(record(10, sampled=False))
+
+    now[0] += 1.0
+    resumed = record(10)
+    assert sample_filter.filter(resumed)
+    assert resumed.getMessage() == "turn [3 similar records suppressed]"
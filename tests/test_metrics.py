@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from src import database
+from src.services import llm_client
+from src.utils import metrics
+from src.utils.metrics import MetricsRegistry
+
+
+def test_histograms_render_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    calls = registry.counter("calls_total", "Calls.", ("site",))
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(5, route="/a")
+    calls.inc(site='say "hi"')
+
+    text = registry.render()
+
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+    assert 'calls_total{site="say \\"hi\\""} 1' in text
+    assert "# TYPE latency_seconds histogram" in text
+
+
+def test_llm_calls_record_latency_and_tokens_by_call_site(monkeypatch):
+    usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30)
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: SimpleNamespace(usage=usage, choices=[])
+    )))
+    monkeypatch.setattr(llm_client, "_sync_client", fake)
+    labels = dict(model="test-model", call_site="test_llm_calls_record_latency_and_tokens_by_call_site")
+    prompt_before = metrics.LLM_TOKENS.value(kind="prompt", **labels)
+
+    llm_client.chat_completion(model="test-model", messages=[])
+
+    assert metrics.LLM_TOKENS.value(kind="prompt", **labels) == prompt_before + 120
+    assert metrics.LLM_REQUEST_SECONDS.count(outcome="ok", **labels) >= 1
+
+
+def test_metrics_endpoint_reports_routes_and_queries(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    from src.app import create_app
+
+    app = create_app(warmup="none")
+    client = app.test_client()
+
+    def presets_count():
+        return sum(metrics.HTTP_REQUEST_SECONDS.count(route="/api/presets", method="GET", status=str(status)) for status in (200, 500))
+    before = presets_count()
+
+    client.get("/api/presets")
+    response = client.get("/metrics")
+
+    assert presets_count() == before + 1
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert 'audience_http_request_duration_seconds_count{route="/api/presets",method="GET",status=' in body
+    assert 'audience_db_query_duration_seconds_count{operation="CREATE",table="schema_migrations"}' in body
+    assert "audience_active_simulations 0" in body
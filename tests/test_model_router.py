@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.config import config
+from src.services import llm_client
+from src.services.model_router import escalation_reason, get_route, resolve_model
+from src.utils.metrics import LLM_ROUTE_DECISIONS
+
+ROUTES = {
+    "test.cascade": {"model": "large", "draft_model": "small", "timeout": 0.05, "fallback_model": "backup"},
+    "test.plain": {"model": "large", "timeout": 0.05, "fallback_model": "backup"},
+}
+
+
+def reply(content, finish_reason="stop"):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(finish_reason=finish_reason, message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    monkeypatch.setattr(config["default"], "MODEL_ROUTES", ROUTES)
+    calls = []
+    replies = {}
+
+    async def create(**kwargs):
+        calls.append(kwargs["model"])
+        content = replies.get(kwargs["model"], "Sounds good to me.")
+        if content == "slow":
+            await asyncio.sleep(1)
+        return reply(*content) if isinstance(content, tuple) else reply(content)
+
+    monkeypatch.setattr(llm_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    return calls, replies
+
+
+def complete(call_site, **kwargs):
+    return llm_client.run_async(llm_client.achat_completion(call_site=call_site, messages=[], **kwargs))
+
+
+def test_routes_resolve_their_models(monkeypatch):
+    monkeypatch.setattr(config["default"], "MODEL_ROUTES", ROUTES)
+
+    assert resolve_model("test.cascade") == "small"
+    assert resolve_model("test.plain") == "large"
+    assert resolve_model("test.plain", "requested") == "requested"
+    assert get_route("unrouted").model == config["default"].DEFAULT_TEXT_MODEL
+    assert get_route("unrouted").fallback_model is None
+
+
+def test_escalation_reasons():
+    assert escalation_reason(reply("I'd buy it.")) is None
+    assert escalation_reason(reply("I'd buy it", "length")) == "truncated"
+    assert escalation_reason(reply("  ")) == "empty"
+    assert escalation_reason(reply("As an AI, I don't drink coffee.")) == "flagged"
+
+    tokens = SimpleNamespace(content=[SimpleNamespace(logprob=-2.0), SimpleNamespace(logprob=-1.0)])
+    unsure = reply("Maybe.")
+    unsure.choices[0].logprobs = tokens
+    assert escalation_reason(unsure) is None
+    assert escalation_reason(unsure, min_confidence=0.5) == "low_confidence"
+
+
+def test_cascade_keeps_good_drafts_and_escalates_flagged_ones(fake_llm):
+    calls, replies = fake_llm
+    accepted = LLM_ROUTE_DECISIONS.value(call_site="test.cascade", decision="draft_accepted")
+
+    assert complete("test.cascade").choices[0].message.content == "Sounds good to me."
+    assert calls == ["small"]
+    assert LLM_ROUTE_DECISIONS.value(call_site="test.cascade", decision="draft_accepted") == accepted + 1
+
+    replies["small"] = "I'm sorry, I can't help with that."
+    calls.clear()
+    assert complete("test.cascade").choices[0].message.content == "Sounds good to me."
+    assert calls == ["small", "large"]
+
+
+def test_explicit_model_skips_the_cascade(fake_llm):
+    calls, _ = fake_llm
+    complete("test.cascade", model="chosen")
+    assert calls == ["chosen"]
+
+
+def test_timeout_falls_back(fake_llm):
+    calls, replies = fake_llm
+    replies["large"] = "slow"
+    fallbacks = LLM_ROUTE_DECISIONS.value(call_site="test.plain", decision="fallback")
+
+    assert complete("test.plain").choices[0].message.content == "Sounds good to me."
+    assert calls == ["large", "backup"]
+    assert LLM_ROUTE_DECISIONS.value(call_site="test.plain", decision="fallback") == fallbacks + 1
+
+    replies["backup"] = "slow"
+    with pytest.raises(asyncio.TimeoutError):
+        complete("test.plain")
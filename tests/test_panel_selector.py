@@ -0,0 +1,39 @@
+import numpy as np
+
+from src.services.embedding_providers import HashingEmbeddingProvider
+from src.services.panel_selector import PanelSelector, k_center_greedy, mmr_select
+
+
+def _clustered_vectors():
+    # Three tight clusters of four near-duplicates each
+    rng = np.random.default_rng(1)
+    centres = np.eye(3, 16)
+    vectors = np.vstack([c + 0.01 * rng.normal(size=(4, 16)) for c in centres])
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_mmr_and_k_center_cover_every_cluster():
+    vectors = _clustered_vectors()
+    for selected in (mmr_select(vectors, 3, diversity=0.7), k_center_greedy(vectors, 3)):
+        assert len(set(selected)) == 3
+        assert sorted(i // 4 for i in selected) == [0, 1, 2]
+
+
+class EmbedOnly:
+    def __init__(self):
+        self.provider = HashingEmbeddingProvider(dim=256)
+
+    def embed_texts(self, texts, cache=True):
+        return self.provider.embed(texts)
+
+
+def test_panel_selector_avoids_duplicate_profiles():
+    candidates = ["Alex, a 30-year-old teacher living in Leeds."] * 4 + [
+        "Sam, a 62-year-old retired farmer living in Cornwall.",
+        "Jordan, a 19-year-old student living in Glasgow.",
+    ]
+    selected, stats = PanelSelector(EmbedOnly(), strategy="mmr").select(candidates, 3)
+
+    panel = [candidates[i] for i in selected]
+    assert len(set(panel)) == 3
+    assert stats["panel_mean_similarity"] < stats["baseline_mean_similarity"]
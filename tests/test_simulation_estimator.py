@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src import database
+from src.services import focus_group_service, llm_client
+from src.services.focus_group_service import FocusGroupSimulator
+from src.services.simulation_estimator import estimate_focus_group, suggest_configurations
+from src.utils.latency import llm_latency
+
+CONFIG = {
+    "personas": ["Ann, 30, teacher", "Bob, 45, plumber", "Cat, 52, nurse", "Dev, 23, student"],
+    "message": "Our new kettle boils in 60 seconds.",
+    "questions": ["Would you pay more for it?"],
+    "num_discussion_rounds": 2,
+    "model": "estimator-test-model",
+}
+
+
+def test_call_graph_counts_history_growth():
+    estimate = estimate_focus_group(CONFIG)
+    stages = {s["stage"]: s for s in estimate["stages"]}
+
+    assert estimate["calls"] == 4 * (1 + 1 + 2) + 1
+    assert stages["initial_reactions"]["concurrency"] == 4
+    assert stages["discussion_rounds"]["concurrency"] == 1
+
+    snapshot = estimate_focus_group(dict(CONFIG, snapshot_rounds=True))
+    snapshot_stages = {s["stage"]: s for s in snapshot["stages"]}
+    assert snapshot_stages["discussion_rounds"]["prompt_tokens"] < stages["discussion_rounds"]["prompt_tokens"]
+    assert snapshot["expected_seconds"] < estimate["expected_seconds"]
+
+    one_round = estimate_focus_group(dict(CONFIG, num_discussion_rounds=1))
+    second_round_tokens = stages["discussion_rounds"]["prompt_tokens"] - {
+        s["stage"]: s for s in one_round["stages"]}["discussion_rounds"]["prompt_tokens"]
+    assert second_round_tokens > stages["discussion_rounds"]["prompt_tokens"] / 2
+
+
+def test_observed_latency_replaces_the_defaults():
+    llm_latency.clear()
+    for seconds in (0.5, 0.6, 0.7, 0.8, 3.0):
+        llm_latency.observe(("estimator-test-model", "focus_group.discussion"), seconds)
+
+    stage = {s["stage"]: s for s in estimate_focus_group(CONFIG)["stages"]}["discussion_rounds"]
+
+    assert stage["latency_source"] == "observed"
+    assert stage["expected_seconds"] == pytest.approx(8 * 0.7)
+    assert stage["p95_seconds"] == pytest.approx(8 * 3.0)
+    llm_latency.clear()
+
+
+def test_suggestions_meet_the_target():
+    target = estimate_focus_group(CONFIG)["expected_seconds"] - 5
+    suggestions = suggest_configurations(CONFIG, target)
+
+    assert suggestions
+    assert all(s["expected_seconds"] <= target for s in suggestions)
+    assert {"snapshot_rounds": True} in [s["changes"] for s in suggestions]
+
+
+def test_estimate_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    from src.app import create_app
+    client = create_app(warmup="none").test_client()
+
+    body = client.post("/api/focus_group/estimate", json=dict(CONFIG, target_seconds=1)).get_json()
+    assert body["status"] == "success"
+    assert body["meets_target"] is False
+    assert body["estimate"]["total_tokens"] > 0
+
+    assert client.post("/api/focus_group/estimate", json={"num_discussion_rounds": "many"}).status_code == 400
+
+
+def test_snapshot_rounds_answer_the_same_history_concurrently(monkeypatch):
+    prompts = []
+    in_flight = []
+    peak = []
+
+    async def create(**kwargs):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        prompts.append(kwargs["messages"][-1]["content"])
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content="I agree with that."))])
+
+    monkeypatch.setattr(llm_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(focus_group_service, "chat_completion", lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Price"))]
+    ))
+    simulator = FocusGroupSimulator(CONFIG["personas"], stimulus_message=CONFIG["message"], snapshot_rounds=True)
+
+    result = simulator.run_simulation(num_discussion_rounds=1)
+
+    discussion = [t for t in result["transcript"] if t.get("type") == "discussion_response"]
+    assert [t["persona_index"] for t in discussion] == [0, 1, 2, 3]
+    assert max(peak) == 4
+    histories = [p.split("Conversation History:")[1] for p in prompts if "Conversation History:" in p]
+    assert len(set(histories)) == 1
@@ -0,0 +1,90 @@
+import threading
+
+from src import database
+from src.services.container import LazyService, ServiceContainer
+from src.utils.startup_benchmark import measure_startup
+
+# Importing src.app and building the app used to take ~1.9s here; it now takes ~0.3s
+STARTUP_BUDGET_SECONDS = 1.5
+
+
+def test_create_app_does_not_import_heavy_libraries(tmp_path):
+    result = measure_startup(warmup="none", cwd=str(tmp_path))
+
+    assert result["heavy_modules"] == []
+    assert result["total_seconds"] < STARTUP_BUDGET_SECONDS
+
+
+class CountingContainer(ServiceContainer):
+    SERVICES = ("history_manager", "summary_session_service")
+
+    def __init__(self):
+        super().__init__()
+        self.builds = []
+
+    def _build_history_manager(self):
+        self.builds.append("history_manager")
+        return ["entry"]
+
+
+def test_services_are_built_once_on_first_use():
+    container = CountingContainer()
+    lazy = container.lazy("history_manager")
+
+    assert isinstance(lazy, LazyService)
+    assert not container.is_built("history_manager")
+    assert lazy.count("entry") == 1
+    assert lazy.index("entry") == 0
+    assert container.builds == ["history_manager"]
+
+
+def test_incomplete_jobs_are_resumed_without_warmup(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    warmed = []
+    monkeypatch.setattr(ServiceContainer, "warm_in_background", lambda self, names=None: warmed.append(names))
+    from src.app import create_app
+
+    create_app(warmup="none")
+    assert warmed == []
+
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO ingestion_jobs (id, file_path, status) VALUES ('job-1', 'upload.csv', 'queued')")
+    conn.commit()
+    conn.close()
+    create_app(warmup="none")
+    assert warmed == [["ingestion_job_service"]]
+
+
+def test_threads_sharing_the_services_connection_have_their_own_transactions(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    database.create_tables()
+    # Built on a warmup thread, used by request and worker threads
+    container = ServiceContainer()
+    builder = threading.Thread(target=container.get, args=("db_connection",))
+    builder.start()
+    builder.join()
+    db = container.get("db_connection")
+
+    db.execute("INSERT INTO ingestion_jobs (id, file_path, status) VALUES ('job-1', 'upload.csv', 'queued')")
+    other = threading.Thread(target=lambda: db.rollback())
+    other.start()
+    other.join()
+    db.commit()
+
+    assert db.execute("SELECT COUNT(*) FROM ingestion_jobs").fetchone()[0] == 1
+
+
+def test_app_config_reaches_the_services(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    from src.app import create_app
+    from src.config import config
+
+    class TestingConfig(config["default"]):
+        CONTENT_TEST_MAX_WORKERS = 3
+        INGESTION_MAX_WORKERS = 1
+
+    services = create_app(TestingConfig, warmup="none").extensions["services"]
+
+    assert services.config is TestingConfig
+    assert services.get("content_test_service").max_workers == 3
+    assert services.get("ingestion_job_service").max_workers == 1
@@ -0,0 +1,80 @@
+import threading
+
+from src.config import config
+from src.services import summary
+
+
+def _record_calls(monkeypatch):
+    prompts = []
+    lock = threading.Lock()
+
+    async def complete(prompt, model, temperature, max_tokens):
+        with lock:
+            prompts.append(prompt)
+        return f"partial summary {len(prompts)}"
+
+    monkeypatch.setattr(summary, "_complete_summary", complete)
+    return prompts
+
+
+def _responses(n):
+    return [{"persona": f"Persona {i}", "response": "I liked the colours but the price put me off. " * 5} for i in range(n)]
+
+
+def test_small_inputs_are_summarised_in_one_call(monkeypatch):
+    prompts = _record_calls(monkeypatch)
+
+    summary.generate_summary_from_responses(_responses(3))
+
+    assert len(prompts) == 1
+    assert prompts[0].count("Persona:") == 3
+
+
+def test_large_inputs_are_chunked_and_reduced_hierarchically(monkeypatch):
+    monkeypatch.setattr(config["default"], "SUMMARY_CHUNK_TOKEN_BUDGET", 200, raising=False)
+    monkeypatch.setattr(config["default"], "SUMMARY_REDUCE_FAN_IN", 4, raising=False)
+    prompts = _record_calls(monkeypatch)
+
+    result = summary.generate_summary_from_responses(_responses(60))
+
+    map_prompts = [p for p in prompts if p.startswith("The following is part")]
+    combine_prompts = [p for p in prompts if p.startswith("The following are partial summaries of disjoint groups of persona responses. Merge")]
+    assert sum(p.count("Persona:") for p in map_prompts) == 60
+    assert all(summary.count_tokens(p) < 400 for p in map_prompts)
+    assert len(combine_prompts) >= 2
+    assert "covering 60 responses" in prompts[-1]
+    assert result == f"partial summary {len(prompts)}"
+
+
+def test_chunks_respect_the_budget():
+    texts = ["x" * 400] * 10 + ["y" * 10000]
+    chunks = summary.chunk_by_tokens(texts, budget=250)
+
+    assert sum(len(chunk) for chunk in chunks) == 11
+    assert all(sum(summary.count_tokens(t) for t in chunk) <= 250 for chunk in chunks)
+
+
+def test_summary_sessions_update_incrementally_and_cache(tmp_path, monkeypatch):
+    from src import database
+
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    database.create_tables()
+    prompts = _record_calls(monkeypatch)
+    sessions = summary.SummarySessionService()
+    responses = _responses(5)
+
+    first = sessions.summarize(responses)
+    assert first["mode"] == "full" and len(prompts) == 1
+
+    repeat = sessions.summarize(responses, session_id=first["session_id"])
+    assert repeat["mode"] == "cached" and repeat["summary"] == first["summary"] and len(prompts) == 1
+
+    extended = sessions.summarize(responses + _responses(8)[5:], session_id=first["session_id"])
+    assert extended["mode"] == "incremental" and extended["new_responses"] == 3
+    assert "partial summary 1" in prompts[-1] and prompts[-1].count("Persona:") == 3
+
+    # Identical inputs are recognised even without the session id
+    assert summary.SummarySessionService().summarize(responses + _responses(8)[5:])["mode"] == "cached"
+
+    edited = [dict(responses[0], response="Changed my mind.")] + responses[1:]
+    assert sessions.summarize(edited, session_id=first["session_id"])["mode"] == "full"
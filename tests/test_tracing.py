@@ -0,0 +1,98 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import database
+from src.config import config
+from src.services import focus_group_service, llm_client
+from src.utils import tracing
+
+
+def test_spans_follow_work_onto_the_event_loop_and_executor():
+    def blocking_step():
+        with tracing.span("analytics"):
+            time.sleep(0.01)
+
+    async def work():
+        with tracing.span("phase", round=1):
+            await asyncio.gather(llm_client.run_in_executor(blocking_step), asyncio.sleep(0.01))
+
+    trace, token = tracing.start_trace("test")
+    with tracing.span("request"):
+        llm_client.run_async(work())
+    tracing.end_trace(token)
+
+    spans = {s["name"]: s for s in trace.to_dict()["spans"]}
+    assert set(spans) == {"request", "phase", "analytics"}
+    assert spans["phase"]["parent_id"] == spans["request"]["span_id"]
+    assert spans["analytics"]["parent_id"] == spans["phase"]["span_id"]
+    assert spans["analytics"]["thread"].startswith("llm-executor")
+    assert spans["phase"]["attributes"] == {"round": 1}
+
+    events = trace.to_chrome_trace()["traceEvents"]
+    assert {e["ph"] for e in events} == {"X"}
+    assert [e["name"] for e in events][0] == "test"
+
+
+def test_spans_are_free_without_a_trace():
+    with tracing.span("untraced") as attributes:
+        assert attributes is None
+    assert tracing.current_trace() is None
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(config["default"], "ADMIN_TOKEN", "secret", raising=False)
+    monkeypatch.setattr(config["default"], "TRACE_SAMPLE_RATE", 0.0, raising=False)
+
+    async def create(**kwargs):
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(
+            usage=SimpleNamespace(prompt_tokens=50, completion_tokens=10),
+            choices=[SimpleNamespace(message=SimpleNamespace(content="I quite like it."))]
+        )
+
+    monkeypatch.setattr(llm_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(focus_group_service, "chat_completion", lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Price\nDesign"))]
+    ))
+    from src.app import create_app
+    return create_app(warmup="none").test_client()
+
+
+def test_focus_group_trace_and_profile_are_exported(client):
+    admin = {"X-Admin-Token": "secret"}
+    payload = {"personas": ["Ann, 30", "Bob, 45"], "message": "Buy now", "num_discussion_rounds": 1}
+
+    assert "X-Trace-Id" not in client.post("/api/focus_group/simulate", json=payload).headers
+
+    response = client.post("/api/focus_group/simulate", json=payload, headers=dict(admin, **{"X-Profile": "1"}))
+    assert response.status_code == 200
+    trace_id = response.headers["X-Trace-Id"]
+
+    trace = client.get(f"/api/traces/{trace_id}", headers=admin).get_json()["trace"]
+    names = [s["name"] for s in trace["spans"]]
+    assert trace["name"] == "POST /api/focus_group/simulate"
+    assert {"focus_group.initial_reactions", "focus_group.discussion_round", "focus_group.analytics"} <= set(names)
+    assert names.count("llm.chat_completion") == 4
+    llm_span = next(s for s in trace["spans"] if s["name"] == "llm.chat_completion")
+    assert llm_span["attributes"]["prompt_tokens"] == 50
+
+    chrome = client.get(f"/api/traces/{trace_id}?format=chrome", headers=admin).get_json()
+    assert len(chrome["traceEvents"]) == len(names) + 1
+
+    profile = client.get(response.headers["X-Profile-Url"], headers=admin)
+    assert profile.status_code == 200
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in profile.get_data(as_text=True).splitlines())
+
+
+def test_traces_and_profiling_need_the_admin_token(client):
+    payload = {"personas": ["Ann, 30"], "message": "Buy now", "num_discussion_rounds": 0}
+    response = client.post("/api/focus_group/simulate", json=payload, headers={"X-Profile": "1", "X-Admin-Token": "wrong"})
+
+    assert "X-Profile-Url" not in response.headers
+    assert client.get("/api/traces").status_code == 403
+    assert client.get("/api/traces", headers={"X-Admin-Token": "secret"}).status_code == 200
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import database
+from src.config import config
+from src.services import focus_group_service, llm_client, usage_service
+from src.services.usage_service import AdmissionController, AdmissionRejected, UsageLedger
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    database.create_tables()
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    async def create(**kwargs):
+        await asyncio.sleep(0)
+        return SimpleNamespace(
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20),
+            choices=[SimpleNamespace(message=SimpleNamespace(content="I quite like it."))]
+        )
+
+    monkeypatch.setattr(llm_client, "_async_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+
+
+def test_usage_on_the_event_loop_is_attributed_and_rolled_up(db, fake_llm):
+    token = usage_service.set_usage_context("acme", "/api/analyze")
+    try:
+        for _ in range(3):
+            llm_client.run_async(llm_client.achat_completion(model="test-model", messages=[]))
+    finally:
+        usage_service.reset_usage_context(token)
+
+    assert usage_service.usage_ledger.owner_tokens("acme") == 360
+    rollups = usage_service.usage_ledger.rollups("acme")
+    assert [(r["endpoint"], r["model"], r["calls"], r["total_tokens"]) for r in rollups] == [("/api/analyze", "test-model", 3, 360)]
+    assert usage_service.usage_ledger.owner_tokens("acme") == 360
+
+
+def test_admission_queues_for_capacity_and_times_out(db):
+    controller = AdmissionController(UsageLedger(), max_tokens_in_flight=100, queue_timeout=0.05)
+    first = controller.admit("a", 80)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("b", 50)
+    assert rejected.value.status_code == 503
+
+    threading.Timer(0.02, controller.release, (first,)).start()
+    controller.queue_timeout = 2
+    second = controller.admit("b", 50)
+    assert second[2] is True
+    controller.release(second)
+
+    oversized = controller.admit("c", 500)
+    assert controller.tokens_in_flight == 500
+    controller.release(oversized)
+
+
+def test_owner_budget_is_enforced_before_a_simulation_runs(db, fake_llm, monkeypatch):
+    monkeypatch.setattr(config["default"], "OWNER_TOKEN_BUDGETS", {"acme": 1000}, raising=False)
+    monkeypatch.setattr(config["default"], "ADMIN_TOKEN", "secret", raising=False)
+    monkeypatch.setattr(focus_group_service, "chat_completion", lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Price"))]
+    ))
+    from src.app import create_app
+    client = create_app(warmup="none").test_client()
+    payload = {"personas": ["Ann, 30", "Bob, 45"], "message": "Buy now", "num_discussion_rounds": 3}
+
+    response = client.post("/api/focus_group/simulate", json=payload, headers={"X-Owner-Id": "acme"})
+    assert response.status_code == 429
+    assert response.get_json()["remaining_tokens"] == 1000
+    assert int(response.headers["Retry-After"]) > 0
+
+    response = client.post("/api/focus_group/simulate", json=dict(payload, owner_id="globex"))
+    assert response.status_code == 200
+    usage = client.get("/api/usage?owner_id=globex", headers={"X-Admin-Token": "secret"}).get_json()["usage"]
+    assert usage[0]["endpoint"] == "/api/focus_group/simulate"
+    assert usage[0]["calls"] == 8
+    assert client.get("/api/usage").status_code == 403
+
+
+def test_concurrent_requests_cannot_overshoot_an_owner_budget(db, monkeypatch):
+    monkeypatch.setattr(config["default"], "OWNER_TOKEN_BUDGETS", {"acme": 100}, raising=False)
+    ledger = UsageLedger()
+    # A slow usage read leaves both requests between the check and the reservation
+    monkeypatch.setattr(ledger, "owner_tokens", lambda owner_id: time.sleep(0.05) or 0)
+    controller = AdmissionController(ledger, max_tokens_in_flight=0)
+    outcomes = []
+
+    def admit():
+        try:
+            outcomes.append(controller.admit("acme", 60))
+        except AdmissionRejected as e:
+            outcomes.append(e.status_code)
+
+    threads = [threading.Thread(target=admit) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(outcomes, key=str) == sorted([("acme", 60, False), 429], key=str)
+    assert controller.tokens_in_flight == 60
+
+
+def test_live_simulation_routes_are_admission_checked(db, fake_llm, monkeypatch):
+    monkeypatch.setattr(focus_group_service, "chat_completion", lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Price"))]
+    ))
+    from src.app import create_app
+    client = create_app(warmup="none").test_client()
+    headers = {"X-Owner-Id": "acme"}
+    started = client.post("/api/focus_group/start_live", json={"personas": ["Ann, 30", "Bob, 45"], "message": "Buy now"}, headers=headers)
+    simulation_id = started.get_json()["simulation_id"]
+
+    # Budget for one more token than has been used
+    used = usage_service.usage_ledger.owner_tokens("acme")
+    monkeypatch.setattr(config["default"], "OWNER_TOKEN_BUDGETS", {"acme": used + 1}, raising=False)
+    for path, body in [("continue_round", {}), ("inject_question", {"question": "Would you pay more?"})]:
+        response = client.post(f"/api/focus_group/{simulation_id}/{path}", json=body, headers=headers)
+        assert response.status_code == 429
+        assert response.get_json()["estimated_tokens"] > 0
+
+    # Unknown simulations are answered by the route, not the admission check
+    assert client.post("/api/focus_group/missing/continue_round", json={}, headers=headers).status_code == 404
+    assert client.post(f"/api/focus_group/{simulation_id}/continue_round", json={}).status_code == 200
+
+
+def test_simulation_analytics_routes_are_admission_checked(db, fake_llm, monkeypatch):
+    monkeypatch.setattr(focus_group_service, "chat_completion", lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Price"))]
+    ))
+    from src.app import create_app
+    client = create_app(warmup="none").test_client()
+    headers = {"X-Owner-Id": "acme"}
+    started = client.post("/api/focus_group/start_live", json={"personas": ["Ann, 30", "Bob, 45"], "message": "Buy now"}, headers=headers)
+    simulation_id = started.get_json()["simulation_id"]
+
+    used = usage_service.usage_ledger.owner_tokens("acme")
+    monkeypatch.setattr(config["default"], "OWNER_TOKEN_BUDGETS", {"acme": used + 1}, raising=False)
+    analytics = client.get(f"/api/focus_group/{simulation_id}/analytics", headers=headers)
+    assert analytics.status_code == 429
+    assert analytics.get_json()["estimated_tokens"] > 0
+    assert client.post(f"/api/focus_group/{simulation_id}/complete", headers=headers).status_code == 429
+
+    # Other owners are admitted, and GET routes without an estimator are not checked
+    assert client.get(f"/api/focus_group/{simulation_id}/state", headers=headers).status_code == 200
+    assert client.post(f"/api/focus_group/{simulation_id}/complete").status_code == 200
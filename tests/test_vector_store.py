@@ -0,0 +1,134 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.services.vector_store import NumpyVectorStore
+
+
+def test_vectors_survive_reload(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    store.upsert(["a", "b"], [[1, 0, 0], [0, 1, 0]], [{"region": "Leeds"}, {"region": "York"}])
+    store.upsert(["c"], [[0, 0, 2]], [{"region": "Leeds"}])
+
+    reloaded = NumpyVectorStore(str(tmp_path))
+    assert len(reloaded) == 3
+    vector, metadata = reloaded.get("c")
+    assert np.allclose(vector, [0, 0, 1])  # stored normalised
+    assert metadata == {"region": "Leeds"}
+
+    results = reloaded.query([0.9, 0.1, 0], n_results=2)
+    assert results["ids"] == [["a", "b"]]
+    filtered = reloaded.query([0.1, 0, 0.9], n_results=5, where_filter={"region": "Leeds"})
+    assert filtered["ids"] == [["c", "a"]]
+
+
+def test_upsert_supersedes_and_compact_drops_old_rows(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    store.upsert(["a", "b"], [[1, 0], [0, 1]])
+    store.upsert(["a"], [[0.6, 0.8]], [{"v": 2}])
+
+    assert len(store) == 2
+    assert store.count == 3
+    assert store.query([1, 0], n_results=5)["ids"] == [["a", "b"]]  # old "a" row is not returned
+
+    store.compact()
+    reloaded = NumpyVectorStore(str(tmp_path))
+    assert len(reloaded) == 2 and reloaded.count == 2
+    assert reloaded.get("a")[1] == {"v": 2}
+
+
+def test_interrupted_compact_keeps_the_old_generation(tmp_path, monkeypatch):
+    store = NumpyVectorStore(str(tmp_path))
+    store.upsert(["a", "b"], [[1, 0], [0, 1]])
+    store.upsert(["a"], [[0.6, 0.8]], [{"v": 2}])
+
+    def crash():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "_write_manifest", crash)
+    with pytest.raises(OSError):
+        store.compact()
+
+    reloaded = NumpyVectorStore(str(tmp_path))
+    assert len(reloaded) == 2 and reloaded.count == 3
+    assert reloaded.get("a")[1] == {"v": 2}
+    assert not os.path.exists(os.path.join(tmp_path, "vectors.1.f32"))
+
+    reloaded.compact()
+    assert sorted(os.listdir(tmp_path)) == ["ids.1.txt", "manifest.json", "metadata.1.jsonl", "vectors.1.f32"]
+    assert NumpyVectorStore(str(tmp_path)).get("b") is not None
+
+
+def test_rows_written_after_manifest_are_ignored(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    store.upsert(["a"], [[1, 0]])
+
+    # Simulate a crash after the data files were appended but before the manifest
+    with open(os.path.join(tmp_path, "vectors.f32"), "ab") as f:
+        f.write(np.array([[0, 1]], dtype=np.float32).tobytes())
+    with open(os.path.join(tmp_path, "ids.txt"), "a") as f:
+        f.write("ghost\n")
+
+    reloaded = NumpyVectorStore(str(tmp_path))
+    assert len(reloaded) == 1
+    assert reloaded.get("ghost") is None
+    reloaded.upsert(["b"], [[0, 1]])
+    with open(os.path.join(tmp_path, "manifest.json")) as f:
+        assert json.load(f)["count"] == 2
+    assert NumpyVectorStore(str(tmp_path)).get("b") is not None
+
+
+def test_query_batch_prefilters_with_metadata_index(tmp_path, monkeypatch):
+    from src.services import vector_store
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(300, 8)).astype(np.float32)
+    regions = ["Leeds", "York", "Hull"]
+    metadatas = [
+        {"region": regions[i % 3], "gender": "female" if i % 2 else "male", "age": 20 + i % 50}
+        for i in range(300)
+    ]
+    store = NumpyVectorStore(str(tmp_path))
+    store.upsert([str(i) for i in range(300)], vectors, metadatas)
+    monkeypatch.setattr(vector_store, "QUERY_BLOCK_ROWS", 64)  # exercise the block merge
+
+    queries = vectors[[3, 10]]
+    where = {"$and": [{"region": {"$in": ["Leeds", "York"]}}, {"gender": "female"}, {"age_band": {"$in": ["18-24", "25-34"]}}]}
+    results = store.query_batch(queries, n_results=4, where_filter=where)
+
+    assert len(results["ids"]) == 2
+    normalised = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    for q, ids in zip(queries, results["ids"]):
+        for persona_id in ids:
+            m = metadatas[int(persona_id)]
+            assert m["region"] in ("Leeds", "York") and m["gender"] == "female" and m["age"] < 35
+        # Brute-force check of the ranking over the same candidate set
+        allowed = [i for i, m in enumerate(metadatas) if m["region"] in ("Leeds", "York") and m["gender"] == "female" and m["age"] < 35]
+        scores = normalised[allowed] @ (q / np.linalg.norm(q))
+        expected = [str(allowed[i]) for i in np.argsort(-scores)[:4]]
+        assert ids == expected
+    assert results["ids"][0][0] == "3"  # a query matches itself first
+
+
+def test_indexed_and_residual_filters_agree(tmp_path, monkeypatch):
+    from src.services import vector_store
+
+    metadatas = [{"region": "Leeds", "gender": "female", "age": 30}, {"region": "leeds", "gender": "Female", "age": 70}]
+    store = NumpyVectorStore(str(tmp_path))
+    store.upsert(["a", "b"], [[1, 0], [0, 1]], metadatas)
+    filters = [
+        {"region": "Leeds"},
+        {"gender": {"$in": ["female"]}},
+        {"$and": [{"region": {"$ne": "York"}}, {"age_band": "65+"}]},
+        {"$and": [{"gender": "Female"}, {"region": "leeds"}]},
+    ]
+
+    indexed = [sorted(store.query([1, 1], n_results=5, where_filter=f)["ids"][0]) for f in filters]
+    monkeypatch.setattr(vector_store, "INDEXED_FIELDS", ())
+    residual = [sorted(store.query([1, 1], n_results=5, where_filter=f)["ids"][0]) for f in filters]
+
+    assert indexed == residual == [["a"], ["a"], ["b"], ["b"]]
+    with pytest.raises(ValueError):
+        store.query([1, 1], where_filter={"region": ["Leeds", "York"]})
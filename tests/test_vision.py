@@ -0,0 +1,117 @@
+import asyncio
+import base64
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+from src import database
+from src.services import llm_client, vision
+
+IMAGE = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x00" * 24).decode()
+
+
+@pytest.fixture
+def describe_calls(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    database.create_tables()
+    monkeypatch.setattr(vision, "_description_cache", OrderedDict())
+    monkeypatch.setattr(vision, "_description_failures", {})
+    calls = []
+
+    async def request_description(image_data, model):
+        calls.append(image_data)
+        await asyncio.sleep(0.2)
+        return {field: "" for field in vision.DESCRIPTION_FIELDS} | {"summary": "A red bicycle on a beach."}
+
+    monkeypatch.setattr(vision, "_request_image_description", request_description)
+
+    async def react(text, persona, message, model, temperature):
+        return f"{persona}: {text}"
+
+    monkeypatch.setattr(vision, "_react_to_description", react)
+    return calls
+
+
+def test_image_is_described_once_for_many_personas(describe_calls, monkeypatch):
+    responses = [vision.analyze_image(IMAGE, f"Persona {i}") for i in range(5)]
+
+    assert len(describe_calls) == 1
+    assert all("A red bicycle on a beach." in r for r in responses)
+
+    # A fresh process finds the description in the database
+    monkeypatch.setattr(vision, "_description_cache", OrderedDict())
+    wrapped = "\n".join(IMAGE[i:i + 8] for i in range(0, len(IMAGE), 8))
+    vision.analyze_combined(wrapped, "Ride more", "Persona 6")
+    assert len(describe_calls) == 1
+
+
+def test_full_vision_sends_the_image_to_every_persona(describe_calls, monkeypatch):
+    sent = []
+
+    async def create(**kwargs):
+        sent.append(kwargs["messages"][0]["content"][1]["image_url"]["url"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Looks fun."))])
+
+    monkeypatch.setattr(vision, "achat_completion", create)
+    for i in range(3):
+        assert vision.analyze_image(IMAGE, f"Persona {i}", full_vision=True) == "Looks fun."
+
+    assert describe_calls == []
+    assert len(sent) == 3 and all(IMAGE in url for url in sent)
+
+
+def test_concurrent_personas_share_one_description_without_holding_executor_threads(describe_calls):
+    async def panel():
+        reactions = asyncio.gather(*(vision.aanalyze_image(IMAGE, f"Persona {i}") for i in range(8)))
+        await asyncio.sleep(0.05)
+        # Other requests' blocking work still gets an executor thread while the image is described
+        start = time.perf_counter()
+        await llm_client.run_in_executor(threading.current_thread)
+        executor_wait = time.perf_counter() - start
+        return await reactions, executor_wait
+
+    responses, executor_wait = llm_client.run_async(panel())
+
+    assert len(describe_calls) == 1
+    assert all("A red bicycle on a beach." in r for r in responses)
+    assert executor_wait < 0.1
+
+
+def test_failed_description_is_not_retried_per_persona(describe_calls, monkeypatch):
+    sent = []
+
+    async def request_description(image_data, model):
+        describe_calls.append(image_data)
+        raise RuntimeError("vision model unavailable")
+
+    async def create(**kwargs):
+        sent.append(kwargs)
+
+    monkeypatch.setattr(vision, "_request_image_description", request_description)
+    monkeypatch.setattr(vision, "achat_completion", create)
+    responses = [vision.analyze_image(IMAGE, f"Persona {i}") for i in range(5)]
+
+    # One vision call in total: no retry per persona and no full-vision call per persona
+    assert len(describe_calls) == 1
+    assert sent == []
+    assert all(r.startswith("Error analyzing image") for r in responses)
+    with pytest.raises(vision.ImageDescriptionUnavailable):
+        vision.describe_image(IMAGE)
+
+    # The failure expires, and the image is tried again
+    monkeypatch.setitem(vision._description_failures, next(iter(vision._description_failures)), (0, RuntimeError()))
+    vision.analyze_image(IMAGE, "Persona 6")
+    assert len(describe_calls) == 2
+
+
+def test_description_cache_is_bounded(describe_calls, monkeypatch):
+    monkeypatch.setattr(vision.config["default"], "IMAGE_DESCRIPTION_CACHE_MAX_ENTRIES", 2, raising=False)
+    images = [base64.b64encode(b"\x89PNG\r\n\x1a\n" + bytes([i]) * 24).decode() for i in range(4)]
+    for image in images:
+        vision.describe_image(image)
+
+    assert len(vision._description_cache) == 2
+    assert len(describe_calls) == 4